@@ -0,0 +1,496 @@
+# Copyright (C) 2025 Jérémy Rotzetter
+
+import json
+import os
+import shutil
+import tarfile
+import tempfile
+import threading
+import time
+import warnings
+import zipfile
+from typing import Optional
+import manifest
+
+ARCHIVE_FORMATS = ("tar", "zip")
+# The member index is stored next to the archive as <archive>.index.json
+INDEX_SUFFIX = ".index.json"
+# Data of a member held in memory while another member is being written,
+# beyond it the download waits for the archive
+SPOOL_SIZE = 8 * 1024 * 1024
+COPY_SIZE = 1024 * 1024
+
+
+def archive_path(store_path: str, name: str, archive_format: str) -> str:
+    """
+    Get the path to the archive of a project
+
+    :param store_path: path to target directory
+    :param name: name of the archive without extension, e.g. the hash ID
+    :param archive_format: one of ARCHIVE_FORMATS
+    """
+    return os.path.join(store_path, f"{name}.{archive_format}")
+
+
+class ProjectArchive:
+    """
+    Uncompressed tar or zip archive (images are compressed already) the
+    images of a project are appended to instead of saving each to a file
+
+    A member index is kept next to the archive as JSON. It lists the name,
+    size, SHA-256 hash, source URL and the byte offset of the data of each
+    member within the archive, so a re-sync can tell which images the archive
+    holds (and a member can be read with a range request) without reading the
+    archive. Should the index be missing or not match the archive, it is
+    rebuilt from the headers of the archive, without the source URLs.
+
+    The archive takes the place of the dirindex.DirectoryIndex of a
+    downloader. The images are streamed into the archive as they are
+    downloaded, see open_member(). A member replacing one of the same name is
+    appended, tar extraction then takes the last one; a zip archive is
+    rewritten without the replaced members by close(), as zip tools do not
+    agree on which of the entries of a name to take. An archive that already
+    exists is appended to. A tar archive interrupted by a crash keeps its
+    members, a zip archive is unreadable without the directory written by
+    close().
+
+    :param path: path to the archive, its extension tells the format
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.format = "zip" if path.lower().endswith(".zip") else "tar"
+        self.index_path = f"{path}{INDEX_SUFFIX}"
+        # index entry of each member by name, and name of the member saved
+        # from each asset and size as in manifest.Manifest
+        self._members: dict[str, dict] = {}
+        self._assets: dict[tuple[str, str], str] = {}
+        # names reserved by downloads in flight, see reserve()
+        self._reserved: set[str] = set()
+        self._archive = None
+        self._changed = False
+        # whether the zip archive holds entries of replaced or dropped members
+        # and the header offsets of the dropped ones
+        self._stale = False
+        self._dropped: set[int] = set()
+        self._lock = threading.Lock()
+        # held while a member is written, one at a time
+        self._writing = threading.Lock()
+        self._load_index()
+
+    def _load_index(self):
+        try:
+            archive_size = os.path.getsize(self.path)
+        except OSError:
+            return  # a new archive
+        try:
+            with open(self.index_path, encoding="utf-8") as f:
+                index = json.load(f)
+            if index.get("archive_size") == archive_size:
+                for entry in index["members"]:
+                    self._remember(entry)
+                return
+        except (OSError, ValueError, KeyError):
+            pass
+        self._rebuild_index()
+
+    def _rebuild_index(self):
+        """
+        Read the member index from the headers of the archive
+        """
+        self._members.clear()
+        self._assets.clear()
+        try:
+            if self.format == "zip":
+                with zipfile.ZipFile(self.path) as zf:
+                    for info in zf.infolist():
+                        self._remember(
+                            {
+                                "name": info.filename,
+                                "size": info.file_size,
+                                "offset": self._zip_data_offset(info),
+                            }
+                        )
+            else:
+                with tarfile.open(self.path) as tf:
+                    for info in tf:
+                        if info.isfile():
+                            self._remember(
+                                {
+                                    "name": info.name,
+                                    "size": info.size,
+                                    "offset": info.offset_data,
+                                }
+                            )
+        except (OSError, tarfile.TarError, zipfile.BadZipFile):
+            pass  # appended to as far as it can be read
+        self._changed = True
+
+    @staticmethod
+    def _zip_data_offset(info: zipfile.ZipInfo) -> int:
+        # The local header is 30 bytes followed by the name and extra field
+        return info.header_offset + 30 + len(info.filename.encode()) + len(info.extra)
+
+    def _remember(self, entry: dict):
+        self._members[entry["name"]] = entry
+        if entry.get("url"):
+            key = (manifest.asset_id(entry["url"]), manifest.asset_size(entry["url"]))
+            self._assets[key] = entry["name"]
+
+    def __len__(self) -> int:
+        return len(self._members)
+
+    def exists(self, name: str) -> bool:
+        """
+        Whether the archive holds a member of a name
+
+        :param name: file name of the member
+        """
+        return name in self._members or name in self._reserved
+
+    def size(self, name: str) -> Optional[int]:
+        """
+        Get the size of a member in bytes, None if there is no such member
+
+        :param name: file name of the member
+        """
+        entry = self._members.get(name)
+        return entry["size"] if entry is not None else None
+
+    def current(self, url: str) -> Optional[str]:
+        """
+        Get the name of the member an image was saved as if it is in the
+        archive in the same version, else None
+
+        :param url: URL to image
+        """
+        name = self._assets.get((manifest.asset_id(url), manifest.asset_size(url)))
+        if name is None:
+            return None
+        entry = self._members[name]
+        if not entry.get("version") == manifest.asset_version(url):
+            return None
+        return name
+
+    def reserve(self, name: str, replace: bool = False) -> bool:
+        """
+        Reserve a name for a download in flight, see
+        dirindex.DirectoryIndex.reserve()
+
+        :param name: file name of the member
+        :param replace: whether a member of the name may be replaced
+        """
+        with self._lock:
+            if name in self._reserved or (not replace and name in self._members):
+                return False
+            self._reserved.add(name)
+        return True
+
+    def release(self, name: str):
+        """
+        Release a name reserved by reserve() or free_name()
+
+        :param name: file name of the member
+        """
+        with self._lock:
+            self._reserved.discard(name)
+
+    def free_name(self, filename: str, ext: str) -> str:
+        """
+        Get a name with a numbered suffix that is not taken yet and reserve it
+
+        :param filename: name of the file without extension
+        :param ext: extension of the file
+        """
+        with self._lock:
+            number = 1
+            while self.exists(f"{filename} ({number}){ext}"):
+                number += 1
+            name = f"{filename} ({number}){ext}"
+            self._reserved.add(name)
+        return name
+
+    def _open(self):
+        exists = os.path.exists(self.path)
+        if self.format == "zip":
+            self._archive = zipfile.ZipFile(
+                self.path, "a" if exists else "w", zipfile.ZIP_STORED
+            )
+        else:
+            self._archive = tarfile.open(
+                self.path, "a" if exists else "w", format=tarfile.PAX_FORMAT
+            )
+
+    def open_member(self, name: str) -> "ArchiveMember":
+        """
+        Start writing a member, to be used as a context manager, the member is
+        dropped unless ArchiveMember.commit() is called before it exits
+
+        One member at a time streams its data into the archive, the others
+        hold theirs in memory meanwhile, see ArchiveMember.
+
+        :param name: file name of the member
+        """
+        return ArchiveMember(self, name)
+
+    def owns(self, url: str, name: str) -> bool:
+        """
+        Whether a member was saved from an earlier version of the same image,
+        in which case it may be replaced with the changed image
+
+        :param url: URL to image
+        :param name: file name of the member
+        """
+        with self._lock:
+            if (
+                not self._assets.get((manifest.asset_id(url), manifest.asset_size(url)))
+                == name
+            ):
+                return False
+            entry = self._members[name]
+        return entry.get("url") == url.split("?", 1)[0] and bool(entry.get("sha256"))
+
+    def close(self):
+        """
+        Finish the archive and write the member index, the archive is opened
+        again by the next write
+        """
+        with self._writing, self._lock:
+            if self._archive is not None:
+                self._archive.close()
+                self._archive = None
+            if self._stale:
+                self._compact()
+            if not self._changed:
+                return
+            index = {
+                "format": self.format,
+                "archive_size": os.path.getsize(self.path),
+                "members": list(self._members.values()),
+            }
+            directory = os.path.dirname(os.path.abspath(self.path))
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    json.dump(index, f)
+                os.replace(tmp_path, self.index_path)
+            except OSError:
+                os.remove(tmp_path)
+                raise
+            self._changed = False
+
+    def _compact(self):
+        """
+        Rewrite the zip archive without the entries of replaced and dropped
+        members, updating the offsets in the member index
+        """
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        os.close(fd)
+        try:
+            with zipfile.ZipFile(self.path) as source:
+                # the last entry of each name is the current member
+                current = {}
+                for info in source.infolist():
+                    if info.header_offset not in self._dropped:
+                        current[info.filename] = info
+                with zipfile.ZipFile(tmp_path, "w", zipfile.ZIP_STORED) as target:
+                    for info in current.values():
+                        copy = zipfile.ZipInfo(info.filename, info.date_time)
+                        copy.file_size = info.file_size
+                        copy.external_attr = info.external_attr
+                        with source.open(info) as src, target.open(copy, "w") as dst:
+                            entry = self._members.get(info.filename)
+                            if entry is not None:
+                                entry["offset"] = target.fp.tell()
+                            shutil.copyfileobj(src, dst, COPY_SIZE)
+            os.replace(tmp_path, self.path)
+        except (OSError, zipfile.BadZipFile):
+            os.remove(tmp_path)
+            raise
+        self._dropped.clear()
+        self._stale = False
+        self._changed = True
+
+
+class ArchiveMember:
+    """
+    Member of a ProjectArchive being written, has the methods of a file
+    object streaming.copy_response() uses, see ProjectArchive.open_member()
+
+    The member streams its data into the archive while it holds it. A member
+    started while another one is being written holds its data in memory
+    instead, commit() appends it once the archive is free. Should it grow
+    beyond SPOOL_SIZE bytes, write() waits for the archive and the member
+    then streams the rest, so no data is written anywhere but the archive.
+
+    The size of a tar member is written to its header by commit(), the header
+    is written with a size of 0 before.
+
+    :param project_archive: archive the member is written to
+    :param name: file name of the member
+    """
+
+    def __init__(self, project_archive: ProjectArchive, name: str):
+        self.name = name
+        self.written = 0
+        # byte offset of the data of the member within the archive
+        self.offset = 0
+        self._project_archive = project_archive
+        # data not passed on to the archive yet and whether the member holds
+        # the archive
+        self._pending = bytearray()
+        self._holding = False
+        self._info = None
+        # zip: file object of the member opened in the archive
+        self._handle = None
+        # position of the header of the member within the archive
+        self._start = 0
+        self._done = False
+        if project_archive._writing.acquire(blocking=False):
+            self._begin()
+
+    def _begin(self):
+        """
+        Write the header of the member and the data held so far, the archive
+        has to be acquired already
+        """
+        project_archive = self._project_archive
+        try:
+            if project_archive._archive is None:
+                project_archive._open()
+            archive = project_archive._archive
+            mtime = time.time()
+            if project_archive.format == "zip":
+                info = zipfile.ZipInfo(self.name, time.localtime(mtime)[:6])
+                with warnings.catch_warnings():
+                    # replaced members are removed by close()
+                    warnings.simplefilter("ignore", UserWarning)
+                    self._handle = archive.open(info, "w")
+                self._start = info.header_offset
+                self.offset = archive.fp.tell()
+            else:
+                info = tarfile.TarInfo(self.name)
+                info.size = 0
+                info.mtime = mtime
+                info.mode = 0o644
+                self._start = archive.offset
+                header = info.tobuf(archive.format, archive.encoding, archive.errors)
+                archive.fileobj.write(header)
+                archive.offset += len(header)
+                self.offset = archive.offset
+            self._info = info
+            self._holding = True
+            if self._pending:
+                self._put(self._pending)
+                self._pending = bytearray()
+        except BaseException:
+            if self._holding:
+                self._drop()
+            else:
+                project_archive._writing.release()
+            raise
+
+    def _put(self, data):
+        if self._handle is not None:
+            self._handle.write(data)
+        else:
+            self._project_archive._archive.fileobj.write(data)
+
+    def tell(self) -> int:
+        return self.written
+
+    def write(self, chunk) -> int:
+        if self._holding:
+            self._put(chunk)
+        else:
+            self._pending += chunk
+            if len(self._pending) > SPOOL_SIZE:
+                self._project_archive._writing.acquire()
+                self._begin()
+        self.written += len(chunk)
+        return len(chunk)
+
+    def commit(self, url: str, sha256: str):
+        """
+        Finish the member and add it to the member index, waits for the
+        archive if the member does not hold it yet
+
+        :param url: URL to image
+        :param sha256: SHA-256 hash of the content
+        """
+        project_archive = self._project_archive
+        if not self._holding:
+            project_archive._writing.acquire()
+            self._begin()
+        if project_archive.format == "zip":
+            self._handle.close()
+            self._handle = None
+        else:
+            archive = project_archive._archive
+            self._info.size = self.written
+            header = self._info.tobuf(archive.format, archive.encoding, archive.errors)
+            if not len(header) == self.offset - self._start:
+                raise OSError(f'The header of "{self.name}" does not fit its size')
+            end = archive.fileobj.tell()
+            archive.fileobj.seek(self._start)
+            archive.fileobj.write(header)
+            archive.fileobj.seek(end)
+            remainder = self.written % tarfile.BLOCKSIZE
+            if remainder:
+                archive.fileobj.write(tarfile.NUL * (tarfile.BLOCKSIZE - remainder))
+            archive.offset += self.written + (-self.written % tarfile.BLOCKSIZE)
+            archive.members.append(self._info)
+        self._done = True
+        with project_archive._lock:
+            if (
+                project_archive.format == "zip"
+                and self.name in project_archive._members
+            ):
+                project_archive._stale = True
+            project_archive._reserved.discard(self.name)
+            project_archive._remember(
+                {
+                    "name": self.name,
+                    "size": self.written,
+                    "offset": self.offset,
+                    "sha256": sha256,
+                    "url": url.split("?", 1)[0],
+                    "version": manifest.asset_version(url),
+                }
+            )
+            project_archive._changed = True
+        self._holding = False
+        project_archive._writing.release()
+
+    def _drop(self):
+        """
+        Remove what was written of the member from the archive
+        """
+        self._pending = bytearray()
+        if not self._holding:
+            return
+        project_archive = self._project_archive
+        try:
+            if self._handle is not None:
+                # The entry is complete in itself and left out by close()
+                with project_archive._lock:
+                    project_archive._dropped.add(self._start)
+                    project_archive._stale = True
+                handle, self._handle = self._handle, None
+                handle.close()
+            else:
+                archive = project_archive._archive
+                archive.fileobj.seek(self._start)
+                archive.fileobj.truncate()
+                archive.offset = self._start
+        finally:
+            self._holding = False
+            project_archive._writing.release()
+
+    def __enter__(self) -> "ArchiveMember":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if not self._done:
+            self._drop()
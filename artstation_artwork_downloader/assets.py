@@ -0,0 +1,104 @@
+# Copyright (C) 2025 Jérémy Rotzetter
+
+from typing import Optional
+
+# Size segment of the image URLs found in the project JSON
+URL_SIZE = "large"
+
+
+class Asset:
+    """
+    Asset of a project with only the fields the downloader uses
+
+    The image URL is kept split around its size segment, so the URL of any
+    size is made by joining three strings instead of searching and replacing
+    in the whole URL.
+
+    :param asset_id: ID of the asset
+    :param position: position of the asset in the project
+    :param asset_type: e.g. "image", "cover", "video"
+    :param width: width of the image in pixels as reported by ArtStation
+    :param height: height of the image in pixels as reported by ArtStation
+    :param image_url: URL to the image as found in the project JSON (size 'large')
+    """
+
+    __slots__ = (
+        "asset_id",
+        "position",
+        "asset_type",
+        "width",
+        "height",
+        "_head",
+        "_tail",
+    )
+
+    def __init__(
+        self,
+        asset_id: Optional[int],
+        position: int,
+        asset_type: str,
+        width: Optional[int],
+        height: Optional[int],
+        image_url: str,
+    ):
+        self.asset_id = asset_id
+        self.position = position
+        self.asset_type = asset_type
+        self.width = width
+        self.height = height
+        head, separator, tail = image_url.partition(f"/{URL_SIZE}/")
+        if separator:
+            self._head = f"{head}/"
+            self._tail = f"/{tail}"
+        else:
+            # No size segment, the URL is the same for every size
+            self._head = image_url
+            self._tail = None
+
+    @classmethod
+    def from_json(cls, position: int, asset: dict) -> "Asset":
+        """
+        Create an asset from its entry in the "assets" list of a project
+
+        :param position: index of the entry, used if it has no position
+        :param asset: entry of the asset
+        """
+        return cls(
+            asset.get("id"),
+            asset.get("position", position),
+            asset["asset_type"],
+            asset.get("width"),
+            asset.get("height"),
+            asset["image_url"],
+        )
+
+    def url(self, size: str = URL_SIZE) -> str:
+        """
+        Get the URL of the image in one of the sizes provided by ArtStation
+
+        :param size: one of downloader.IMG_SCALE
+        """
+        if self._tail is None:
+            return self._head
+        return self._head + size + self._tail
+
+    @property
+    def image_url(self) -> str:
+        """
+        URL to the image as found in the project JSON
+        """
+        return self.url(URL_SIZE)
+
+
+def image_assets(project: dict) -> list[Asset]:
+    """
+    Get the image assets of a project
+
+    :param project: JSON data of the project
+    """
+    # covers and videos will lead to a 403 when trying to download, best to filter them out
+    return [
+        Asset.from_json(position, asset)
+        for position, asset in enumerate(project["assets"])
+        if asset["asset_type"] == "image"
+    ]
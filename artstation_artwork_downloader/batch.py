@@ -0,0 +1,403 @@
+# Copyright (C) 2025 Jérémy Rotzetter
+
+import collections
+import json
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, Iterable, Iterator, Optional
+import archive
+import assets
+import dedupe
+import dirindex
+import downloader
+import jsonstream
+import metrics
+import planner
+import postprocess
+import ratelimit
+import retry
+import transport
+import writer
+
+
+def parse_hash_id(text: str) -> str:
+    """
+    Get the hash ID of a project from either the hash ID itself or the URL
+    to the project page (artstation.com/artwork/hashid)
+
+    :param text: hash ID or URL
+    """
+    text = text.strip()
+    if "/artwork/" in text:
+        text = text.split("/artwork/", 1)[1]
+    return text.split("?", 1)[0].strip("/")
+
+
+def read_hash_ids(path: str) -> list[str]:
+    """
+    Read the hash IDs of projects from a file
+
+    Each line holds either a hash ID, a URL to a project page, a JSON string
+    or a JSON object with a "hash_id" key (JSONL). Empty lines and lines
+    starting with # are ignored.
+
+    A .json file is read as a project listing instead, e.g. a saved page of
+    an artist's portfolio, and parsed incrementally.
+
+    :param path: path to the file
+    """
+    if path.lower().endswith(".json"):
+        with open(path, "rb") as f:
+            return [project["hash_id"] for project in jsonstream.iter_projects(f)]
+    hash_ids = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line == "" or line.startswith("#"):
+                continue
+            if line.startswith(("{", '"')):
+                entry = json.loads(line)
+                line = entry["hash_id"] if isinstance(entry, dict) else entry
+            hash_ids.append(parse_hash_id(line))
+    return hash_ids
+
+
+class BatchDownloader:
+    """
+    Download the images of many projects in one run
+
+    The JSON data of up to project_workers projects is fetched concurrently
+    and the images of each project are put into a download pool shared by
+    all projects as soon as its JSON data has arrived.
+
+    :param store_path: path to target directory
+    :param size: image dimensions, one of downloader.IMG_SCALE
+    :param max_workers: maximum number of parallel downloads
+    :param project_workers: maximum number of parallel project JSON fetches
+    :param per_project_dirs: save the images of each project to a subdirectory
+        named after its hash ID
+    :param custom_name: if given, files are named with it and a sequential number
+    :param skip_existing: skip files that already exist without asking for a new name
+    :param ask_rename: see downloader.Downloader
+    :param fetch_project: called with a hash ID, returns the JSON data of the project
+    :param use_manifest: keep a manifest of the downloaded images in each
+        target directory, see downloader.Downloader
+    :param rate_controller: optional ratelimit.RateController shared by the
+        downloads of all projects, see downloader.Downloader
+    :param retry_policy: policy for retrying downloads on transient errors
+        shared by the downloads of all projects
+    :param dedupe_mode: one of dedupe.DEDUPE_MODES, images whose content was
+        already saved to any project below store_path are replaced with a hard
+        link ("link") or not kept ("skip")
+    :param preflight: send a HEAD request for each image of a project before
+        downloading it, see planner.Planner. The requests of all projects are
+        sent by one planner with max_workers threads and wait for the
+        rate_controller like the downloads.
+    :param run_metrics: optional metrics.RunMetrics to record the timings of
+        the downloads of all projects in
+    :param collision_policy: one of dirindex.COLLISION_POLICIES, see
+        downloader.Downloader
+    :param disk_writer: optional writer.DiskWriter to write the images of all
+        projects, see downloader.Downloader
+    :param archive_format: one of archive.ARCHIVE_FORMATS to append the images
+        of each project to an archive in store_path named after its hash ID
+        instead of saving them to files, None to save them to files
+    :param post_processor: optional postprocess.PostProcessor to process the
+        images of all projects with, see downloader.Downloader
+    """
+
+    def __init__(
+        self,
+        store_path: str,
+        size: str = "8k",
+        max_workers: int = 4,
+        project_workers: int = 4,
+        per_project_dirs: bool = True,
+        custom_name: str = "",
+        skip_existing: bool = True,
+        ask_rename: Optional[Callable[[str, str, str], Optional[str]]] = None,
+        fetch_project: Callable[[str], dict] = downloader.fetch_project,
+        use_manifest: bool = False,
+        rate_controller: Optional[ratelimit.RateController] = None,
+        retry_policy: Optional[retry.RetryPolicy] = None,
+        dedupe_mode: str = "off",
+        preflight: bool = False,
+        run_metrics: Optional[metrics.RunMetrics] = None,
+        collision_policy: str = "ask",
+        disk_writer: Optional[writer.DiskWriter] = None,
+        archive_format: Optional[str] = None,
+        post_processor: Optional[postprocess.PostProcessor] = None,
+    ):
+        self.store_path = store_path
+        self.size = size
+        self.max_workers = max_workers
+        self.project_workers = project_workers
+        self.per_project_dirs = per_project_dirs
+        self.custom_name = custom_name
+        self.skip_existing = skip_existing
+        self.ask_rename = ask_rename
+        self.fetch_project = fetch_project
+        self.use_manifest = use_manifest
+        self.rate_controller = rate_controller
+        self.retry_policy = (
+            retry_policy if retry_policy is not None else retry.RetryPolicy()
+        )
+        self.dedupe_mode = dedupe_mode
+        self.preflight = preflight
+        self.run_metrics = run_metrics
+        self.collision_policy = collision_policy
+        self.disk_writer = disk_writer
+        self.archive_format = archive_format
+        self.post_processor = post_processor
+        self.hash_index = None
+        # index of each target directory, shared by the projects saved to it
+        self.dir_indexes: dict[str, dirindex.DirectoryIndex] = {}
+        # downloader and number of files of each project, in the order the
+        # JSON data of the projects has arrived
+        self.projects: dict[str, tuple[downloader.Downloader, int]] = {}
+        self.failed: dict[str, str] = {}
+        # number of results of images yielded by run() so far
+        self.IMAGES = 0
+        self._cancel = threading.Event()
+        self._planner: Optional[planner.Planner] = None
+
+    @property
+    def rate_limited(self) -> bool:
+        """
+        Whether a 429 was received and the remaining downloads were cancelled
+        """
+        return self._cancel.is_set()
+
+    def _fetch(self, hash_id: str) -> tuple[dict, Optional[planner.Plan]]:
+        """
+        Fetch the JSON data of a project and, with preflight enabled, send the
+        preflight requests of its images
+
+        :param hash_id: hash ID of the project
+        """
+        project = self.fetch_project(hash_id)
+        if not self.preflight:
+            return project, None
+        jobs = downloader.build_jobs(
+            assets.image_assets(project), self.size, self.custom_name
+        )
+        return project, self._planner.plan(jobs)
+
+    def _start_project(
+        self, hash_id: str, project: dict, plan: Optional[planner.Plan] = None
+    ) -> list[tuple[str, str]]:
+        """
+        Create the downloader of a project, returns its download jobs
+
+        :param hash_id: hash ID of the project
+        :param project: JSON data of the project
+        :param plan: preflight results of the images of the project, if any
+        """
+        image_assets = assets.image_assets(project)
+        store_path = self.store_path
+        project_archive = None
+        if self.archive_format is not None:
+            project_archive = archive.ProjectArchive(
+                archive.archive_path(store_path, hash_id, self.archive_format)
+            )
+        elif self.per_project_dirs:
+            store_path = os.path.join(store_path, hash_id)
+            os.makedirs(store_path, exist_ok=True)
+        if project_archive is None and store_path not in self.dir_indexes:
+            self.dir_indexes[store_path] = dirindex.DirectoryIndex(store_path)
+        project_downloader = downloader.Downloader(
+            store_path,
+            max_workers=self.max_workers,
+            skip_existing=self.skip_existing,
+            ask_rename=self.ask_rename,
+            cancel=self._cancel,
+            use_manifest=self.use_manifest,
+            rate_controller=self.rate_controller,
+            retry_policy=self.retry_policy,
+            hash_index=self.hash_index,
+            dedupe_mode=self.dedupe_mode,
+            expected_sizes=plan.expected_sizes() if plan is not None else None,
+            run_metrics=self.run_metrics,
+            collision_policy=self.collision_policy,
+            dir_index=self.dir_indexes.get(store_path),
+            disk_writer=self.disk_writer,
+            project_archive=project_archive,
+            post_processor=self.post_processor,
+        )
+        jobs = downloader.build_jobs(image_assets, self.size, self.custom_name)
+        self.projects[hash_id] = (project_downloader, len(jobs))
+        return jobs
+
+    def run(self, hash_ids: Iterable[str]) -> Iterator[tuple[str, str]]:
+        """
+        Download the images of all projects and yield the hash ID of the
+        project and the log line of each result as soon as it is available
+
+        Hash IDs are taken from the iterable only when a slot to fetch the JSON
+        data becomes free, so it may also be a generator producing them lazily.
+        They are taken on a separate thread, results are still yielded while a
+        generator waits for e.g. the next page of a listing.
+
+        The results of images are counted in IMAGES.
+
+        :param hash_ids: hash IDs of the projects
+        """
+        hash_ids = iter(hash_ids)
+        if not self.dedupe_mode == "off":
+            self.hash_index = dedupe.HashIndex(self.store_path)
+        sess = transport.get().session(self.max_workers)
+        if self.preflight:
+            self._planner = planner.Planner(
+                sess,
+                max_workers=self.max_workers,
+                retry_policy=self.retry_policy,
+                rate_controller=self.rate_controller,
+            )
+        with ThreadPoolExecutor(max_workers=1) as lister, ThreadPoolExecutor(
+            max_workers=self.project_workers
+        ) as project_pool, ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            # hash ID being taken from the iterable, at most one at a time, and
+            # the hash IDs taken waiting for a slot to fetch the JSON data
+            taking: Optional[Future] = None
+            taken = collections.deque()
+            listed = False
+            fetches = {}
+            downloads = {}
+            # post-processing of the images, by the hash ID of their project
+            processing = {}
+            # downloads of each project not finished yet
+            remaining: dict[str, int] = {}
+
+            def submit_fetches() -> list:
+                nonlocal taking
+                submitted = []
+                while taken and len(fetches) < self.project_workers:
+                    if self.rate_limited:
+                        taken.clear()
+                        break
+                    hash_id = taken.popleft()
+                    if (
+                        hash_id in self.projects
+                        or hash_id in self.failed
+                        or hash_id in fetches.values()
+                    ):
+                        continue  # duplicate
+                    fetch = project_pool.submit(self._fetch, hash_id)
+                    fetches[fetch] = hash_id
+                    submitted.append(fetch)
+                if (
+                    taking is None
+                    and not listed
+                    and not self.rate_limited
+                    and len(fetches) + len(taken) < self.project_workers
+                ):
+                    taking = lister.submit(next, hash_ids, None)
+                    submitted.append(taking)
+                return submitted
+
+            pending = set(submit_fetches())
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future is taking:
+                        taking = None
+                        hash_id = future.result()
+                        if hash_id is None:
+                            listed = True
+                        else:
+                            taken.append(hash_id)
+                        pending.update(submit_fetches())
+                    elif future in fetches:
+                        hash_id = fetches.pop(future)
+                        try:
+                            project, plan = future.result()
+                            jobs = self._start_project(hash_id, project, plan)
+                        except Exception as e:
+                            self.failed[hash_id] = str(e)
+                            yield hash_id, f'! Failed to get JSON of "{hash_id}": {e}'
+                        else:
+                            if plan is not None:
+                                yield hash_id, plan.summary()
+                            project_downloader = self.projects[hash_id][0]
+                            remaining[hash_id] = len(jobs)
+                            for image_url, filename in jobs:
+                                download = pool.submit(
+                                    project_downloader.download_image,
+                                    image_url,
+                                    filename,
+                                    sess,
+                                )
+                                downloads[download] = hash_id
+                                pending.add(download)
+                        pending.update(submit_fetches())
+                    elif future in processing:
+                        self.IMAGES += 1
+                        yield processing.pop(future), future.result()
+                    else:
+                        hash_id = downloads.pop(future)
+                        download_result = future.result()
+                        remaining[hash_id] -= 1
+                        project_archive = self.projects[hash_id][0].project_archive
+                        if remaining[hash_id] == 0 and project_archive is not None:
+                            # Finish the archive now instead of keeping the
+                            # archives of all projects open until the end
+                            project_archive.close()
+                        if download_result is None:
+                            continue  # cancelled before the download started
+                        if isinstance(download_result, Future):
+                            # Yielded once the image has been post-processed
+                            processing[download_result] = hash_id
+                            pending.add(download_result)
+                            continue
+                        self.IMAGES += 1
+                        yield hash_id, download_result
+
+        if self._planner is not None:
+            self._planner.close()
+        for project_downloader, total in self.projects.values():
+            project_downloader.count_cancelled(total)
+            project_downloader.close()
+        if self.hash_index is not None:
+            self.hash_index.close()
+        if self.run_metrics is not None:
+            self.run_metrics.finish()
+
+    def summary(self) -> list[str]:
+        """
+        Get the log lines summarizing the results of each project and of the
+        whole run
+        """
+        lines = []
+        saved = skips = errors = warnings = unchanged = retries = total = 0
+        duplicates = deduped_bytes = refetched = 0
+        for hash_id, (project_downloader, files) in self.projects.items():
+            lines.append(f"{hash_id}: {project_downloader.summary(files)}")
+            saved += project_downloader.SAVED
+            skips += project_downloader.SKIPS
+            errors += project_downloader.ERRORS
+            warnings += project_downloader.WARNINGS
+            unchanged += project_downloader.UNCHANGED
+            retries += project_downloader.RETRIES
+            duplicates += project_downloader.DUPLICATES
+            deduped_bytes += project_downloader.DEDUPED_BYTES
+            refetched += project_downloader.REFETCHED
+            total += files
+        for hash_id, error in self.failed.items():
+            lines.append(f"{hash_id}: >>> Failed to get JSON: {error}")
+        line = (
+            f">>> {len(self.projects) + len(self.failed)} Projects ({len(self.failed)} failed), "
+            f"{total} Files - Saved: {saved}, Skipped: {skips}, Errors: {errors}, Warnings: {warnings}"
+        )
+        if self.use_manifest:
+            line += f", Requests saved: {unchanged}"
+        if retries:
+            line += f", Retries: {retries}"
+        if refetched:
+            line += f", Re-requested (polished): {refetched}"
+        if duplicates:
+            from humanize import naturalsize
+
+            line += f", Duplicates: {duplicates} ({naturalsize(deduped_bytes)} saved)"
+        lines.append(line)
+        return lines
@@ -0,0 +1,200 @@
+# Copyright (C) 2025 Jérémy Rotzetter
+
+import json
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+from typing import Optional
+
+# Hash IDs of projects consist of letters, digits, "_" and "-", other IDs are
+# not cached so that an ID can not name a file outside of the cache directory
+HASH_ID = re.compile(r"[A-Za-z0-9_-]+")
+
+
+def default_cache_dir() -> str:
+    """
+    Get the directory the downloader stores cached data in, by default the
+    per-user cache directory of the operating system
+    """
+    if sys.platform == "win32":
+        base = os.environ.get("LOCALAPPDATA", os.path.expanduser("~"))
+    elif sys.platform == "darwin":
+        base = os.path.expanduser("~/Library/Caches")
+    else:
+        base = os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache"))
+    return os.path.join(base, "artstation-artwork-downloader")
+
+
+class ProjectCache:
+    """
+    On-disk cache of the JSON data of projects keyed by their hash ID
+
+    Entries younger than ttl seconds are used without contacting ArtStation,
+    older ones are revalidated with a conditional request using the stored
+    ETag/Last-Modified validators. Once the cached files exceed max_bytes the
+    least recently used entries are evicted. Projects whose hash ID does not
+    match HASH_ID are not cached.
+
+    :param cache_dir: directory to store the entries in
+    :param ttl: number of seconds an entry is used without revalidation
+    :param max_bytes: maximum total size of all entries
+    """
+
+    def __init__(
+        self,
+        cache_dir: Optional[str] = None,
+        ttl: float = 3600,
+        max_bytes: int = 64 * 1024 * 1024,
+    ):
+        if cache_dir is None:
+            cache_dir = os.path.join(default_cache_dir(), "projects")
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.HITS = 0
+        self.REVALIDATED = 0
+        self.MISSES = 0
+        self._lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _path(self, hash_id: str) -> Optional[str]:
+        """
+        Get the path to the entry of a project, None if its hash ID is invalid
+
+        :param hash_id: hash ID of the project
+        """
+        if HASH_ID.fullmatch(hash_id) is None:
+            return None
+        return os.path.join(self.cache_dir, f"{hash_id}.json")
+
+    def count(self, counter: str):
+        """
+        Increment one of the HITS, REVALIDATED or MISSES counters
+
+        :param counter: name of the counter attribute
+        """
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def get(self, hash_id: str) -> Optional[dict]:
+        """
+        Get the cached entry of a project or None if there is none
+
+        The entry is a dictionary with the keys data, etag, last_modified and
+        fetched_at.
+
+        :param hash_id: hash ID of the project
+        """
+        path = self._path(hash_id)
+        if path is None:
+            return None
+        try:
+            with open(path, encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        try:
+            # The modification time tracks the last use for the LRU eviction
+            os.utime(path)
+        except OSError:
+            pass
+        return entry
+
+    def is_fresh(self, entry: dict) -> bool:
+        """
+        Whether an entry may be used without revalidating it
+
+        :param entry: cached entry as returned by get()
+        """
+        return time.time() - entry.get("fetched_at", 0) < self.ttl
+
+    @staticmethod
+    def validators(entry: dict) -> dict[str, str]:
+        """
+        Get the headers of a conditional request revalidating an entry
+
+        :param entry: cached entry as returned by get()
+        """
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def put(
+        self,
+        hash_id: str,
+        data: dict,
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None,
+    ):
+        """
+        Store the JSON data of a project together with its validators
+
+        :param hash_id: hash ID of the project
+        :param data: JSON data of the project
+        :param etag: ETag header of the response
+        :param last_modified: Last-Modified header of the response
+        """
+        path = self._path(hash_id)
+        if path is None:
+            return
+        entry = {
+            "data": data,
+            "etag": etag,
+            "last_modified": last_modified,
+            "fetched_at": time.time(),
+        }
+        # Write to a temporary file first so concurrent readers never see a
+        # partially written entry
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(entry, f)
+            os.replace(tmp_path, path)
+        except OSError:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return
+        self._evict()
+
+    def _evict(self):
+        """
+        Remove the least recently used entries until the cache fits into max_bytes
+        """
+        with self._lock:
+            entries = []
+            total = 0
+            with os.scandir(self.cache_dir) as it:
+                for dir_entry in it:
+                    if not dir_entry.name.endswith(".json"):
+                        continue
+                    try:
+                        stat = dir_entry.stat()
+                    except OSError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, dir_entry.path))
+                    total += stat.st_size
+            if total <= self.max_bytes:
+                return
+            entries.sort()
+            for _, size, path in entries:
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= size
+                if total <= self.max_bytes:
+                    return
+
+    def summary(self) -> str:
+        """
+        Get the log line summarizing how the project JSON requests were served
+        """
+        return f">>> Project JSON cache - Hits: {self.HITS}, Revalidated: {self.REVALIDATED}, Misses: {self.MISSES}"
@@ -0,0 +1,173 @@
+# Copyright (C) 2025 Jérémy Rotzetter
+
+import json
+import os
+import tempfile
+import threading
+import time
+from typing import Optional
+import requests
+import cache
+
+FILE_NAME = "cloudflare-session.json"
+
+
+def default_clearance_path() -> str:
+    """
+    Get the path to the file the Cloudflare session is stored in
+    """
+    return os.path.join(cache.default_cache_dir(), FILE_NAME)
+
+
+class ClearanceStore:
+    """
+    On-disk store of the cookies and headers (most importantly the user
+    agent) of the cloudscraper session
+
+    Cloudflare binds the clearance cookie it hands out for a solved challenge
+    to the user agent that solved it. Both are saved after a challenge was
+    solved and restored into the scraper of the next run, so the challenge is
+    not solved again until the cookies expire or a request is challenged
+    anyway. Challenges are counted and timed, see track().
+
+    :param path: path to the file to store the session in, None to not store it
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self.CHALLENGES = 0
+        self.CHALLENGE_SECONDS = 0.0
+        self.RESTORED = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def restore(self, scraper: requests.Session) -> int:
+        """
+        Load the stored session into a scraper, returns the number of cookies
+        restored
+
+        Expired cookies are dropped, if none is left the scraper keeps its own
+        headers so it does not send a user agent without its clearance.
+
+        :param scraper: cloudscraper session
+        """
+        if self.path is None:
+            return 0
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                session = json.load(f)
+        except (OSError, ValueError):
+            return 0
+        now = time.time()
+        cookies = [
+            cookie
+            for cookie in session.get("cookies", [])
+            if cookie.get("expires") is not None and cookie["expires"] > now
+        ]
+        if not cookies:
+            return 0
+        scraper.headers.update(session.get("headers", {}))
+        for cookie in cookies:
+            scraper.cookies.set(
+                cookie["name"],
+                cookie["value"],
+                domain=cookie["domain"],
+                path=cookie["path"],
+                expires=cookie["expires"],
+                secure=cookie["secure"],
+            )
+        self.RESTORED = len(cookies)
+        return len(cookies)
+
+    def save(self, scraper: requests.Session):
+        """
+        Store the cookies and headers of a scraper, session cookies without an
+        expiry date are left out
+
+        :param scraper: cloudscraper session
+        """
+        if self.path is None:
+            return
+        session = {
+            "saved_at": time.time(),
+            "headers": dict(scraper.headers),
+            "cookies": [
+                {
+                    "name": cookie.name,
+                    "value": cookie.value,
+                    "domain": cookie.domain,
+                    "path": cookie.path,
+                    "expires": cookie.expires,
+                    "secure": cookie.secure,
+                }
+                for cookie in scraper.cookies
+                if cookie.expires is not None
+            ],
+        }
+        directory = os.path.dirname(os.path.abspath(self.path))
+        try:
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        except OSError:
+            return
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(session, f)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+    def track(self, scraper: requests.Session):
+        """
+        Count the challenges a scraper is sent, time how long solving them
+        takes and save the session once one was solved
+
+        :param scraper: cloudscraper session, created without requestPostHook
+        """
+        import cloudscraper
+
+        request = scraper.request
+        local = self._local
+
+        def post_hook(session, response):
+            if cloudscraper.Cloudflare(session).is_Challenge_Request(response):
+                with self._lock:
+                    self.CHALLENGES += 1
+                local.challenged = True
+            return response
+
+        def tracked_request(method, url, *args, **kwargs):
+            # Solving a challenge sends further requests through this method,
+            # only the outermost call is timed
+            depth = getattr(local, "depth", 0)
+            if depth == 0:
+                local.challenged = False
+            local.depth = depth + 1
+            started = time.perf_counter()
+            solved = False
+            try:
+                response = request(method, url, *args, **kwargs)
+                solved = True
+                return response
+            finally:
+                local.depth = depth
+                if depth == 0 and local.challenged:
+                    with self._lock:
+                        self.CHALLENGE_SECONDS += time.perf_counter() - started
+                    if solved:
+                        self.save(scraper)
+
+        scraper.requestPostHook = post_hook
+        scraper.request = tracked_request
+
+    def summary(self) -> str:
+        """
+        Get the log line summarizing the Cloudflare challenges
+        """
+        return (
+            f">>> Cloudflare - Challenges: {self.CHALLENGES} ({self.CHALLENGE_SECONDS:.1f} s), "
+            f"Clearance cookies restored: {self.RESTORED}"
+        )
@@ -0,0 +1,396 @@
+# Copyright (C) 2025 Jérémy Rotzetter
+
+import argparse
+import functools
+import itertools
+import os
+import sys
+import archive
+import batch
+import cache
+import clearance
+import dedupe
+import dirindex
+import downloader
+import metrics
+import portfolio
+import postprocess
+import ratelimit
+import retry
+import transport
+import writer
+
+
+def positive_int(value: str) -> int:
+    """
+    Parse a command line value that must be a number greater than 0
+
+    :param value: value given on the command line
+    """
+    try:
+        number = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid int value: {value!r}")
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1: {value!r}")
+    return number
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="python -m cli",
+        description="Download artwork projects from ArtStation without the GUI",
+    )
+    parser.add_argument(
+        "hash_ids",
+        nargs="*",
+        metavar="HASH_ID",
+        help="project hash ID (found after artstation.com/artwork/) or URL to the project",
+    )
+    parser.add_argument(
+        "-i",
+        "--input",
+        metavar="FILE",
+        help="text or JSONL file with one hash ID (or project URL) per line",
+    )
+    parser.add_argument(
+        "-u",
+        "--user",
+        action="append",
+        default=[],
+        metavar="USERNAME",
+        help="download all projects of an artist (username or URL to the portfolio), may be repeated",
+    )
+    parser.add_argument(
+        "-s",
+        "--size",
+        choices=downloader.IMG_SCALE,
+        default="8k",
+        help="image dimensions to download (default: %(default)s)",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        default=".",
+        help="directory to save the images to (default: current directory)",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=positive_int,
+        default=4,
+        help="maximum number of parallel downloads (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--project-jobs",
+        type=positive_int,
+        default=4,
+        help="maximum number of project JSON files (and portfolio pages) fetched in parallel "
+        "(default: %(default)s)",
+    )
+    parser.add_argument(
+        "--flat",
+        action="store_true",
+        help="save all images directly to the output directory instead of a subdirectory per project",
+    )
+    parser.add_argument(
+        "-n",
+        "--name",
+        default="",
+        help="custom file name, files will be numbered sequentially",
+    )
+    parser.add_argument(
+        "--archive",
+        choices=archive.ARCHIVE_FORMATS,
+        default=None,
+        help="append the images of each project to an uncompressed archive named after its hash ID "
+        "instead of saving them to files, with a member index next to it",
+    )
+    parser.add_argument(
+        "--on-collision",
+        choices=[
+            policy for policy in dirindex.COLLISION_POLICIES if not policy == "ask"
+        ],
+        default="skip",
+        help="what to do when a file with the name of an image already exists: keep it (skip), "
+        "replace it if the size differs, save the image with a numbered suffix if the size differs "
+        "(auto-suffix) or always (keep-both) (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--write-buffer",
+        type=float,
+        default=0,
+        metavar="MB",
+        help="write the images on separate threads, holding at most MB of downloaded data "
+        "that is not written to disk yet (default: write on the download threads)",
+    )
+    parser.add_argument(
+        "--writer-threads",
+        type=positive_int,
+        default=1,
+        help="number of threads writing the images to disk (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--direct-io",
+        action="store_true",
+        help="write the images with O_DIRECT, bypassing the page cache (Linux only)",
+    )
+    parser.add_argument(
+        "--fsync-batch",
+        type=int,
+        default=0,
+        metavar="N",
+        help="sync the images to disk before they are renamed into place, "
+        "N finished files at a time (default: do not sync)",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="always fetch the JSON data of the projects instead of using the on-disk cache",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        default=None,
+        help="directory of the project JSON cache and the Cloudflare session "
+        "(default: per-user cache directory)",
+    )
+    parser.add_argument(
+        "--cache-ttl",
+        type=float,
+        default=3600,
+        help="seconds a cached project JSON is used before it is revalidated (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--no-manifest",
+        action="store_true",
+        help="do not keep a manifest of the downloaded images to skip unchanged ones on the next run",
+    )
+    parser.add_argument(
+        "--rate",
+        type=float,
+        default=None,
+        help="maximum number of image requests per second (default: unlimited)",
+    )
+    parser.add_argument(
+        "--abort-on-429",
+        action="store_true",
+        help="cancel all remaining downloads when rate limited instead of backing off and retrying",
+    )
+    parser.add_argument(
+        "--retries",
+        type=positive_int,
+        default=3,
+        help="maximum number of attempts per request on transient errors (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--connect-timeout",
+        type=float,
+        default=5,
+        help="seconds to wait for a connection to be established (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--read-timeout",
+        type=float,
+        default=15,
+        help="seconds to wait for the server to send data (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--dedupe",
+        choices=dedupe.DEDUPE_MODES,
+        default="off",
+        help="replace images whose content was already saved below the output directory "
+        "with a hard link (link) or do not keep them (skip) (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--plan",
+        action="store_true",
+        help="send a HEAD request for each image before downloading it to report the total size "
+        "and the sizes actually available, and re-request images Cloudflare sends optimized",
+    )
+    parser.add_argument(
+        "--post-process",
+        action="append",
+        default=[],
+        metavar="PROCESSOR",
+        help="process each saved image on a pool of processes while the downloads continue and add "
+        "the results to its log line: verify (decode it), icc (report its color profile), thumbnail "
+        "(save a thumbnail to .thumbnails) or module:function, may be repeated",
+    )
+    parser.add_argument(
+        "--post-workers",
+        type=positive_int,
+        default=None,
+        help="number of post-processing processes (default: number of CPUs)",
+    )
+    parser.add_argument(
+        "--post-queue",
+        type=positive_int,
+        default=None,
+        metavar="N",
+        help="maximum number of images waiting for post-processing before the downloads wait "
+        "(default: twice the number of processes)",
+    )
+    parser.add_argument(
+        "--metrics-json",
+        metavar="FILE",
+        default=None,
+        help="export the timings of the run (per image and aggregated) to a JSON file",
+    )
+    parser.add_argument(
+        "--metrics-prometheus",
+        metavar="FILE",
+        default=None,
+        help="export the aggregated timings of the run to a Prometheus text format file",
+    )
+    args = parser.parse_args(argv)
+    if not args.hash_ids and args.input is None and not args.user:
+        parser.error("at least one HASH_ID, an --input file or a --user is required")
+    if args.archive is not None and not args.dedupe == "off":
+        parser.error("--dedupe can not be used with --archive")
+    if args.archive is not None and args.post_process:
+        parser.error("--post-process can not be used with --archive")
+    for spec in args.post_process:
+        try:
+            postprocess.resolve(spec)
+        except ValueError as e:
+            parser.error(str(e))
+    return args
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    if not os.path.isdir(args.output):
+        print(f"Directory does not exist: {args.output}", file=sys.stderr)
+        return 1
+
+    hash_ids = [batch.parse_hash_id(hash_id) for hash_id in args.hash_ids]
+    if args.input is not None:
+        try:
+            hash_ids += batch.read_hash_ids(args.input)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Failed to read hash IDs from {args.input}: {e}", file=sys.stderr)
+            return 1
+
+    project_cache = None
+    if not args.no_cache:
+        cache_dir = args.cache_dir
+        if cache_dir is not None:
+            cache_dir = os.path.join(cache_dir, "projects")
+        project_cache = cache.ProjectCache(cache_dir, ttl=args.cache_ttl)
+    if args.cache_dir is not None:
+        transport.get().clearance_store = clearance.ClearanceStore(
+            os.path.join(args.cache_dir, clearance.FILE_NAME)
+        )
+
+    retry_policy = retry.RetryPolicy(
+        attempts=args.retries,
+        connect_timeout=args.connect_timeout,
+        read_timeout=args.read_timeout,
+    )
+    rate_controller = None
+    if not args.abort_on_429:
+        rate_controller = ratelimit.RateController(args.jobs, rate=args.rate)
+    run_metrics = metrics.RunMetrics()
+    portfolios = [
+        portfolio.Portfolio(
+            portfolio.parse_username(username),
+            max_workers=args.project_jobs,
+            retry_policy=retry_policy,
+        )
+        for username in args.user
+    ]
+
+    disk_writer = None
+    if args.write_buffer > 0:
+        disk_writer = writer.DiskWriter(
+            int(args.write_buffer * 1024**2),
+            threads=args.writer_threads,
+            direct=args.direct_io,
+            fsync_batch=args.fsync_batch,
+        )
+
+    post_processor = None
+    if args.post_process:
+        post_processor = postprocess.PostProcessor(
+            args.post_process,
+            max_workers=args.post_workers,
+            max_pending=args.post_queue,
+        )
+
+    batch_downloader = batch.BatchDownloader(
+        args.output,
+        size=args.size,
+        max_workers=args.jobs,
+        project_workers=args.project_jobs,
+        per_project_dirs=not args.flat,
+        custom_name=args.name,
+        fetch_project=functools.partial(
+            downloader.fetch_project,
+            cache=project_cache,
+            retry_policy=retry_policy,
+            run_metrics=run_metrics,
+        ),
+        use_manifest=not args.no_manifest,
+        rate_controller=rate_controller,
+        retry_policy=retry_policy,
+        dedupe_mode=args.dedupe,
+        preflight=args.plan,
+        run_metrics=run_metrics,
+        collision_policy=args.on_collision,
+        disk_writer=disk_writer,
+        archive_format=args.archive,
+        post_processor=post_processor,
+    )
+    # The pages of the portfolios are fetched while the projects found so far
+    # are already being downloaded
+    hash_ids = itertools.chain(
+        hash_ids, *(artist_portfolio.hash_ids() for artist_portfolio in portfolios)
+    )
+    for hash_id, download_result in batch_downloader.run(hash_ids):
+        print(f"{hash_id}: {download_result}")
+    if disk_writer is not None:
+        disk_writer.close()
+    if post_processor is not None:
+        post_processor.close()
+    if batch_downloader.rate_limited:
+        print("< Rate limit exceeded, cancelled download of remaining files")
+    for line in batch_downloader.summary():
+        print(line)
+    for artist_portfolio in portfolios:
+        print(artist_portfolio.summary())
+    if project_cache is not None:
+        print(project_cache.summary())
+    if rate_controller is not None:
+        print(rate_controller.summary())
+    print(retry_policy.summary())
+    print(transport.get().summary())
+    print(transport.get().clearance_store.summary())
+    print(run_metrics.summary())
+    if disk_writer is not None:
+        print(disk_writer.summary())
+    if post_processor is not None:
+        print(post_processor.summary())
+
+    exit_code = 0
+    try:
+        if args.metrics_json is not None:
+            run_metrics.write_json(args.metrics_json)
+        if args.metrics_prometheus is not None:
+            run_metrics.write_prometheus(args.metrics_prometheus)
+    except OSError as e:
+        print(f"Failed to export metrics: {e}", file=sys.stderr)
+        exit_code = 1
+    if any(artist_portfolio.failed for artist_portfolio in portfolios):
+        exit_code = 1
+    if post_processor is not None and post_processor.FAILED:
+        exit_code = 1
+    if batch_downloader.failed or any(
+        project_downloader.ERRORS
+        for project_downloader, _ in batch_downloader.projects.values()
+    ):
+        exit_code = 1
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,94 @@
+# Copyright (C) 2025 Jérémy Rotzetter
+
+import os
+import sqlite3
+import threading
+from typing import Optional
+
+HASH_INDEX_NAME = ".artstation-hashes.sqlite3"
+DEDUPE_MODES = ["off", "link", "skip"]
+
+
+class HashIndex:
+    """
+    SQLite index of the SHA-256 hashes of all images saved below a directory
+
+    ArtStation sends the bytes of the largest available size if a larger one
+    is requested and the same image is often posted in several projects, the
+    index allows to tell such duplicates apart once they are downloaded.
+
+    :param store_path: path to the root directory of the images
+    """
+
+    def __init__(self, store_path: str):
+        self.store_path = store_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            os.path.join(store_path, HASH_INDEX_NAME), check_same_thread=False
+        )
+        with self._conn:
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS hashes (
+                    sha256 TEXT PRIMARY KEY,
+                    path TEXT NOT NULL,
+                    byte_size INTEGER NOT NULL
+                )
+                """
+            )
+
+    def claim(self, sha256: str, byte_size: int, file_path: str) -> Optional[str]:
+        """
+        Get the path to an existing file with the same content as a new file
+        or, if there is none, add the new file to the index and return None
+
+        :param sha256: SHA-256 hash of the content of the new file
+        :param byte_size: size of the new file
+        :param file_path: path to the new file
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT path, byte_size FROM hashes WHERE sha256 = ?", (sha256,)
+            ).fetchone()
+            if row is not None:
+                existing = os.path.join(self.store_path, row[0])
+                try:
+                    if (
+                        row[1] == byte_size
+                        and os.path.getsize(existing) == byte_size
+                        and not os.path.samefile(existing, file_path)
+                    ):
+                        return existing
+                except OSError:
+                    pass  # the file was removed since, replace the entry
+            with self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO hashes VALUES (?, ?, ?)",
+                    (sha256, os.path.relpath(file_path, self.store_path), byte_size),
+                )
+            return None
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def hardlink(existing: str, file_path: str) -> bool:
+    """
+    Replace a file by a hard link to another file with the same content,
+    returns False if the file system does not support it
+
+    :param existing: path to the file to link to
+    :param file_path: path to the file to replace
+    """
+    tmp_path = f"{file_path}.link"
+    try:
+        os.link(existing, tmp_path)
+        os.replace(tmp_path, file_path)
+    except OSError:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        return False
+    return True
@@ -0,0 +1,163 @@
+# Copyright (C) 2025 Jérémy Rotzetter
+
+import os
+import stat
+import threading
+from typing import Optional
+
+# What to do when a file with the name of an image already exists:
+# ask - skip it, or ask for a new name if the downloader was given a callback
+#       and existing files are not always skipped (the behavior of the GUI)
+# skip - keep the existing file and skip the image
+# overwrite-if-size-differs - skip the image if the existing file has the size
+#       the server reports, otherwise replace the file
+# auto-suffix - skip the image if the existing file has the same size,
+#       otherwise save it with a numbered suffix, e.g. "name (1).jpg"
+# keep-both - always save the image with a numbered suffix
+COLLISION_POLICIES = (
+    "ask",
+    "skip",
+    "overwrite-if-size-differs",
+    "auto-suffix",
+    "keep-both",
+)
+
+
+class DirectoryIndex:
+    """
+    Names and sizes of the files in a directory, read once with os.scandir()
+    and kept up to date as the downloader writes files
+
+    Looking a name up in the index replaces a stat call per image, which is
+    what dominates on network shares with many files. The directory is read
+    without a stat call per entry, the size of an existing file is only
+    looked up once a collision policy needs it. Changes made to the directory
+    by other programs during the run are not seen.
+
+    Names are compared the way the file system does on Windows, ignoring
+    case, everywhere else exactly.
+
+    A download reserves the names of its partial and final file with
+    reserve() before it writes to them and releases them once done, so
+    concurrent downloads of images with the same name do not write to the
+    same file. Reserved names count as taken.
+
+    :param path: path to the directory
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        # size of each file in bytes, None if it was not looked up yet
+        self._sizes: dict[str, Optional[int]] = {}
+        # next suffix number to try for a name, so that finding a free name
+        # does not test every number taken before
+        self._suffixes: dict[str, int] = {}
+        # names reserved by downloads in flight
+        self._reserved: set[str] = set()
+        self._lock = threading.Lock()
+        try:
+            with os.scandir(path) as it:
+                for dir_entry in it:
+                    self._sizes[os.path.normcase(dir_entry.name)] = None
+        except FileNotFoundError:
+            pass
+
+    def __len__(self) -> int:
+        return len(self._sizes)
+
+    def exists(self, name: str) -> bool:
+        """
+        Whether a file (or anything else) with a name exists in the directory
+        or the name is reserved by a download
+
+        :param name: file name
+        """
+        key = os.path.normcase(name)
+        return key in self._sizes or key in self._reserved
+
+    def size(self, name: str) -> Optional[int]:
+        """
+        Get the size of a file in bytes, None if there is no such file (or it
+        is not a regular file)
+
+        :param name: file name
+        """
+        key = os.path.normcase(name)
+        if key not in self._sizes:
+            return None
+        size = self._sizes[key]
+        if size is None:
+            try:
+                st = os.stat(os.path.join(self.path, name))
+            except OSError:
+                return None
+            if not stat.S_ISREG(st.st_mode):
+                return None
+            size = st.st_size
+            with self._lock:
+                self._sizes[key] = size
+        return size
+
+    def add(self, name: str, size: Optional[int] = None):
+        """
+        Record a file written to the directory
+
+        :param name: file name
+        :param size: size of the file in bytes, None to look it up when needed
+        """
+        with self._lock:
+            self._sizes[os.path.normcase(name)] = size
+
+    def remove(self, name: str):
+        """
+        Record a file removed from the directory
+
+        :param name: file name
+        """
+        with self._lock:
+            self._sizes.pop(os.path.normcase(name), None)
+
+    def reserve(self, name: str, replace: bool = False) -> bool:
+        """
+        Reserve a name for a download in flight, returns False if another
+        download reserved it already or, unless replace is set, a file with the
+        name exists
+
+        :param name: file name
+        :param replace: whether an existing file may be written to
+        """
+        key = os.path.normcase(name)
+        with self._lock:
+            if key in self._reserved or (not replace and key in self._sizes):
+                return False
+            self._reserved.add(key)
+        return True
+
+    def release(self, name: str):
+        """
+        Release a name reserved by reserve() or free_name(), call add() before
+        if the file was written
+
+        :param name: file name
+        """
+        with self._lock:
+            self._reserved.discard(os.path.normcase(name))
+
+    def free_name(self, filename: str, ext: str) -> str:
+        """
+        Get a name with a numbered suffix that is not taken yet and reserve it
+
+        :param filename: name of the file without extension
+        :param ext: extension of the file
+        """
+        key = os.path.normcase(f"{filename}{ext}")
+        with self._lock:
+            number = self._suffixes.get(key, 1)
+            while True:
+                name = f"{filename} ({number}){ext}"
+                if not self.exists(name):
+                    break
+                number += 1
+            self._suffixes[key] = number + 1
+            self._reserved.add(os.path.normcase(name))
+        return name
@@ -0,0 +1,1017 @@
+# Copyright (C) 2025 Jérémy Rotzetter
+
+import hashlib
+import os
+import secrets
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, Iterable, Iterator, Optional, Union
+import requests
+import archive
+import assets
+import dedupe
+import dirindex
+import imageinfo
+import jsonstream
+import manifest
+import metrics
+import postprocess
+import ratelimit
+import retry
+import streaming
+import transport
+import writer
+
+IMG_SCALE = ["small", "medium", "large", "4k", "8k"]
+PROJECT_URL = "https://www.artstation.com/projects/{hash_id}.json"
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/143.0.0.0 Safari/537.36",
+    "Cache-Control": "max-age=0, no-cache, no-store, must-revalidate",
+}
+# Most common image extensions
+EXTN_FROM_CONTENT_TYPE = {
+    "image/avif": ".avif",
+    "image/bmp": ".bmp",
+    "image/gif": ".gif",
+    "image/jpeg": ".jpg",
+    "image/jpg": ".jpg",
+    "image/png": ".png",
+    "image/tiff": ".tiff",
+    "image/webp": ".webp",
+}
+# Header Cloudflare adds to images it has optimized with 'Polish', e.g.
+# "cf-polished: origSize=1234567" or "cf-polished: degrade=85, origSize=..."
+POLISH_HEADER = "cf-polished"
+# Number of fresh cache busting tokens tried before accepting a polished image
+POLISH_RETRIES = 3
+# The validator (ETag or Last-Modified) of the image a partial file holds the
+# beginning of is stored next to it as <partial file>.validator
+VALIDATOR_SUFFIX = ".validator"
+
+
+def project_url(hash_id: str) -> str:
+    """
+    Get the URL to the JSON data of a project
+
+    :param hash_id: hash ID of the project (found after artstation.com/artwork/)
+    """
+    return PROJECT_URL.format(hash_id=hash_id)
+
+
+def fetch_project(
+    hash_id: str,
+    cache=None,
+    retry_policy: Optional[retry.RetryPolicy] = None,
+    run_metrics: Optional[metrics.RunMetrics] = None,
+) -> dict:
+    """
+    Fetch the JSON data of a project from ArtStation
+
+    :param hash_id: hash ID of the project
+    :param cache: optional cache.ProjectCache, fresh entries are returned
+        without a request and stale ones are revalidated with a conditional request
+    :param retry_policy: policy for retrying the request on transient errors
+    :param run_metrics: optional metrics.RunMetrics to record the fetch in
+    """
+    started = time.perf_counter()
+
+    def record(source: str, nbytes: int = 0):
+        if run_metrics is not None:
+            run_metrics.record_fetch(
+                hash_id, time.perf_counter() - started, nbytes, source
+            )
+
+    if retry_policy is None:
+        retry_policy = retry.RetryPolicy()
+    headers = {}
+    entry = None
+    if cache is not None:
+        entry = cache.get(hash_id)
+        if entry is not None:
+            if cache.is_fresh(entry):
+                cache.count("HITS")
+                record("hit")
+                return entry["data"]
+            headers = cache.validators(entry)
+
+    scraper = transport.get().scraper()
+
+    def get():
+        response = scraper.get(
+            project_url(hash_id), timeout=retry_policy.timeout, headers=headers
+        )
+        if not response.status_code == 304:
+            response.raise_for_status()
+        return response
+
+    response = retry_policy.call(get)
+    if response.status_code == 304 and entry is not None:
+        # Not modified, store the entry again to restart its time to live
+        cache.count("REVALIDATED")
+        cache.put(
+            hash_id,
+            entry["data"],
+            response.headers.get("ETag", entry.get("etag")),
+            response.headers.get("Last-Modified", entry.get("last_modified")),
+        )
+        record("revalidated")
+        return entry["data"]
+    # Only the fields the downloader uses are kept, also in the cache
+    data = jsonstream.load_project(response.content)
+    record("miss", len(response.content))
+    if cache is not None:
+        cache.count("MISSES")
+        cache.put(
+            hash_id,
+            data,
+            response.headers.get("ETag"),
+            response.headers.get("Last-Modified"),
+        )
+    return data
+
+
+def load_json(json_string: str) -> dict:
+    """
+    Parse the JSON data of a project, raises json.JSONDecodeError if invalid
+
+    Only the fields the downloader uses are kept, see jsonstream.iter_projects().
+
+    :param json_string: JSON data as text
+    """
+    return jsonstream.load_project(json_string)
+
+
+def no_cache(url: str) -> str:
+    """
+    Prevent a cache hit to circumvent Cloudflare's 'optimizations'
+
+    Artstation will send different images depending on whether an image
+    is a cache hit or miss due to Cloudflare's 'Polish' image optimization [1].
+    This feature removes image metadata, including color profiles, which can
+    distort the colors [2], and may even recompress an image which might lead to
+    image quality loss [3]. Adding a random dummy query parameter should cause a
+    cache miss and prevent this from happening [1].
+
+    Reference:
+    [1] https://github.com/r888888888/danbooru/issues/3528
+    [2] https://pwmon.org/p/5470/cloudflare-discolors-web/
+    [3] https://blog.cloudflare.com/introducing-polish-automatic-image-optimizati/
+    """
+    dummy_param = secrets.token_hex(16)
+    # dummy_param = secrets.token_urlsafe(16)
+    return f"{url}&{dummy_param}"
+
+
+def polished_size(resp: requests.Response) -> Optional[int]:
+    """
+    Get the original size of an image Cloudflare's 'Polish' has optimized,
+    returns 0 if the image was polished but the size is unknown and None if
+    it was not polished
+
+    :param resp: Server's response to HTTP request for image
+    """
+    value = resp.headers.get(POLISH_HEADER)
+    if value is None:
+        return None
+    for item in value.split(","):
+        key, _, size = item.strip().partition("=")
+        if key.lower() == "origsize" and size.isdigit():
+            return int(size)
+    return 0
+
+
+def get_filename(url: str) -> str:
+    """
+    Get the filename from a URL without the file extension
+
+    :param url: URL to file
+    """
+    clean_url = url.split("?", 1)[0]
+    basename = os.path.basename(clean_url)
+    cleaned_name = os.path.splitext(basename)[0]
+    return cleaned_name
+
+
+def get_extension(
+    url: str, resp: requests.Response, allowed_extn: dict[str, str]
+) -> str:
+    """
+    Get the extension of a file from a URL either from server's response
+    Content-Type or from the URL suffix if Content-Type does not exist or
+    is not in the dictionary of the allowed extensions
+
+    :param url: URL to file
+    :param resp: Server's response to HTTP request for file
+    :param allowed_extn: file extension to look for from Content-Type in server's response
+    """
+    # Get extension from Content-Type header...
+    content_type = resp.headers.get("Content-Type", "").split(";")[0].strip().lower()
+    extn = allowed_extn.get(content_type)
+
+    # ...else fallback to URL suffix if not known Content-Type
+    # (sometimes files have the wrong extension)
+    if not extn:
+        clean_url = url.split("?", 1)[0]
+        extn = os.path.splitext(clean_url)[1]
+    return extn
+
+
+def content_range_start(resp: requests.Response) -> Optional[int]:
+    """
+    Get the first byte position of a partial response from its Content-Range
+    header (bytes <start>-<end>/<total>) or None if it has none
+
+    :param resp: Server's response to HTTP request for file
+    """
+    content_range = resp.headers.get("Content-Range", "")
+    unit, _, byte_range = content_range.partition(" ")
+    if not unit == "bytes":
+        return None
+    try:
+        return int(byte_range.split("-", 1)[0])
+    except ValueError:
+        return None
+
+
+def response_validator(resp: requests.Response) -> Optional[str]:
+    """
+    Get the validator of a response that can be sent as If-Range header, a
+    strong ETag or else the Last-Modified date, None if it has none
+
+    :param resp: Server's response to HTTP request for file
+    """
+    etag = resp.headers.get("ETag")
+    if etag and not etag.startswith("W/"):
+        return etag
+    return resp.headers.get("Last-Modified")
+
+
+def read_validator(part_path: str) -> Optional[str]:
+    """
+    Get the validator stored for a partial file, None if there is none
+
+    :param part_path: path to the partial file
+    """
+    try:
+        with open(f"{part_path}{VALIDATOR_SUFFIX}", encoding="utf-8") as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+def write_validator(part_path: str, validator: Optional[str]):
+    """
+    Store the validator of the image a partial file is written from, or
+    remove the stored one if it is None
+
+    :param part_path: path to the partial file
+    :param validator: validator as returned by response_validator()
+    """
+    path = f"{part_path}{VALIDATOR_SUFFIX}"
+    if validator is None:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        return
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(validator)
+
+
+def build_jobs(
+    image_assets: Iterable[assets.Asset], size: str, custom_name: str = ""
+) -> list[tuple[str, str]]:
+    """
+    Pair the URL of each image in the requested size with its filename
+
+    :param image_assets: image assets of a project, see assets.image_assets()
+    :param size: one of IMG_SCALE
+    :param custom_name: if given, files are named with it and a sequential number
+    """
+    jobs = []
+    for counter, asset in enumerate(image_assets, start=1):
+        url = asset.url(size)
+        if custom_name:
+            filename = f"{custom_name}{counter}"
+        else:
+            filename = get_filename(url)
+        jobs.append((url, filename))
+    return jobs
+
+
+class Downloader:
+    """
+    Download images concurrently into a directory and keep count of the results
+
+    :param store_path: path to target directory
+    :param max_workers: maximum number of parallel downloads
+    :param skip_existing: skip files that already exist without asking for a new name
+    :param ask_rename: called with filename, extension and store path when a
+        file already exists, returns the new filename or None to skip the file.
+        It is called from the worker threads.
+    :param headers: HTTP headers to send with each request
+    :param allowed_extn: file extension to look for from Content-Type in server's response
+    :param cancel: event shared with other downloaders that cancels the
+        remaining downloads of all of them once a 429 was received
+    :param use_manifest: keep a manifest of the downloaded images in the
+        target directory and skip images that are already up to date without
+        sending a request
+    :param rate_controller: optional ratelimit.RateController shared by all
+        workers, rate limited downloads are then retried after backing off
+        instead of cancelling all remaining downloads
+    :param retry_policy: policy for retrying downloads that failed due to a
+        transient error, may be shared by several downloaders
+    :param hash_index: optional dedupe.HashIndex, may be shared by several
+        downloaders, to detect images whose content was already saved
+    :param dedupe_mode: how to handle such duplicates, "link" replaces them
+        with a hard link to the file saved first and "skip" does not keep them
+    :param expected_sizes: sizes of the images keyed by URL as found by the
+        planner.Planner, an image sent with another size is re-requested with
+        a fresh cache busting token before it is saved
+    :param run_metrics: optional metrics.RunMetrics, may be shared by several
+        downloaders, to record the timings of each download in
+    :param collision_policy: one of dirindex.COLLISION_POLICIES, what to do
+        when a file with the name of an image already exists
+    :param dir_index: index of the files in store_path, may be shared by
+        several downloaders saving to the same directory, by default the
+        directory is scanned when the downloader is created
+    :param disk_writer: optional writer.DiskWriter, may be shared by several
+        downloaders, to write the images on its threads instead of on the
+        threads downloading them
+    :param project_archive: optional archive.ProjectArchive to append the
+        images to instead of saving each to a file in store_path. It takes the
+        place of dir_index, the manifest and hash index are not used.
+    :param post_processor: optional postprocess.PostProcessor, may be shared
+        by several downloaders, that processes each saved image while the
+        downloads continue, see download_image()
+    """
+
+    def __init__(
+        self,
+        store_path: str,
+        max_workers: int = 4,
+        skip_existing: bool = True,
+        ask_rename: Optional[Callable[[str, str, str], Optional[str]]] = None,
+        headers: dict[str, str] = HEADERS,
+        allowed_extn: dict[str, str] = EXTN_FROM_CONTENT_TYPE,
+        cancel: Optional[threading.Event] = None,
+        use_manifest: bool = False,
+        rate_controller: Optional[ratelimit.RateController] = None,
+        retry_policy: Optional[retry.RetryPolicy] = None,
+        hash_index: Optional[dedupe.HashIndex] = None,
+        dedupe_mode: str = "link",
+        expected_sizes: Optional[dict[str, int]] = None,
+        run_metrics: Optional[metrics.RunMetrics] = None,
+        collision_policy: str = "ask",
+        dir_index: Optional[dirindex.DirectoryIndex] = None,
+        disk_writer: Optional[writer.DiskWriter] = None,
+        project_archive: Optional[archive.ProjectArchive] = None,
+        post_processor: Optional[postprocess.PostProcessor] = None,
+    ):
+        self.store_path = store_path
+        self.max_workers = max_workers
+        self.skip_existing = skip_existing
+        self.ask_rename = ask_rename
+        self.headers = headers
+        self.allowed_extn = allowed_extn
+        self.SAVED = 0
+        self.SKIPS = 0
+        self.ERRORS = 0
+        self.WARNINGS = 0
+        self.UNCHANGED = 0
+        self.RETRIES = 0
+        self.DUPLICATES = 0
+        self.DEDUPED_BYTES = 0
+        self.REFETCHED = 0
+        self.expected_sizes = expected_sizes if expected_sizes is not None else {}
+        self.run_metrics = run_metrics
+        self.project_archive = project_archive
+        if project_archive is not None:
+            use_manifest = False
+            hash_index = None
+            dir_index = project_archive
+        self.hash_index = hash_index
+        self.dedupe_mode = dedupe_mode
+        self.rate_controller = rate_controller
+        self.retry_policy = (
+            retry_policy if retry_policy is not None else retry.RetryPolicy()
+        )
+        self.manifest = manifest.Manifest(store_path) if use_manifest else None
+        self.collision_policy = collision_policy
+        self.dir_index = (
+            dir_index if dir_index is not None else dirindex.DirectoryIndex(store_path)
+        )
+        self.disk_writer = disk_writer
+        self.post_processor = post_processor
+        self._count_lock = threading.Lock()
+        # path of the image saved by the current download of each thread
+        self._local = threading.local()
+        self._cancel = cancel if cancel is not None else threading.Event()
+
+    @property
+    def rate_limited(self) -> bool:
+        """
+        Whether a 429 was received and the remaining downloads were cancelled
+        """
+        return self._cancel.is_set()
+
+    def _count(self, counter: str, amount: int = 1):
+        """
+        Increment one of the SAVED, SKIPS, ERRORS, WARNINGS, ... counters
+
+        :param counter: name of the counter attribute
+        :param amount: number to add to the counter
+        """
+        with self._count_lock:
+            setattr(self, counter, getattr(self, counter) + amount)
+
+    def _open_stream(
+        self, session: requests.Session, url: str, part_path: str
+    ) -> tuple[requests.Response, int]:
+        """
+        Send the GET request of a download, returns the streamed response and
+        the byte position it starts at
+
+        If a partial file of a previous attempt exists, only the missing bytes
+        are requested with a Range header. Should the server not support ranges
+        the whole file is downloaded again. The validator stored with the
+        partial file is sent as If-Range header, so a server sends the whole
+        image if it changed since, and a partial response with another
+        validator discards the partial file.
+
+        :param session: session to send the request with
+        :param url: URL to image
+        :param part_path: path to the partial file, None if the image is not
+            saved to a file
+        """
+        offset = 0
+        if part_path is not None:
+            try:
+                offset = os.path.getsize(part_path)
+            except OSError:
+                pass
+        if offset == 0:
+            return (
+                session.get(
+                    url,
+                    timeout=self.retry_policy.timeout,
+                    stream=True,
+                    headers=self.headers,
+                ),
+                0,
+            )
+
+        headers = {**self.headers, "Range": f"bytes={offset}-"}
+        validator = read_validator(part_path)
+        if validator is not None:
+            headers["If-Range"] = validator
+        resp = session.get(
+            url, timeout=self.retry_policy.timeout, stream=True, headers=headers
+        )
+        if resp.status_code == 206:
+            sent_validator = response_validator(resp)
+            if content_range_start(resp) == offset and (
+                validator is None or sent_validator in (None, validator)
+            ):
+                return resp, offset
+        elif not resp.status_code == 416:
+            # Ranges not supported or the image changed, the whole file is sent
+            return resp, 0
+
+        # The partial file does not fit the image on the server (anymore)
+        resp.close()
+        os.remove(part_path)
+        write_validator(part_path, None)
+        return self._open_stream(session, url, part_path)
+
+    def _looks_polished(self, url: str, resp: requests.Response, offset: int) -> bool:
+        """
+        Whether a response likely is an image Cloudflare's 'Polish' optimized
+        despite the cache busting token
+
+        :param url: URL to image
+        :param resp: streamed response
+        :param offset: byte position the response starts at
+        """
+        if not resp.ok:
+            return False
+        if polished_size(resp) is not None:
+            return True
+        expected = self.expected_sizes.get(url)
+        content_length = int(resp.headers.get("Content-Length", 0))
+        return (
+            bool(expected and content_length)
+            and not content_length + offset == expected
+        )
+
+    def _owns(self, url: str, file: str) -> bool:
+        """
+        Whether an existing file was saved by an earlier download of the same
+        image, in which case it may be overwritten with the changed image
+
+        :param url: URL to image
+        :param file: name of the existing file
+        """
+        if self.project_archive is not None:
+            return self.project_archive.owns(url, file)
+        if self.manifest is None:
+            return False
+        entry = self.manifest.get(url)
+        return entry is not None and entry[0] == file
+
+    def _resolve_collision(
+        self, filename: str, ext: str, content_length: int
+    ) -> Optional[str]:
+        """
+        Decide what to do with an image whose file name is taken according to
+        the collision policy, returns the name to save it as (the same name to
+        replace the existing file) reserved in the directory index or None to
+        skip it
+
+        :param filename: name of the file without extension
+        :param ext: extension of the file
+        :param content_length: size of the image reported by the server, 0 if unknown
+        """
+        file = f"{filename}{ext}"
+        policy = self.collision_policy
+        if policy == "ask":
+            if self.skip_existing or self.ask_rename is None:
+                return None
+            new_name = self.ask_rename(filename, ext, self.store_path)
+            while new_name is not None and not self.dir_index.reserve(new_name):
+                # The new name is taken as well
+                new_name = self.ask_rename(filename, ext, self.store_path)
+            return new_name
+        if policy == "keep-both":
+            return self.dir_index.free_name(filename, ext)
+        same_size = bool(content_length) and self.dir_index.size(file) == content_length
+        if policy == "overwrite-if-size-differs" and not same_size:
+            # Without a reported size it can not be told whether the file differs
+            if content_length and self.dir_index.reserve(file, replace=True):
+                return file
+            return None
+        if policy == "auto-suffix" and not same_size:
+            return self.dir_index.free_name(filename, ext)
+        return None
+
+    def download_image(
+        self, url: str, filename: str, session: requests.Session
+    ) -> Union[str, Future, None]:
+        """
+        Download a single image, returns the log line of the result or None if
+        the download was cancelled before it started
+
+        With a post_processor a saved image is queued for post-processing and
+        a concurrent.futures.Future of its log line, completed once the image
+        has been processed, is returned instead.
+
+        :param url: URL to image
+        :param filename: name of the file without extension
+        :param session: session to send the request with
+        """
+        self._local.saved_path = None
+        if self.run_metrics is None:
+            download_result = self._download_image(url, filename, session)
+        else:
+            timing = metrics.AssetTiming(url)
+            started = time.perf_counter()
+            download_result = self._download_image(url, filename, session, timing)
+            if download_result is not None:
+                timing.total = time.perf_counter() - started
+                timing.result = metrics.RESULTS.get(download_result[:1], "")
+                self.run_metrics.record_asset(timing)
+        if self.post_processor is not None and self._local.saved_path is not None:
+            return self.post_processor.submit(self._local.saved_path, download_result)
+        return download_result
+
+    def _download_image(
+        self,
+        url: str,
+        filename: str,
+        session: requests.Session,
+        timing: Optional[metrics.AssetTiming] = None,
+    ) -> Optional[str]:
+        """
+        Download a single image, see download_image()
+
+        :param timing: optional timings of the download to fill in
+        """
+        if self._cancel.is_set():
+            return
+        if self.manifest is not None:
+            current_file = self.manifest.is_current(url)
+            if current_file is not None:
+                self._count("SKIPS")
+                self._count("UNCHANGED")
+                return f'^ Skipped "{current_file}" as it is unchanged since the last download'
+        if self.project_archive is not None:
+            current_member = self.project_archive.current(url)
+            if current_member is not None:
+                self._count("SKIPS")
+                self._count("UNCHANGED")
+                return f'^ Skipped "{current_member}" as it is unchanged in the archive'
+
+        controller = self.rate_controller
+        # retries after a 429 and after transient failures, counted apart so
+        # that backing off does not use up the retries of the retry policy
+        throttled = attempt = 0
+        delay = 0.0
+        while True:
+            if delay:
+                time.sleep(delay)
+            if controller is not None:
+                controller.acquire()
+            try:
+                download_result = self._save_image(url, filename, session, timing)
+                error = None
+            except requests.RequestException as e:
+                error = e
+            finally:
+                if controller is not None:
+                    controller.release()
+
+            if error is None:
+                if controller is not None:
+                    controller.succeeded()
+                return download_result
+
+            status = None
+            if isinstance(error, requests.HTTPError):
+                status = error.response.status_code
+            if status == 429 and controller is not None:
+                if throttled >= controller.max_retries:
+                    return self._failed(url, error)
+                # Back off and retry the image instead of cancelling
+                controller.throttled(ratelimit.retry_after(error.response))
+                delay = 0.0
+                throttled += 1
+            elif self.retry_policy.should_retry(error, attempt):
+                delay = self.retry_policy.delay(attempt)
+                attempt += 1
+            else:
+                return self._failed(url, error)
+            self._count("RETRIES")
+
+    def _failed(self, url: str, error: requests.RequestException) -> str:
+        """
+        Count a failed download, returns the log line of the error
+
+        :param url: URL to image
+        :param error: exception raised by the request
+        """
+        self._count("ERRORS")
+        if isinstance(error, requests.HTTPError):
+            if error.response.status_code == 429:
+                if self.rate_controller is None:
+                    # Stop the workers from starting any of the remaining downloads
+                    self._cancel.set()
+                return f"! {error}"
+            return f'! HTTP error while downloading "{url}": {error}'
+        if isinstance(error, requests.Timeout):
+            return f'! Timeout reached while fetching "{url}"'
+        return f'! Failed "{url}": {error}'
+
+    def _save_image(
+        self,
+        url: str,
+        filename: str,
+        session: requests.Session,
+        timing: Optional[metrics.AssetTiming] = None,
+    ) -> str:
+        """
+        Send the request of a download and save the image, returns the log line
+        of the result and raises requests.RequestException on failure
+
+        :param url: URL to image
+        :param filename: name of the file without extension
+        :param session: session to send the request with
+        :param timing: optional timings of the download to fill in
+        """
+        if self.project_archive is not None:
+            return self._stream_image(url, filename, session, None, timing)
+        # The image is written to a temporary file that is only renamed
+        # once complete, an interrupted download is resumed from it
+        part = self._reserve_part(url, filename)
+        try:
+            return self._stream_image(url, filename, session, part, timing)
+        finally:
+            self.dir_index.release(part)
+
+    def _reserve_part(self, url: str, filename: str) -> str:
+        """
+        Reserve the name of the partial file of a download, returns it
+
+        The name includes a hash of the URL, so images with the same file name
+        do not resume from each other's partial files, and stays the same
+        across runs for an interrupted download to be resumed.
+
+        :param url: URL to image
+        :param filename: name of the file without extension
+        """
+        token = hashlib.sha1(url.split("?", 1)[0].encode()).hexdigest()[:8]
+        part = f"{filename}.{token}.part"
+        number = 1
+        while not self.dir_index.reserve(part, replace=True):
+            # The same image is being downloaded by another worker
+            part = f"{filename}.{token}-{number}.part"
+            number += 1
+        return part
+
+    def _stream_image(
+        self,
+        url: str,
+        filename: str,
+        session: requests.Session,
+        part: Optional[str],
+        timing: Optional[metrics.AssetTiming] = None,
+    ) -> str:
+        """
+        Stream an image into its partial file and rename it, or into the
+        archive, see _save_image()
+
+        :param part: name of the partial file reserved by _reserve_part(),
+            None when saving to the archive
+        """
+        part_path = os.path.join(self.store_path, part) if part is not None else None
+        attempt = 1
+        while True:
+            url_no_cache = no_cache(url)
+            requested = time.perf_counter()
+            resp, offset = self._open_stream(session, url_no_cache, part_path)
+            if timing is not None:
+                timing.ttfb = time.perf_counter() - requested
+            if attempt >= POLISH_RETRIES or not self._looks_polished(url, resp, offset):
+                break
+            # Try another cache busting token instead of saving a polished image
+            resp.close()
+            self._count("REFETCHED")
+            attempt += 1
+        with resp:
+            resp.raise_for_status()
+            content_length = int(resp.headers.get("Content-Length", 0))
+            if not content_length == 0:
+                content_length += offset
+            ext = get_extension(url_no_cache, resp, self.allowed_extn)
+            file = f"{filename}{ext}"
+            name = file
+            replaced = False
+
+            # The name is reserved before the image is streamed, so another
+            # download of an image with the same name can not take it as well
+            if not self.dir_index.reserve(file, replace=self._owns(url, file)):
+                name = self._resolve_collision(filename, ext, content_length)
+
+                if name is None:
+                    self._count("SKIPS")
+                    return f'^ Skipped "{file}" as it already exists'
+
+                replaced = name == file
+            new_name = None if name == file else name
+            try:
+                if self.project_archive is not None:
+                    return self._save_to_archive(
+                        url, resp, file, new_name, replaced, content_length, timing
+                    )
+                return self._save_file(
+                    url,
+                    resp,
+                    file,
+                    new_name,
+                    replaced,
+                    content_length,
+                    part_path,
+                    offset,
+                    timing,
+                )
+            finally:
+                self.dir_index.release(name)
+
+    def _save_file(
+        self,
+        url: str,
+        resp: requests.Response,
+        file: str,
+        new_name: Optional[str],
+        replaced: bool,
+        content_length: int,
+        part_path: str,
+        offset: int,
+        timing: Optional[metrics.AssetTiming] = None,
+    ) -> str:
+        """
+        Stream an image into its partial file and rename it once complete,
+        returns the log line of the result
+
+        :param url: URL to image
+        :param resp: streamed response
+        :param file: name of the file
+        :param new_name: name to save the image as instead, if any
+        :param replaced: whether the image replaces an existing file
+        :param content_length: size of the image, including the bytes resumed
+            from the partial file, 0 if unknown
+        :param part_path: path to the partial file
+        :param offset: byte position the response starts at
+        :param timing: optional timings of the download to fill in
+        """
+        # humanize is only needed once there is a result to report
+        from humanize import naturalsize
+
+        file_path = os.path.join(self.store_path, new_name or file)
+        digest = hashlib.sha256()
+        # The dimensions are parsed from the header while it passes by
+        probe = imageinfo.HeaderProbe()
+        if offset:
+            with open(part_path, "rb") as f:
+                for block in iter(lambda: f.read(1024 * 1024), b""):
+                    digest.update(block)
+                    probe.feed(block)
+        else:
+            # Checked against the image on the server when resuming
+            write_validator(part_path, response_validator(resp))
+        expected = content_length or None
+        if self.disk_writer is not None:
+            # The writer reserves the disk space and truncates the file
+            f = self.disk_writer.open(part_path, offset, expected)
+            expected = None
+        else:
+            f = open(part_path, "r+b" if offset else "wb")
+            f.seek(offset)
+        with f:
+            written = streaming.copy_response(resp, f, digest, expected, probe, timing)
+            if timing is not None:
+                timing.bytes += written
+        os.replace(part_path, file_path)
+        write_validator(part_path, None)
+
+        file_size = os.path.getsize(file_path)
+        self.dir_index.add(os.path.basename(file_path), file_size)
+        human_size = naturalsize(file_size)
+        if probe.info is not None:
+            human_size += f" ({probe.info})"
+        duplicate = None
+        if self.hash_index is not None:
+            duplicate = self.hash_index.claim(digest.hexdigest(), file_size, file_path)
+        if duplicate is not None:
+            shown = os.path.relpath(duplicate, self.hash_index.store_path)
+            if self.dedupe_mode == "skip":
+                # Only keep the file that was saved first
+                os.remove(file_path)
+                self.dir_index.remove(os.path.basename(file_path))
+                self._count("SKIPS")
+                self._count("DUPLICATES")
+                self._count("DEDUPED_BYTES", file_size)
+                if self.manifest is not None:
+                    self.manifest.record(
+                        url,
+                        os.path.relpath(duplicate, self.store_path),
+                        file_size,
+                        digest.hexdigest(),
+                    )
+                return f'^ Skipped "{file}" as it is a duplicate of "{shown}"'
+            if dedupe.hardlink(duplicate, file_path):
+                self._count("DUPLICATES")
+                self._count("DEDUPED_BYTES", file_size)
+                human_size += f' (hard link to duplicate "{shown}")'
+
+        self._local.saved_path = file_path
+        self._count("SAVED")
+        if self.manifest is not None:
+            self.manifest.record(
+                url,
+                os.path.basename(file_path),
+                file_size,
+                digest.hexdigest(),
+            )
+        if not content_length == 0 and not content_length == file_size:
+            # Check if there is a size difference between reported size
+            # found in the response.header (if present) and downloaded file
+            # if there is, that could mean there was a cache HIT and a
+            # compressed file was downloaded
+            self._count("WARNINGS")
+            diff = naturalsize(abs(content_length - file_size))
+            return f'* Saved: "{file}" with {human_size} - Warning: File size mismatch between local copy and ArtStation by {diff}'
+        if offset:
+            human_size += f" (resumed at {naturalsize(offset)})"
+        if replaced:
+            human_size += " (replaced existing file of a different size)"
+        if new_name is not None:
+            return f'+ Saved "{file}" as: "{new_name}" with {human_size}'
+        return f'+ Saved: "{file}" with {human_size}'
+
+    def _save_to_archive(
+        self,
+        url: str,
+        resp: requests.Response,
+        file: str,
+        new_name: Optional[str],
+        replaced: bool,
+        content_length: int,
+        timing: Optional[metrics.AssetTiming] = None,
+    ) -> str:
+        """
+        Stream an image into the archive, returns the log line of the result
+
+        One image at a time is streamed into the archive, the others read at
+        the same time are held in memory and appended as soon as they are
+        complete, see archive.ArchiveMember.
+
+        :param url: URL to image
+        :param resp: streamed response
+        :param file: name of the file
+        :param new_name: name to save the image as instead, if any
+        :param replaced: whether the image replaces a member of the same name
+        :param content_length: size of the image reported by the server, 0 if unknown
+        :param timing: optional timings of the download to fill in
+        """
+        from humanize import naturalsize
+
+        digest = hashlib.sha256()
+        probe = imageinfo.HeaderProbe()
+        with self.project_archive.open_member(new_name or file) as member:
+            written = streaming.copy_response(resp, member, digest, None, probe, timing)
+            started = time.perf_counter()
+            member.commit(url, digest.hexdigest())
+        if timing is not None:
+            timing.write += time.perf_counter() - started
+            timing.bytes += written
+
+        self._count("SAVED")
+        human_size = naturalsize(written)
+        if probe.info is not None:
+            human_size += f" ({probe.info})"
+        if not content_length == 0 and not content_length == written:
+            self._count("WARNINGS")
+            diff = naturalsize(abs(content_length - written))
+            return f'* Saved: "{file}" with {human_size} - Warning: File size mismatch between local copy and ArtStation by {diff}'
+        if replaced:
+            human_size += " (replaced existing member of a different size)"
+        if new_name is not None:
+            return f'+ Saved "{file}" as: "{new_name}" with {human_size}'
+        return f'+ Saved: "{file}" with {human_size}'
+
+    def run(self, jobs: list[tuple[str, str]]) -> Iterator[str]:
+        """
+        Download all images and yield the log line of each result as soon as
+        it is available
+
+        :param jobs: tuples of image URL and filename (without extension)
+        """
+        sess = transport.get().session(self.max_workers)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            pending = {
+                pool.submit(self.download_image, image_url, filename, sess)
+                for image_url, filename in jobs
+            }
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    download_result = future.result()
+                    if download_result is None:
+                        continue  # cancelled before the download started
+                    if isinstance(download_result, Future):
+                        # Yielded once the image has been post-processed
+                        pending.add(download_result)
+                        continue
+                    yield download_result
+
+        self.count_cancelled(len(jobs))
+        self.close()
+
+    def close(self):
+        """
+        Close the manifest and the archive, if any
+        """
+        if self.manifest is not None:
+            self.manifest.close()
+        if self.project_archive is not None:
+            self.project_archive.close()
+
+    def count_cancelled(self, total: int):
+        """
+        Count the downloads that were cancelled due to a 429 as skipped
+
+        :param total: number of files that were to be downloaded
+        """
+        if self.rate_limited:
+            self.SKIPS += total - (self.SAVED + self.ERRORS + self.SKIPS)
+
+    def summary(self, total: int) -> str:
+        """
+        Get the log line summarizing the results of a run
+
+        :param total: number of files that were to be downloaded
+        """
+        line = f">>> {total} Files - Saved: {self.SAVED}, Skipped: {self.SKIPS}, Errors: {self.ERRORS}, Warnings: {self.WARNINGS}"
+        if self.manifest is not None:
+            # Every image found unchanged in the manifest saved a request
+            line += f", Requests saved: {self.UNCHANGED}"
+        if self.RETRIES:
+            line += f", Retries: {self.RETRIES}"
+        if self.REFETCHED:
+            line += f", Re-requested (polished): {self.REFETCHED}"
+        if self.DUPLICATES:
+            from humanize import naturalsize
+
+            line += f", Duplicates: {self.DUPLICATES} ({naturalsize(self.DEDUPED_BYTES)} saved)"
+        return line
@@ -0,0 +1,273 @@
+# Copyright (C) 2025 Jérémy Rotzetter
+
+import struct
+from typing import Optional
+
+# Give up on finding the dimensions if they are not within the first bytes,
+# JPEG files may carry large EXIF/XMP segments in front of the frame header
+MAX_HEADER_BYTES = 1024 * 1024
+
+# JPEG start of frame markers, DHT (C4), JPG (C8) and DAC (CC) share the range
+JPEG_SOF_MARKERS = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+
+class NeedMoreData(Exception):
+    """
+    Raised by the parsers when the header continues beyond the bytes received
+    """
+
+
+class ImageInfo:
+    """
+    Format, dimensions and presence of an embedded ICC color profile of an
+    image, as found in its header
+
+    :param image_format: e.g. "JPEG", "PNG"
+    :param width: width in pixels
+    :param height: height in pixels
+    :param icc_profile: whether the image embeds an ICC color profile,
+        Cloudflare's 'Polish' strips it
+    """
+
+    def __init__(self, image_format: str, width: int, height: int, icc_profile: bool):
+        self.image_format = image_format
+        self.width = width
+        self.height = height
+        self.icc_profile = icc_profile
+
+    def __str__(self) -> str:
+        text = f"{self.width}x{self.height}"
+        if self.icc_profile:
+            text += " with ICC profile"
+        return text
+
+
+def _need(data: bytes, end: int):
+    """
+    Raise NeedMoreData if fewer bytes than needed were received
+
+    :param data: bytes received so far
+    :param end: number of bytes needed
+    """
+    if len(data) < end:
+        raise NeedMoreData
+
+
+def parse_png(data: bytes) -> ImageInfo:
+    """
+    Parse the IHDR chunk of a PNG image and look for an iCCP chunk
+
+    :param data: first bytes of the image
+    """
+    _need(data, 24)
+    width, height = struct.unpack(">II", data[16:24])
+    # Walk the chunks up to the image data, an iCCP chunk must precede it
+    pos = 8
+    while True:
+        _need(data, pos + 8)
+        length, chunk_type = struct.unpack(">I4s", data[pos : pos + 8])
+        if chunk_type == b"iCCP":
+            return ImageInfo("PNG", width, height, True)
+        if chunk_type in (b"IDAT", b"IEND"):
+            return ImageInfo("PNG", width, height, False)
+        pos += 12 + length
+
+
+def parse_gif(data: bytes) -> ImageInfo:
+    """
+    Parse the logical screen descriptor of a GIF image
+
+    :param data: first bytes of the image
+    """
+    _need(data, 10)
+    width, height = struct.unpack("<HH", data[6:10])
+    # GIF may only carry a profile in an application extension, which is rare
+    return ImageInfo("GIF", width, height, False)
+
+
+def parse_jpeg(data: bytes) -> ImageInfo:
+    """
+    Walk the segments of a JPEG image up to its frame header and look for an
+    APP2 ICC_PROFILE segment on the way
+
+    :param data: first bytes of the image
+    """
+    icc_profile = False
+    pos = 2
+    while True:
+        _need(data, pos + 4)
+        if not data[pos] == 0xFF:
+            raise ValueError("invalid JPEG marker")
+        marker = data[pos + 1]
+        if marker == 0xFF:
+            pos += 1  # fill byte
+            continue
+        if marker in (0x01, *range(0xD0, 0xD8)):
+            pos += 2  # markers without a segment
+            continue
+        (length,) = struct.unpack(">H", data[pos + 2 : pos + 4])
+        if marker == 0xE2:
+            _need(data, pos + 16)
+            if data[pos + 4 : pos + 16] == b"ICC_PROFILE\x00":
+                icc_profile = True
+        elif marker in JPEG_SOF_MARKERS:
+            _need(data, pos + 9)
+            height, width = struct.unpack(">HH", data[pos + 5 : pos + 9])
+            return ImageInfo("JPEG", width, height, icc_profile)
+        elif marker in (0xD9, 0xDA):
+            raise ValueError("no JPEG frame header")
+        pos += 2 + length
+
+
+def parse_webp(data: bytes) -> ImageInfo:
+    """
+    Parse the first chunk of a WebP image (VP8X, VP8 or VP8L)
+
+    :param data: first bytes of the image
+    """
+    _need(data, 30)
+    chunk_type = data[12:16]
+    payload = data[20:30]
+    if chunk_type == b"VP8X":
+        # Extended format, the flags tell whether there is an ICCP chunk
+        width = int.from_bytes(payload[4:7], "little") + 1
+        height = int.from_bytes(payload[7:10], "little") + 1
+        return ImageInfo("WebP", width, height, bool(payload[0] & 0x20))
+    if chunk_type == b"VP8 ":
+        width, height = struct.unpack("<HH", payload[6:10])
+        return ImageInfo("WebP", width & 0x3FFF, height & 0x3FFF, False)
+    if chunk_type == b"VP8L":
+        bits = int.from_bytes(payload[1:5], "little")
+        width = (bits & 0x3FFF) + 1
+        height = ((bits >> 14) & 0x3FFF) + 1
+        return ImageInfo("WebP", width, height, False)
+    raise ValueError("unknown WebP chunk")
+
+
+def _boxes(data: bytes, start: int, end: Optional[int]):
+    """
+    Iterate over the ISO base media file format boxes in a range of bytes,
+    yields their type and the range of their content
+
+    :param data: bytes received so far
+    :param start: position of the first box
+    :param end: end of the range or None if it is the top level
+    """
+    pos = start
+    while end is None or pos < end:
+        _need(data, pos + 8)
+        size, box_type = struct.unpack(">I4s", data[pos : pos + 8])
+        header = 8
+        if size == 1:
+            _need(data, pos + 16)
+            (size,) = struct.unpack(">Q", data[pos + 8 : pos + 16])
+            header = 16
+        elif size == 0:
+            if end is None:
+                raise ValueError("no AVIF metadata")
+            size = end - pos
+        if size < header:
+            raise ValueError("invalid box size")
+        yield box_type, pos + header, pos + size
+        pos += size
+
+
+def parse_avif(data: bytes) -> ImageInfo:
+    """
+    Find the image spatial extents (ispe) and color (colr) properties in the
+    meta box of an AVIF image
+
+    :param data: first bytes of the image
+    """
+    for box_type, start, end in _boxes(data, 0, None):
+        if box_type == b"mdat":
+            raise ValueError("no AVIF metadata before the image data")
+        if not box_type == b"meta":
+            continue
+        _need(data, end)
+        # meta is a full box, skip its version and flags
+        for box_type, start, end in _boxes(data, start + 4, end):
+            if not box_type == b"iprp":
+                continue
+            for box_type, start, end in _boxes(data, start, end):
+                if not box_type == b"ipco":
+                    continue
+                sizes = []
+                icc_profile = False
+                for box_type, start, end in _boxes(data, start, end):
+                    if box_type == b"ispe":
+                        sizes.append(struct.unpack(">II", data[start + 4 : start + 12]))
+                    elif box_type == b"colr" and data[start : start + 4] in (
+                        b"prof",
+                        b"rICC",
+                    ):
+                        icc_profile = True
+                if sizes:
+                    # A grid image has the sizes of its tiles as well
+                    width, height = max(sizes, key=lambda size: size[0] * size[1])
+                    return ImageInfo("AVIF", width, height, icc_profile)
+        raise ValueError("no AVIF image size")
+
+
+def parser_for(data: bytes):
+    """
+    Get the parser for the format of an image from its first bytes or None
+    if the format is not supported
+
+    :param data: at least the first 12 bytes of the image
+    """
+    if data.startswith(b"\x89PNG\r\n\x1a\n"):
+        return parse_png
+    if data.startswith(b"\xff\xd8"):
+        return parse_jpeg
+    if data.startswith((b"GIF87a", b"GIF89a")):
+        return parse_gif
+    if data.startswith(b"RIFF") and data[8:12] == b"WEBP":
+        return parse_webp
+    if data[4:8] == b"ftyp" and data[8:12] in (b"avif", b"avis", b"mif1", b"msf1"):
+        return parse_avif
+    return None
+
+
+class HeaderProbe:
+    """
+    Find the dimensions of an image in the chunks of its body while it is
+    being downloaded
+
+    Only the bytes up to the end of the header are kept and parsed, nothing is
+    decoded. The probe is done as soon as the header was parsed or it is
+    clear the dimensions can not be found.
+    """
+
+    def __init__(self):
+        self._data = bytearray()
+        self._parser = None
+        self.done = False
+        self.info: Optional[ImageInfo] = None
+
+    def feed(self, chunk) -> bool:
+        """
+        Pass the next chunk of the body, returns True once the probe is done
+
+        :param chunk: bytes-like object, only read during the call
+        """
+        if self.done:
+            return True
+        self._data += chunk
+        if self._parser is None:
+            if len(self._data) < 12:
+                return False
+            self._parser = parser_for(bytes(self._data[:12]))
+            if self._parser is None:
+                self.done = True
+                return True
+        try:
+            self.info = self._parser(self._data)
+        except NeedMoreData:
+            if len(self._data) < MAX_HEADER_BYTES:
+                return False
+        except (ValueError, struct.error):
+            pass
+        self.done = True
+        self._data = bytearray()
+        return True
@@ -0,0 +1,253 @@
+# Copyright (C) 2025 Jérémy Rotzetter
+
+import codecs
+import io
+import json
+from typing import Iterable, Iterator, Optional, Union
+
+CHUNK_SIZE = 64 * 1024
+# Fields of a project and of its assets that are kept, the rest is dropped as
+# soon as it has been parsed
+PROJECT_FIELDS = ("hash_id",)
+# Fields of a listing stored in the listing argument of iter_projects()
+LISTING_FIELDS = ("total_count",)
+ASSET_FIELDS = ("id", "position", "asset_type", "width", "height", "image_url")
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = " \t\n\r"
+
+Source = Union[str, bytes, io.IOBase, Iterable[Union[str, bytes]]]
+
+
+def slim_asset(asset: dict) -> dict:
+    """
+    Keep only the fields of an asset the downloader uses
+
+    :param asset: entry of the "assets" list of a project
+    """
+    return {key: asset[key] for key in ASSET_FIELDS if key in asset}
+
+
+def slim_assets(assets: Iterable) -> list[dict]:
+    """
+    Keep only the fields of the assets the downloader uses, entries that are
+    not objects are skipped
+
+    :param assets: entries of the "assets" list of a project
+    """
+    return [slim_asset(asset) for asset in assets if isinstance(asset, dict)]
+
+
+def slim_project(project: dict) -> dict:
+    """
+    Keep only the fields of a project the downloader uses
+
+    :param project: JSON data of a project or an entry of a project listing
+    """
+    slim = {key: project[key] for key in PROJECT_FIELDS if key in project}
+    if isinstance(project.get("assets"), list):
+        slim["assets"] = slim_assets(project["assets"])
+    return slim
+
+
+def _text_chunks(source: Source) -> Iterator[str]:
+    """
+    Iterate over the text of a JSON document in chunks
+
+    :param source: text, UTF-8 encoded bytes, a file opened in text or binary
+        mode or an iterable of text or bytes chunks (e.g. iter_content())
+    """
+    if isinstance(source, (str, bytes)):
+        source = [source]
+    elif hasattr(source, "read"):
+        read = source.read
+        source = iter(lambda: read(CHUNK_SIZE), read(0))
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    for chunk in source:
+        if isinstance(chunk, bytes):
+            chunk = decoder.decode(chunk)
+        if chunk:
+            yield chunk
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+
+class _Reader:
+    """
+    Buffer over the chunks of a JSON document, refilled as it is consumed
+
+    :param chunks: text of the document in chunks
+    """
+
+    def __init__(self, chunks: Iterator[str]):
+        self._chunks = chunks
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def fill(self, min_size: int = 0) -> bool:
+        """
+        Append the next chunks and drop the text consumed so far, returns False
+        at the end of the document
+
+        :param min_size: number of characters to read at least, more than one
+            chunk
+        """
+        chunks = [self.buf[self.pos :]]
+        size = 0
+        while not self.eof and (size == 0 or size < min_size):
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                self.eof = True
+            else:
+                chunks.append(chunk)
+                size += len(chunk)
+        if size == 0:
+            return False
+        self.buf = "".join(chunks)
+        self.pos = 0
+        return True
+
+    def error(self, message: str) -> json.JSONDecodeError:
+        return json.JSONDecodeError(message, self.buf, self.pos)
+
+    def peek(self) -> str:
+        """
+        Get the next character that is not whitespace without consuming it,
+        an empty string at the end of the document
+        """
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self.fill():
+                return ""
+
+    def take(self, expected: str):
+        """
+        Consume the next character that is not whitespace
+
+        :param expected: characters it may be
+        """
+        char = self.peek()
+        if char == "" or char not in expected:
+            raise self.error(f"Expecting one of {expected!r}")
+        self.pos += 1
+        return char
+
+    def value(self):
+        """
+        Decode the next complete JSON value
+        """
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                # Incomplete, at least double the buffer so that a large value
+                # is not decoded again for every chunk
+                if not self.fill(len(self.buf) - self.pos):
+                    raise
+                continue
+            # A number at the end of the buffer may continue in the next chunk
+            if end == len(self.buf) and self.fill():
+                continue
+            self.pos = end
+            return value
+
+    def array_items(self) -> Iterator:
+        """
+        Decode the values of an array one by one, the opening bracket has to
+        be consumed already
+        """
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield self.value()
+            if self.take(",]") == "]":
+                return
+
+    def object_keys(self) -> Iterator[str]:
+        """
+        Iterate over the keys of an object, the opening brace has to be
+        consumed already and the value of each key has to be consumed by the
+        caller before the next key is taken
+        """
+        if self.peek() == "}":
+            self.pos += 1
+            return
+        while True:
+            if self.peek() != '"':
+                raise self.error("Expecting property name enclosed in double quotes")
+            key = self.value()
+            self.take(":")
+            yield key
+            if self.take(",}") == "}":
+                return
+
+
+def _iter_raw_decode(source: Source, listing: Optional[dict]) -> Iterator[dict]:
+    reader = _Reader(_text_chunks(source))
+    start = reader.take("{[")
+    if start == "[":
+        for item in reader.array_items():
+            if isinstance(item, dict):
+                yield slim_project(item)
+        return
+    project = {}
+    for key in reader.object_keys():
+        if key in ("data", "assets") and reader.peek() == "[":
+            reader.pos += 1
+            if key == "data":
+                for item in reader.array_items():
+                    if isinstance(item, dict):
+                        yield slim_project(item)
+            else:
+                project["assets"] = slim_assets(reader.array_items())
+        elif key in PROJECT_FIELDS:
+            project[key] = reader.value()
+        elif key in LISTING_FIELDS and listing is not None:
+            listing[key] = reader.value()
+        else:
+            reader.value()  # not needed
+    if reader.peek():
+        raise reader.error("Extra data")
+    if project:
+        yield project
+
+
+def iter_projects(source: Source, listing: Optional[dict] = None) -> Iterator[dict]:
+    """
+    Parse a project listing or the JSON data of a single project
+    incrementally and yield each project with only the fields the downloader
+    uses as soon as it has been parsed
+
+    A listing is either an object with the projects in its "data" array (as
+    the paged listings of an artist's portfolio) or an array of projects.
+    Only the current project is kept in memory, the rest of the document is
+    dropped as it is parsed. Raises json.JSONDecodeError if the document is
+    invalid.
+
+    :param source: text, UTF-8 encoded bytes, a file opened in text or binary
+        mode or an iterable of text or bytes chunks (e.g. iter_content())
+    :param listing: optional dictionary to store the fields of the listing
+        in LISTING_FIELDS in, e.g. the total number of projects
+    """
+    return _iter_raw_decode(source, listing)
+
+
+def load_project(source: Source) -> dict:
+    """
+    Parse the JSON data of a single project incrementally, see iter_projects()
+
+    Returns an empty dictionary if the document is valid JSON but holds no
+    project, like json.loads() would return data without a "hash_id".
+
+    :param source: see iter_projects()
+    """
+    for project in iter_projects(source):
+        return project
+    return {}
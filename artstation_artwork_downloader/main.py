@@ -4,13 +4,35 @@ import tkinter as tk
 from tkinter import ttk
 from tkinter import filedialog
 from tkinter import messagebox
+import base64
+import functools
 import json
 import os
-import requests
-import secrets
-import cloudscraper
-from humanize import naturalsize
+import queue
+import threading
+import archive
+import assets
+import batch
+import cache
+import dirindex
+import downloader
+import metrics
+import portfolio
 import renamedialog
+import runlog
+import thumbnails
+import transport
+
+# How often the GUI drains the event queue of the download worker and the
+# maximum number of events handled per drain, which together bound how long
+# the Tk event loop can be kept busy by a burst of download events
+POLL_INTERVAL_MS = 50
+MAX_EVENTS_PER_POLL = 100
+# Delay after the last keystroke in the log filter before the log is searched
+FILTER_DELAY_MS = 300
+# Delay after the image list was last scrolled before the thumbnails of the
+# rows that became visible are requested
+THUMBNAIL_DELAY_MS = 150
 
 
 class ArtStationArtworkDownloader(tk.Tk):
@@ -32,6 +54,40 @@ class ArtStationArtworkDownloader(tk.Tk):
         self.PROGRESS = tk.StringVar()
         BUTTON_WIDTH = 25
         self.SKIP_EXISTING = tk.BooleanVar(value=True)
+        self.MAX_WORKERS = tk.IntVar(value=4)
+        self.LOG_FILTER = tk.StringVar()
+        self._filter_job = None
+        self._events = queue.Queue()
+        self._downloader = None
+        # timing of the JSON fetch of the loaded project, reported with the
+        # next run only
+        self._fetch_metrics = metrics.RunMetrics()
+        try:
+            self._project_cache = cache.ProjectCache()
+        except OSError:
+            self._project_cache = None  # the cache directory could not be created
+        try:
+            self._log = runlog.RunLog(runlog.default_log_dir())
+        except OSError:
+            self._log = runlog.RunLog()  # keep the log in memory only
+        try:
+            thumbnail_cache = thumbnails.ThumbnailCache(
+                thumbnails.default_thumbnail_dir()
+            )
+        except OSError:
+            thumbnail_cache = thumbnails.ThumbnailCache()
+        self._thumbnail_loader = thumbnails.ThumbnailLoader(thumbnail_cache)
+        self._thumbnail_events = queue.Queue()
+        # Image assets of the loaded project, the rows of the image list are
+        # identified by their index, and the indices of the excluded ones
+        self._assets: list[assets.Asset] = []
+        self._excluded: set[int] = set()
+        # Tk images of the rows of the image list, keyed by index, and the
+        # number of times the list was filled to drop thumbnails of past lists
+        self._thumbnail_images = {}
+        self._image_list_version = 0
+        self._thumbnail_job = None
+        self._thumbnail_poll = None
 
         ###/// TOPMENU \\\###
         menubar = tk.Menu(self)
@@ -59,10 +115,9 @@ class ArtStationArtworkDownloader(tk.Tk):
             master=self.options_frm,
             text="Select image dimensions:",
         )
-        img_scale = ["small", "medium", "large", "4k", "8k"]
         self.img_quality = ttk.Combobox(
             master=self.options_frm,
-            values=img_scale,
+            values=downloader.IMG_SCALE,
             state="readonly",
             justify="center",
         )
@@ -82,6 +137,36 @@ class ArtStationArtworkDownloader(tk.Tk):
             textvariable=self.STORE_PATH,
             state="readonly",
         )
+        self.workers_lbl = ttk.Label(
+            master=self.options_frm, text="Parallel downloads:"
+        )
+        self.workers_spn = ttk.Spinbox(
+            master=self.options_frm,
+            from_=1,
+            to=16,
+            textvariable=self.MAX_WORKERS,
+            state="readonly",
+            justify="center",
+            width=5,
+        )
+        self.collision_lbl = ttk.Label(
+            master=self.options_frm, text="If a file exists:"
+        )
+        self.collision_policy = ttk.Combobox(
+            master=self.options_frm,
+            values=dirindex.COLLISION_POLICIES,
+            state="readonly",
+            justify="center",
+        )
+        self.collision_policy.set("ask")
+        self.output_format_lbl = ttk.Label(master=self.options_frm, text="Save as:")
+        self.output_format = ttk.Combobox(
+            master=self.options_frm,
+            values=("files", *archive.ARCHIVE_FORMATS),
+            state="readonly",
+            justify="center",
+        )
+        self.output_format.set("files")
 
         self.options_frm.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
         self.options_frm.grid_columnconfigure(2, weight=1)
@@ -92,6 +177,12 @@ class ArtStationArtworkDownloader(tk.Tk):
         self.select_path_btn.grid(row=1, column=1, padx=10, pady=(0, 10))
         self.store_path_lbl.grid(row=0, column=2, padx=5, pady=(5, 0), sticky="W")
         self.store_path_ent.grid(row=1, column=2, padx=10, pady=(0, 10), sticky="EW")
+        self.workers_lbl.grid(row=0, column=3, padx=5, pady=(5, 0))
+        self.workers_spn.grid(row=1, column=3, padx=10, pady=(0, 10))
+        self.collision_lbl.grid(row=0, column=4, padx=5, pady=(5, 0))
+        self.collision_policy.grid(row=1, column=4, padx=10, pady=(0, 10))
+        self.output_format_lbl.grid(row=0, column=5, padx=5, pady=(5, 0))
+        self.output_format.grid(row=1, column=5, padx=10, pady=(0, 10))
 
         ###/// JSON FRAME \\\###
         # Container frame for the two methods to load the image urls from the project json
@@ -133,11 +224,25 @@ class ArtStationArtworkDownloader(tk.Tk):
             command=self._clear_json,
         )
 
+        self.artist_lbl = ttk.Label(
+            master=self.load_json_frm, text="Or paste artist username:"
+        )
+        self.artist_ent = ttk.Entry(
+            master=self.load_json_frm,
+            width=BUTTON_WIDTH,
+        )
+        self.portfolio_btn = ttk.Button(
+            master=self.load_json_frm,
+            text="Download all projects",
+            width=BUTTON_WIDTH,
+            command=self._download_portfolio,
+        )
+
         self.load_json_frm.pack(
             fill=tk.BOTH, expand=True, padx=(10, 50), pady=10, side="left"
         )
         self.load_json_frm.grid_rowconfigure(
-            (0, 1, 2, 3), weight=1
+            (0, 1, 2, 3, 4, 5), weight=1
         )  # center widgets vertically by giving them equal weight
         self.load_json_frm.grid_columnconfigure(
             (0, 1), weight=1
@@ -149,6 +254,9 @@ class ArtStationArtworkDownloader(tk.Tk):
         self.loaded_json_lbl.grid(row=2, column=0, padx=5, pady=(5, 0))
         self.loaded_json_ent.grid(row=3, column=0, padx=10, pady=(0, 10))
         self.clear_json_btn.grid(row=3, column=1, padx=10, pady=(0, 10))
+        self.artist_lbl.grid(row=4, column=0, padx=5, pady=(5, 0))
+        self.artist_ent.grid(row=5, column=0, padx=10, pady=(0, 10))
+        self.portfolio_btn.grid(row=5, column=1, padx=10, pady=(0, 10))
 
         ###/// GET JSON FRAME (FALLBACK FRAME) \\\###
         self.get_json_frm = ttk.LabelFrame(
@@ -186,12 +294,24 @@ class ArtStationArtworkDownloader(tk.Tk):
 
         img_y_scrollbar = tk.Scrollbar(self.output_frm, orient="vertical")
         img_x_scrollbar = tk.Scrollbar(self.output_frm, orient="horizontal")
-        self.image_list = tk.Listbox(
+        # A treeview instead of a listbox as only its rows can show an image
+        self.style.configure(
+            "Thumbnails.Treeview", rowheight=thumbnails.THUMBNAIL_SIZE + 4
+        )
+        self.image_list = ttk.Treeview(
             master=self.output_frm,
-            selectmode="multiple",
-            yscrollcommand=img_y_scrollbar.set,
+            style="Thumbnails.Treeview",
+            show="tree",
+            selectmode="none",
+            height=4,
+            yscrollcommand=lambda *args: self._image_list_scrolled(
+                img_y_scrollbar, *args
+            ),
             xscrollcommand=img_x_scrollbar.set,
         )
+        self.image_list.column("#0", width=800, minwidth=1200, stretch=True)
+        # Clicking a row toggles its selection like in the former listbox
+        self.image_list.bind("<Button-1>", self._toggle_image)
         img_y_scrollbar.config(command=self.image_list.yview)
         img_x_scrollbar.config(command=self.image_list.xview)
 
@@ -280,6 +400,11 @@ class ArtStationArtworkDownloader(tk.Tk):
         )
         log_y_scrollbar.config(command=self.log_lb.yview)
         log_x_scrollbar.config(command=self.log_lb.xview)
+        self.log_filter_lbl = ttk.Label(master=self.log_frm, text="Filter log:")
+        self.log_filter_ent = ttk.Entry(
+            master=self.log_frm, textvariable=self.LOG_FILTER
+        )
+        self.LOG_FILTER.trace_add("write", lambda *args: self._schedule_log_filter())
 
         self.log_frm.pack(fill=tk.BOTH, expand=True, padx=10, pady=(0, 10))
         self.log_frm.grid_rowconfigure(0, weight=1)
@@ -288,8 +413,15 @@ class ArtStationArtworkDownloader(tk.Tk):
         self.log_lb.grid(row=0, column=0, padx=5, pady=5, sticky="EW")
         log_y_scrollbar.grid(row=0, column=1, sticky="NS")
         log_x_scrollbar.grid(row=1, column=0, sticky="EW")
+        self.log_filter_lbl.grid(row=2, column=0, padx=5, pady=(5, 0), sticky="W")
+        self.log_filter_ent.grid(row=3, column=0, padx=5, pady=(0, 5), sticky="EW")
 
     ###/// FUNCTIONS \\\###
+    def destroy(self):
+        self._thumbnail_loader.close()
+        self._log.close()
+        super().destroy()
+
     def center_window(self, windowWidth: int, windowHeight: int):
         """
         Function to place the app window in the center of the screen when launching it.
@@ -320,7 +452,9 @@ class ArtStationArtworkDownloader(tk.Tk):
             "2. Paste hash ID (found after artstation.com/artwork/)\n"
             "3. Load JSON from URL (if error use Fallback Method)\n"
             "4. Select images that are to be excluded from download\n"
-            "5. Download images",
+            "5. Download images\n\n"
+            "To download all projects of an artist, paste the username (or URL "
+            'to the portfolio) and click "Download all projects"',
         )
 
     def select_path(self):
@@ -329,14 +463,14 @@ class ArtStationArtworkDownloader(tk.Tk):
 
     def get_json_url(self):
         hashid = self.project_ent.get()
-        url = f"https://www.artstation.com/projects/{hashid}.json"
+        url = downloader.project_url(hashid)
         self.clipboard_clear()
         self.clipboard_append(url)
 
     @staticmethod
     def load_json(json_string: str):
         try:
-            data = json.loads(json_string)
+            data = downloader.load_json(json_string)
             return data
         except json.JSONDecodeError as e:
             messagebox.showerror("Error", f"Invalid JSON: {e}")
@@ -349,6 +483,8 @@ class ArtStationArtworkDownloader(tk.Tk):
             json_content = self.load_json(clipboard_text)
             if json_content is None:
                 return
+            # the project was not fetched, drop the timing of an earlier fetch
+            self._fetch_metrics = metrics.RunMetrics()
             self._populate_image_list(json_content)
         except tk.TclError:
             messagebox.showerror("Error", "Clipboard is empty!")
@@ -357,18 +493,17 @@ class ArtStationArtworkDownloader(tk.Tk):
     def load_json_url(self):
         try:
             hashid = self.project_ent.get()
-            url = f"https://www.artstation.com/projects/{hashid}.json"
-            scraper = cloudscraper.create_scraper()
-            response = scraper.get(url, timeout=15)
-            response.raise_for_status()
-            json_data = response.json()
+            self._fetch_metrics = metrics.RunMetrics()
+            json_data = downloader.fetch_project(
+                hashid, cache=self._project_cache, run_metrics=self._fetch_metrics
+            )
             self._populate_image_list(json_data)
         except Exception as e:
             messagebox.showerror("Error", f"Failed to get JSON:\n\n{e}")
 
     def _populate_image_list(self, json_content):
-        # Clear all items from the listbox
-        self.image_list.delete(0, tk.END)
+        # Clear all items from the list
+        self._clear_image_list()
         try:
             id = json_content["hash_id"]
         except KeyError:
@@ -376,20 +511,105 @@ class ArtStationArtworkDownloader(tk.Tk):
             return
 
         self.LOADED_JSON.set(id)
-        assets = json_content["assets"]
-        # covers and videos will lead to a 403 when trying to download, best to filter them out
-        urls = [
-            asset["image_url"] for asset in assets if asset["asset_type"] == "image"
-        ]
-        if not len(urls) == 0:
-            for img in urls:
-                self.image_list.insert(tk.END, img)
+        self._assets = assets.image_assets(json_content)
+        if not len(self._assets) == 0:
+            for index, asset in enumerate(self._assets):
+                self.image_list.insert("", tk.END, iid=str(index), text=asset.image_url)
+            self._schedule_thumbnails()
         else:
             messagebox.showinfo("Info", "No images found")
 
     def _clear_json(self):
         self.LOADED_JSON.set("")
-        self.image_list.delete(0, tk.END)
+        self._fetch_metrics = metrics.RunMetrics()
+        self._clear_image_list()
+
+    def _clear_image_list(self):
+        self.image_list.delete(*self.image_list.get_children())
+        self._assets = []
+        self._excluded.clear()
+        self._thumbnail_images.clear()
+        self._image_list_version += 1
+
+    def _toggle_image(self, event):
+        """
+        Toggle whether the clicked row of the image list is excluded from the
+        download
+
+        :param event: click event
+        """
+        row = self.image_list.identify_row(event.y)
+        if row:
+            self._excluded ^= {int(row)}
+            self.image_list.selection_toggle(row)
+        return "break"
+
+    def _image_list_scrolled(self, scrollbar: tk.Scrollbar, first, last):
+        """
+        Update the scrollbar of the image list and load the thumbnails of the
+        rows that became visible once the scrolling stopped
+
+        :param scrollbar: vertical scrollbar of the image list
+        :param first: position of the top of the visible part
+        :param last: position of the bottom of the visible part
+        """
+        scrollbar.set(first, last)
+        self._schedule_thumbnails()
+
+    def _schedule_thumbnails(self):
+        if self._thumbnail_job is not None:
+            self.after_cancel(self._thumbnail_job)
+        self._thumbnail_job = self.after(THUMBNAIL_DELAY_MS, self._load_thumbnails)
+
+    def _load_thumbnails(self):
+        """
+        Request the thumbnails of the visible rows of the image list that have
+        none yet, rows that were never visible are not fetched
+        """
+        self._thumbnail_job = None
+        top = self.image_list.identify_row(1)
+        if not top:
+            return  # empty list
+        bottom = self.image_list.identify_row(self.image_list.winfo_height() - 2)
+        last = int(bottom) if bottom else len(self._assets) - 1
+        version = self._image_list_version
+        for index in range(int(top), last + 1):
+            if index in self._thumbnail_images:
+                continue
+            self._thumbnail_loader.request(
+                self._assets[index].url("small"),
+                lambda url, data, index=index: self._thumbnail_events.put(
+                    (version, index, data)
+                ),
+            )
+        if self._thumbnail_poll is None and self._thumbnail_loader.busy():
+            self._thumbnail_poll = self.after(POLL_INTERVAL_MS, self._poll_thumbnails)
+
+    def _poll_thumbnails(self):
+        """
+        Show the thumbnails fetched by the loader, called periodically with
+        after() for as long as thumbnails are being fetched
+        """
+        self._thumbnail_poll = None
+        while True:
+            try:
+                version, index, data = self._thumbnail_events.get_nowait()
+            except queue.Empty:
+                break
+            if data is None or not version == self._image_list_version:
+                continue
+            try:
+                image = tk.PhotoImage(data=base64.b64encode(data))
+            except tk.TclError:
+                continue  # not an image Tk can read
+            # Scale images Tk read itself (i.e. without Pillow) down
+            factor = -(-max(image.width(), image.height()) // thumbnails.THUMBNAIL_SIZE)
+            if factor > 1:
+                image = image.subsample(factor)
+            self._thumbnail_images[index] = image
+            self.image_list.item(str(index), image=image)
+        if self._thumbnail_loader.busy() or not self._thumbnail_events.empty():
+            self._thumbnail_poll = self.after(POLL_INTERVAL_MS, self._poll_thumbnails)
 
     def show_entry(self, var, ent):
         """
@@ -403,27 +623,6 @@ class ArtStationArtworkDownloader(tk.Tk):
         else:
             ent.configure(state="normal")
 
-    @staticmethod
-    def _no_cache(url: str):
-        """
-        Prevent a cache hit to circumvent Cloudflare's 'optimizations'
-
-        Artstation will send different images depending on whether an image
-        is a cache hit or miss due to Cloudflare's 'Polish' image optimization [1].
-        This feature removes image metadata, including color profiles, which can
-        distort the colors [2], and may even recompress an image which might lead to
-        image quality loss [3]. Adding a random dummy query parameter should cause a
-        cache miss and prevent this from happening [1].
-
-        Reference:
-        [1] https://github.com/r888888888/danbooru/issues/3528
-        [2] https://pwmon.org/p/5470/cloudflare-discolors-web/
-        [3] https://blog.cloudflare.com/introducing-polish-automatic-image-optimizati/
-        """
-        dummy_param = secrets.token_hex(16)
-        # dummy_param = secrets.token_urlsafe(16)
-        return f"{url}&{dummy_param}"
-
     def update_progress(self, index: int, total: int):
         """
         Update the progressbar
@@ -431,48 +630,11 @@ class ArtStationArtworkDownloader(tk.Tk):
         :param index: current item
         :param total: total number of items/ max value of progressbar
         """
+        self.progbar.config(maximum=total)
         self.progbar["value"] = index
         self.PROGRESS.set(f"{index}/{total}")
         self.update_idletasks()
 
-    @staticmethod
-    def get_filename(url: str) -> str:
-        """
-        Get the filename from a URL without the file extension
-
-        :param url: URL to file
-        """
-        clean_url = url.split("?", 1)[0]
-        basename = os.path.basename(clean_url)
-        cleaned_name = os.path.splitext(basename)[0]
-        return cleaned_name
-
-    @staticmethod
-    def get_extension(
-        url: str, resp: requests.Response, allowed_extn: dict[str, str]
-    ) -> str:
-        """
-        Get the extension of a file from a URL either from server's response
-        Content-Type or from the URL suffix if Content-Type does not exist or
-        is not in the dictionary of the allowed extensions
-
-        :param url: URL to file
-        :param resp: Server's response to HTTP request for file
-        :param allowed_extn: file extension to look for from Content-Type in server's response
-        """
-        # Get extension from Content-Type header...
-        content_type = (
-            resp.headers.get("Content-Type", "").split(";")[0].strip().lower()
-        )
-        extn = allowed_extn.get(content_type)
-
-        # ...else fallback to URL suffix if not known Content-Type
-        # (sometimes files have the wrong extension)
-        if not extn:
-            clean_url = url.split("?", 1)[0]
-            extn = os.path.splitext(clean_url)[1]
-        return extn
-
     def _get_new_name(self, filename: str, ext: str, store_path: str):
         """
         Allow user to enter a new name for a file should one with the same name
@@ -491,81 +653,131 @@ class ArtStationArtworkDownloader(tk.Tk):
         )
         if new_filename is None or new_filename == "":
             return
-        new_file = f"{new_filename}{ext}"
-        file_path = os.path.join(store_path, new_file)
-        if os.path.isfile(file_path):
-            new_file = self._get_new_name(filename, ext, store_path)
-            return new_file
-        else:
-            return new_file
+        # The downloader asks again if the new name is taken as well
+        return f"{new_filename}{ext}"
 
-    def download_image(
-        self,
-        url: str,
-        filename: str,
-        store_path: str,
-        session: requests.Session,
-        headers: dict[str, str],
-        allowed_extn: dict[str, str],
-    ) -> str:
-        try:
-            url_no_cache = self._no_cache(url)
-            with session.get(
-                url_no_cache, timeout=15, stream=True, headers=headers
-            ) as resp:
-                resp.raise_for_status()
-                content_length = int(resp.headers.get("Content-Length", 0))
-                ext = self.get_extension(url_no_cache, resp, allowed_extn)
-                file = f"{filename}{ext}"
-                file_path = os.path.join(store_path, file)
-                new_name = None
-
-                if os.path.isfile(file_path):
-                    if not self.SKIP_EXISTING.get():
-                        new_name = self._get_new_name(filename, ext, store_path)
-
-                    if new_name is None:
-                        self.SKIPS += 1
-                        return f'^ Skipped "{file}" as it already exists'
-
-                    file_path = os.path.join(store_path, new_name)
-
-                with open(file_path, "wb") as f:
-                    for chunk in resp.iter_content(chunk_size=8192):
-                        if not chunk:
-                            continue  # filters out keep-alive packets so only real file data is written
-                        f.write(chunk)
-
-            self.SAVED += 1
-            file_size = os.path.getsize(file_path)
-            human_size = naturalsize(file_size)
-            if not content_length == 0 and not content_length == file_size:
-                # Check if there is a size difference between reported size
-                # found in the response.header (if present) and downloaded file
-                # if there is, that could mean there was a cache HIT and a
-                # compressed file was downloaded
-                self.WARNINGS += 1
-                diff = naturalsize(abs(content_length - file_size))
-                return f'* Saved: "{file}" with {human_size} - Warning: File size mismatch between local copy and ArtStation by {diff}'
-            if new_name is not None:
-                return f'+ Saved "{file}" as: "{new_name}" with {human_size}'
-            return f'+ Saved: "{file}" with {human_size}'
-
-        except requests.HTTPError as e:
-            if e.response.status_code == 429:
-                self.ERRORS += 1
-                # print(e.response.headers["Retry-After"])
-                self.log_lb.insert(tk.END, f"! {e}")
-                return "429"
-            else:
-                self.ERRORS += 1
-                return f'! HTTP error while downloading "{url}": {e}'
-        except requests.Timeout:
-            self.ERRORS += 1
-            return f'! Timeout reached while fetching "{url}"'
-        except requests.RequestException as e:
-            self.ERRORS += 1
-            return f'! Failed "{url}": {e}'
+    def _request_new_name(self, filename: str, ext: str, store_path: str):
+        """
+        Ask for a new filename from a download worker thread
+
+        Tk widgets may only be touched from the main thread, so the request is
+        handed over to it through the event queue and the worker waits for the
+        answer.
+
+        :param filename: name of the file
+        :param ext: extension of the file
+        :param store_path: path to target directory
+        """
+        reply = {}
+        answered = threading.Event()
+        self._events.put(("prompt", (filename, ext, store_path, reply, answered)))
+        answered.wait()
+        return reply.get("name")
+
+    def _answer_prompt(self, filename, ext, store_path, reply, answered):
+        """
+        Show the rename dialog for a request of a download worker
+
+        :param filename: name of the file
+        :param ext: extension of the file
+        :param store_path: path to target directory
+        :param reply: dictionary the new name is stored in
+        :param answered: event to set once the dialog has been closed
+        """
+        # "Skip all" in an earlier dialog skips the remaining files
+        if not self.SKIP_EXISTING.get():
+            reply["name"] = self._get_new_name(filename, ext, store_path)
+        answered.set()
+
+    def _flush_log(self):
+        """
+        Show the lines added to the log since the last update in one insert and
+        drop the oldest lines of the listbox beyond the size of the log
+        """
+        lines, overflowed = self._log.drain()
+        if not lines:
+            return
+        text = self.LOG_FILTER.get().strip().lower()
+        if text:
+            lines = [line for line in lines if text in line.lower()]
+        elif overflowed:
+            # More lines were added than are kept, show what is left of them
+            self.log_lb.delete(0, tk.END)
+            lines = list(self._log.lines)
+        if lines:
+            self.log_lb.insert(tk.END, *lines)
+        excess = self.log_lb.size() - self._log.max_lines
+        if excess > 0:
+            self.log_lb.delete(0, excess - 1)
+
+    def _schedule_log_filter(self):
+        """
+        Filter the log once no key was pressed in the filter for FILTER_DELAY_MS
+        """
+        if self._filter_job is not None:
+            self.after_cancel(self._filter_job)
+        self._filter_job = self.after(FILTER_DELAY_MS, self._apply_log_filter)
+
+    def _apply_log_filter(self):
+        """
+        Show the lines of the whole log file containing the filter text, or the
+        most recent lines if the filter is empty
+        """
+        self._filter_job = None
+        self._flush_log()
+        text = self.LOG_FILTER.get().strip()
+        lines = self._log.search(text) if text else list(self._log.lines)
+        self.log_lb.delete(0, tk.END)
+        if lines:
+            self.log_lb.insert(tk.END, *lines)
+
+    def _poll_events(self):
+        """
+        Apply the events sent by the download worker to the GUI
+
+        Called periodically with after() for as long as a download is running.
+        The log lines added in the meantime are shown in one batch.
+        """
+        for _ in range(MAX_EVENTS_PER_POLL):
+            try:
+                event, payload = self._events.get_nowait()
+            except queue.Empty:
+                break
+            if event == "progress":
+                self.update_progress(*payload)
+            elif event == "prompt":
+                self._answer_prompt(*payload)
+            elif event == "rate_limited":
+                messagebox.showwarning(
+                    "Warning: 429 Too Many Requests",
+                    "Rate limit exceeded. Best take a break and try again later.",
+                )
+                self._log.append(
+                    "< Rate limit exceeded, cancelling download of remaining files..."
+                )
+            elif event == "done":
+                self._flush_log()
+                self.run_btn.configure(state="normal")
+                self.portfolio_btn.configure(state="normal")
+                return
+        self._flush_log()
+        self.after(POLL_INTERVAL_MS, self._poll_events)
+
+    def _check_store_path(self, store_path: str) -> bool:
+        """
+        Whether the downloads can be stored in a directory, shows an error if not
+
+        :param store_path: path to target directory
+        """
+        if store_path == "":
+            messagebox.showerror(
+                "Error", "Please select a directory to store the downloads"
+            )
+            return False
+        elif not os.path.exists(store_path):
+            messagebox.showerror("Error", "Directory does not exist!")
+            return False
+        return True
 
     def _download_images(self):
         store_path = self.STORE_PATH.get()
@@ -575,113 +787,179 @@ class ArtStationArtworkDownloader(tk.Tk):
         self.PROGRESS.set("")
         self.progbar["value"] = 0
         self.progbar.update()
-        self.SAVED = 0
-        self.ERRORS = 0
-        self.SKIPS = 0
-        self.WARNINGS = 0
-        HEADERS = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/143.0.0.0 Safari/537.36",
-            "Cache-Control": "max-age=0, no-cache, no-store, must-revalidate",
-        }
-        # Most common image extensions
-        EXTN_FROM_CONTENT_TYPE = {
-            "image/avif": ".avif",
-            "image/bmp": ".bmp",
-            "image/gif": ".gif",
-            "image/jpeg": ".jpg",
-            "image/jpg": ".jpg",
-            "image/png": ".png",
-            "image/tiff": ".tiff",
-            "image/webp": ".webp",
-        }
 
-        if store_path == "":
-            messagebox.showerror(
-                "Error", "Please select a directory to store the downloads"
-            )
+        if not self._check_store_path(store_path):
             return
-        elif not os.path.exists(store_path):
-            messagebox.showerror("Error", "Directory does not exist!")
+        if not self.output_format.get() == "files" and self.LOADED_JSON.get() == "":
+            # The archive is named after the hash ID of the project
+            messagebox.showerror("Error", "Please load a project first")
             return
 
-        # Get the indices of current selection from the listbox
-        selections = self.image_list.curselection()
-
-        all_items = self.image_list.get(0, tk.END)
         selected_images = [
-            item for index, item in enumerate(all_items) if index not in selections
+            asset
+            for index, asset in enumerate(self._assets)
+            if index not in self._excluded
         ]
         progbar_max = len(selected_images)
         self.progbar.config(maximum=progbar_max)
         self.PROGRESS.set(f"0/{progbar_max}")
 
-        with requests.Session() as sess:
-            if custom_name_check and not custom_name == "":
-                counter = 1
-                for image in selected_images:
-                    image_url = image.replace("/large/", f"/{img_option}/")
-                    filename = f"{custom_name}{counter}"
-                    download_result = self.download_image(
-                        image_url,
-                        filename,
-                        store_path,
-                        sess,
-                        HEADERS,
-                        EXTN_FROM_CONTENT_TYPE,
-                    )
-                    if download_result == "429":
-                        # Since the download of all remaining files will now be
-                        # cancelled, ensure they are also counted as skipped
-                        self.SKIPS += progbar_max - (
-                            self.SAVED + self.ERRORS + self.SKIPS
-                        )
-                        messagebox.showwarning(
-                            "Warning: 429 Too Many Requests",
-                            "Rate limit exceeded. Best take a break and try again later.",
-                        )
-                        self.log_lb.insert(
-                            tk.END,
-                            "< Rate limit exceeded, cancelling download of remaining files...",
-                        )
-                        break
-                    self.log_lb.insert(tk.END, download_result)
-                    self.update_progress(counter, progbar_max)
-                    counter += 1
-            else:
-                counter = 1
-                for image in selected_images:
-                    filename = self.get_filename(image)
-                    image_url = image.replace("/large/", f"/{img_option}/")
-                    download_result = self.download_image(
-                        image_url,
-                        filename,
-                        store_path,
-                        sess,
-                        HEADERS,
-                        EXTN_FROM_CONTENT_TYPE,
-                    )
-                    if download_result == "429":
-                        self.SKIPS += progbar_max - (
-                            self.SAVED + self.ERRORS + self.SKIPS
-                        )
-                        messagebox.showwarning(
-                            "Warning: 429 Too Many Requests",
-                            "Rate limit exceeded. Best take a break and try again later.",
-                        )
-                        self.log_lb.insert(
-                            tk.END,
-                            "< Rate limit exceeded, cancelling download of remaining files...",
-                        )
-                        break
-                    self.log_lb.insert(tk.END, download_result)
-                    self.update_progress(counter, progbar_max)
-                    counter += 1
-
-        self.log_lb.insert(
-            tk.END,
-            f">>> {progbar_max} Files - Saved: {self.SAVED}, Skipped: {self.SKIPS}, Errors: {self.ERRORS}, Warnings: {self.WARNINGS}",
-        )
-        self.log_lb.insert(tk.END, "")
+        jobs = downloader.build_jobs(
+            selected_images, img_option, custom_name if custom_name_check else ""
+        )
+        project_archive = None
+        if not self.output_format.get() == "files":
+            project_archive = archive.ProjectArchive(
+                archive.archive_path(
+                    store_path, self.LOADED_JSON.get(), self.output_format.get()
+                )
+            )
+        self._downloader = downloader.Downloader(
+            store_path,
+            max_workers=self.MAX_WORKERS.get(),
+            skip_existing=self.SKIP_EXISTING.get(),
+            ask_rename=self._request_new_name,
+            run_metrics=metrics.RunMetrics(),
+            collision_policy=self.collision_policy.get(),
+            project_archive=project_archive,
+        )
+        self._downloader.run_metrics.fetches.extend(self._fetch_metrics.fetches)
+        # further runs of the same project did not fetch it again
+        self._fetch_metrics = metrics.RunMetrics()
+
+        # The downloads run on a background thread so the window stays
+        # responsive, prevent a second run from being started in the meantime
+        self.run_btn.configure(state="disabled")
+        self.portfolio_btn.configure(state="disabled")
+        worker = threading.Thread(
+            target=self._download_worker,
+            args=(self._downloader, jobs),
+            daemon=True,
+        )
+        worker.start()
+        self.after(POLL_INTERVAL_MS, self._poll_events)
+
+    def _download_portfolio(self):
+        store_path = self.STORE_PATH.get()
+        username = portfolio.parse_username(self.artist_ent.get())
+        custom_name = self.custom_entry.get() if self.CUSTOM_NAME.get() else ""
+        self.PROGRESS.set("")
+        self.progbar["value"] = 0
+        self.progbar.update()
+
+        if username == "":
+            messagebox.showerror("Error", "Please enter the username of an artist")
+            return
+        if not self._check_store_path(store_path):
+            return
+
+        run_metrics = metrics.RunMetrics()
+        artist_portfolio = portfolio.Portfolio(username)
+        batch_downloader = batch.BatchDownloader(
+            store_path,
+            size=self.img_quality.get(),
+            max_workers=self.MAX_WORKERS.get(),
+            custom_name=custom_name,
+            skip_existing=self.SKIP_EXISTING.get(),
+            ask_rename=self._request_new_name,
+            fetch_project=functools.partial(
+                downloader.fetch_project,
+                cache=self._project_cache,
+                run_metrics=run_metrics,
+            ),
+            run_metrics=run_metrics,
+            collision_policy=self.collision_policy.get(),
+            archive_format=(
+                None
+                if self.output_format.get() == "files"
+                else self.output_format.get()
+            ),
+        )
+
+        self.run_btn.configure(state="disabled")
+        self.portfolio_btn.configure(state="disabled")
+        worker = threading.Thread(
+            target=self._portfolio_worker,
+            args=(artist_portfolio, batch_downloader),
+            daemon=True,
+        )
+        worker.start()
+        self.after(POLL_INTERVAL_MS, self._poll_events)
+
+    def _download_worker(
+        self, image_downloader: downloader.Downloader, jobs: list[tuple[str, str]]
+    ):
+        """
+        Download all images on a background thread and report the results to
+        the GUI through the log and the event queue
+
+        :param image_downloader: downloader of the current run
+        :param jobs: tuples of image URL and filename (without extension)
+        """
+        progbar_max = len(jobs)
+        rate_limited = False
+        try:
+            for counter, download_result in enumerate(
+                image_downloader.run(jobs), start=1
+            ):
+                self._log.append(download_result)
+                self._events.put(("progress", (counter, progbar_max)))
+                if image_downloader.rate_limited and not rate_limited:
+                    rate_limited = True
+                    self._events.put(("rate_limited", None))
+
+            self._log.append(image_downloader.summary(progbar_max))
+            self._log.append(transport.get().summary())
+            self._log.append(transport.get().clearance_store.summary())
+            image_downloader.run_metrics.finish()
+            self._log.append(image_downloader.run_metrics.summary())
+            self._log.append("")
+        except Exception as e:
+            # The thread would otherwise end without a trace in the GUI
+            self._log.append(f"! Download stopped by an unexpected error: {e!r}")
+        finally:
+            self._events.put(("done", None))
+
+    def _portfolio_worker(
+        self,
+        artist_portfolio: portfolio.Portfolio,
+        batch_downloader: batch.BatchDownloader,
+    ):
+        """
+        Download the images of all projects of an artist on a background
+        thread, the projects are downloaded while the pages of the portfolio
+        are still being fetched
+
+        :param artist_portfolio: portfolio to enumerate the projects of
+        :param batch_downloader: downloader of the current run
+        """
+        rate_limited = False
+        try:
+            for hash_id, download_result in batch_downloader.run(
+                artist_portfolio.hash_ids()
+            ):
+                self._log.append(f"{hash_id}: {download_result}")
+                # The total grows as the JSON data of more projects arrives,
+                # only the results of images count towards the progress
+                total = sum(files for _, files in batch_downloader.projects.values())
+                counter = batch_downloader.IMAGES
+                self._events.put(("progress", (min(counter, total), total)))
+                if batch_downloader.rate_limited and not rate_limited:
+                    rate_limited = True
+                    self._events.put(("rate_limited", None))
+
+            for line in batch_downloader.summary():
+                self._log.append(line)
+            self._log.append(artist_portfolio.summary())
+            self._log.append(transport.get().summary())
+            self._log.append(transport.get().clearance_store.summary())
+            self._log.append(batch_downloader.run_metrics.summary())
+            self._log.append("")
+        except Exception as e:
+            # The thread would otherwise end without a trace in the GUI
+            self._log.append(f"! Download stopped by an unexpected error: {e!r}")
+        finally:
+            self._events.put(("done", None))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,142 @@
+# Copyright (C) 2025 Jérémy Rotzetter
+
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+from urllib.parse import urlsplit
+
+MANIFEST_NAME = ".artstation-manifest.sqlite3"
+
+
+def asset_id(url: str) -> str:
+    """
+    Get the ID of an asset from the URL to one of its images
+
+    ArtStation stores images under a path containing the asset ID split into
+    groups of digits, e.g. .../images/012/345/678/large/name.jpg
+
+    :param url: URL to image
+    """
+    parts = urlsplit(url).path.split("/")
+    digits = "".join(part for part in parts[:-1] if part.isdigit())
+    return digits if digits else urlsplit(url).path
+
+
+def asset_size(url: str) -> str:
+    """
+    Get the image dimensions (e.g. 8k) from the URL to an image
+
+    :param url: URL to image
+    """
+    parts = urlsplit(url).path.split("/")
+    return parts[-2] if len(parts) > 1 else ""
+
+
+def asset_version(url: str) -> str:
+    """
+    Get the version of an image, ArtStation appends the time of the last
+    update of an asset to its URLs as query string
+
+    :param url: URL to image
+    """
+    return urlsplit(url).query
+
+
+class Manifest:
+    """
+    SQLite database of the images downloaded to a directory
+
+    It allows to tell which images are already up to date before sending any
+    request, so re-syncing a project only downloads new or changed images.
+
+    :param store_path: path to the directory the images are saved to
+    """
+
+    def __init__(self, store_path: str):
+        self.store_path = store_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            os.path.join(store_path, MANIFEST_NAME), check_same_thread=False
+        )
+        with self._conn:
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS assets (
+                    asset_id TEXT NOT NULL,
+                    size TEXT NOT NULL,
+                    url TEXT NOT NULL,
+                    version TEXT NOT NULL,
+                    filename TEXT NOT NULL,
+                    byte_size INTEGER NOT NULL,
+                    sha256 TEXT,
+                    saved_at REAL NOT NULL,
+                    PRIMARY KEY (asset_id, size)
+                )
+                """
+            )
+
+    def get(self, url: str) -> Optional[tuple[str, str, int, str]]:
+        """
+        Get the entry of an image as tuple of filename, version, byte size and
+        SHA-256 hash or None if it has never been downloaded
+
+        :param url: URL to image
+        """
+        with self._lock:
+            return self._conn.execute(
+                "SELECT filename, version, byte_size, sha256 FROM assets WHERE asset_id = ? AND size = ?",
+                (asset_id(url), asset_size(url)),
+            ).fetchone()
+
+    def is_current(self, url: str) -> Optional[str]:
+        """
+        Get the filename of an image if it was already downloaded in the same
+        version and the file is still unchanged on disk, else None
+
+        :param url: URL to image
+        """
+        entry = self.get(url)
+        if entry is None:
+            return None
+        filename, version, byte_size, _ = entry
+        if not version == asset_version(url):
+            return None
+        try:
+            if (
+                not os.path.getsize(os.path.join(self.store_path, filename))
+                == byte_size
+            ):
+                return None
+        except OSError:
+            return None
+        return filename
+
+    def record(self, url: str, filename: str, byte_size: int, sha256: str):
+        """
+        Add or update the entry of a downloaded image
+
+        :param url: URL to image
+        :param filename: name of the file in the directory
+        :param byte_size: size of the file
+        :param sha256: SHA-256 hash of the content of the file
+        """
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO assets VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    asset_id(url),
+                    asset_size(url),
+                    url.split("?", 1)[0],
+                    asset_version(url),
+                    filename,
+                    byte_size,
+                    sha256,
+                    time.time(),
+                ),
+            )
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
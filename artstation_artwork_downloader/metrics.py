@@ -0,0 +1,313 @@
+# Copyright (C) 2025 Jérémy Rotzetter
+
+import json
+import os
+import tempfile
+import threading
+import time
+
+# Phases of a download timed by AssetTiming
+PHASES = ("ttfb", "read", "write", "total")
+# Result of a download by the first character of its log line
+RESULTS = {"+": "saved", "*": "saved", "^": "skipped", "!": "error"}
+QUANTILES = (0.5, 0.95)
+
+
+def quantile(values: list[float], q: float) -> float:
+    """
+    Get a quantile of a list of values (nearest rank), 0 if it is empty
+
+    :param values: values sorted in ascending order
+    :param q: quantile between 0 and 1
+    """
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def describe(values: list[float]) -> dict[str, float]:
+    """
+    Get the count, sum, mean, quantiles and maximum of a list of values
+
+    :param values: values in any order
+    """
+    values = sorted(values)
+    total = sum(values)
+    stats = {
+        "count": len(values),
+        "sum": total,
+        "mean": total / len(values) if values else 0.0,
+    }
+    for q in QUANTILES:
+        stats[f"p{int(q * 100)}"] = quantile(values, q)
+    stats["max"] = values[-1] if values else 0.0
+    return stats
+
+
+class AssetTiming:
+    """
+    Timings in seconds and number of bytes of the download of a single image
+
+    ttfb is the time until the response headers arrived, read and write the
+    time spent reading the body from the connection and writing it to disk
+    and total the time of the whole download including retries.
+
+    :param url: URL to image
+    """
+
+    def __init__(self, url: str):
+        self.url = url
+        self.result = ""
+        self.bytes = 0
+        self.ttfb = 0.0
+        self.read = 0.0
+        self.write = 0.0
+        self.total = 0.0
+
+    def throughput(self) -> float:
+        """
+        Get the number of bytes transferred per second while reading the body
+        """
+        return self.bytes / self.read if self.read else 0.0
+
+    def as_dict(self) -> dict:
+        """
+        Get the timings as a dictionary for the JSON export
+        """
+        return {
+            "url": self.url,
+            "result": self.result,
+            "bytes": self.bytes,
+            **{phase: getattr(self, phase) for phase in PHASES},
+            "throughput": self.throughput(),
+        }
+
+
+class RunMetrics:
+    """
+    Timings of the project JSON fetches and image downloads of a run
+
+    Shared by all workers, the aggregates can be exported as JSON and in the
+    Prometheus text format at the end of a run to track regressions and size
+    the concurrency settings.
+    """
+
+    def __init__(self):
+        self.started_at = time.time()
+        self._started = time.perf_counter()
+        self.seconds = None
+        self.assets: list[AssetTiming] = []
+        # hash ID, seconds, bytes and how the JSON data was served
+        self.fetches: list[tuple[str, float, int, str]] = []
+        self._lock = threading.Lock()
+
+    def record_fetch(self, hash_id: str, seconds: float, nbytes: int, source: str):
+        """
+        Record the fetch of the JSON data of a project
+
+        :param hash_id: hash ID of the project
+        :param seconds: time the fetch took
+        :param nbytes: size of the response body
+        :param source: "hit", "revalidated" or "miss"
+        """
+        with self._lock:
+            self.fetches.append((hash_id, seconds, nbytes, source))
+
+    def record_asset(self, timing: AssetTiming):
+        """
+        Record the download of an image
+
+        :param timing: timings of the download
+        """
+        with self._lock:
+            self.assets.append(timing)
+
+    def elapsed(self) -> float:
+        """
+        Get the duration of the run, up to now if it is not finished yet
+        """
+        if self.seconds is not None:
+            return self.seconds
+        return time.perf_counter() - self._started
+
+    def finish(self):
+        """
+        Mark the end of the run
+        """
+        self.seconds = time.perf_counter() - self._started
+
+    def aggregates(self) -> dict:
+        """
+        Get the aggregated metrics of the run
+        """
+        with self._lock:
+            assets = list(self.assets)
+            fetches = list(self.fetches)
+        results = {result: 0 for result in sorted(set(RESULTS.values()))}
+        for timing in assets:
+            results[timing.result] = results.get(timing.result, 0) + 1
+        # Only downloads that actually transferred a body count for the timings
+        transferred = [timing for timing in assets if timing.bytes]
+        total_bytes = sum(timing.bytes for timing in assets)
+        elapsed = self.elapsed()
+        sources = {}
+        for _, _, _, source in fetches:
+            sources[source] = sources.get(source, 0) + 1
+        return {
+            "started_at": self.started_at,
+            "seconds": elapsed,
+            "results": results,
+            "bytes": total_bytes,
+            "throughput": total_bytes / elapsed if elapsed else 0.0,
+            "phases": {
+                phase: describe([getattr(timing, phase) for timing in transferred])
+                for phase in PHASES
+            },
+            "asset_throughput": describe(
+                [timing.throughput() for timing in transferred]
+            ),
+            "project_fetch": {
+                **describe([seconds for _, seconds, _, _ in fetches]),
+                "bytes": sum(nbytes for _, _, nbytes, _ in fetches),
+                "sources": sources,
+            },
+        }
+
+    def to_json(self) -> dict:
+        """
+        Get the aggregates together with the timings of every download
+        """
+        data = self.aggregates()
+        with self._lock:
+            data["assets"] = [timing.as_dict() for timing in self.assets]
+            data["fetches"] = [
+                {
+                    "hash_id": hash_id,
+                    "seconds": seconds,
+                    "bytes": nbytes,
+                    "source": source,
+                }
+                for hash_id, seconds, nbytes, source in self.fetches
+            ]
+        return data
+
+    def to_prometheus(self) -> str:
+        """
+        Get the aggregates in the Prometheus text exposition format
+        """
+        data = self.aggregates()
+        lines = [
+            "# HELP artstation_download_phase_seconds Time spent per phase of an image download.",
+            "# TYPE artstation_download_phase_seconds summary",
+        ]
+        for phase, stats in data["phases"].items():
+            for q in QUANTILES:
+                lines.append(
+                    f'artstation_download_phase_seconds{{phase="{phase}",quantile="{q}"}} {stats[f"p{int(q * 100)}"]}'
+                )
+            lines.append(
+                f'artstation_download_phase_seconds_sum{{phase="{phase}"}} {stats["sum"]}'
+            )
+            lines.append(
+                f'artstation_download_phase_seconds_count{{phase="{phase}"}} {stats["count"]}'
+            )
+        fetch = data["project_fetch"]
+        lines += [
+            "# HELP artstation_project_fetch_seconds Time spent fetching the JSON data of a project.",
+            "# TYPE artstation_project_fetch_seconds summary",
+        ]
+        for q in QUANTILES:
+            lines.append(
+                f'artstation_project_fetch_seconds{{quantile="{q}"}} {fetch[f"p{int(q * 100)}"]}'
+            )
+        lines += [
+            f"artstation_project_fetch_seconds_sum {fetch['sum']}",
+            f"artstation_project_fetch_seconds_count {fetch['count']}",
+            "# HELP artstation_project_fetches_total Project JSON fetches by how they were served.",
+            "# TYPE artstation_project_fetches_total counter",
+        ]
+        for source, count in sorted(fetch["sources"].items()):
+            lines.append(
+                f'artstation_project_fetches_total{{source="{source}"}} {count}'
+            )
+        lines += [
+            "# HELP artstation_downloads_total Image downloads by result.",
+            "# TYPE artstation_downloads_total counter",
+        ]
+        for result, count in data["results"].items():
+            lines.append(f'artstation_downloads_total{{result="{result}"}} {count}')
+        lines += [
+            "# HELP artstation_downloaded_bytes_total Bytes of image data downloaded.",
+            "# TYPE artstation_downloaded_bytes_total counter",
+            f"artstation_downloaded_bytes_total {data['bytes']}",
+            "# HELP artstation_run_seconds Duration of the run.",
+            "# TYPE artstation_run_seconds gauge",
+            f"artstation_run_seconds {data['seconds']}",
+            "# HELP artstation_run_throughput_bytes_per_second Bytes downloaded per second of the run.",
+            "# TYPE artstation_run_throughput_bytes_per_second gauge",
+            f"artstation_run_throughput_bytes_per_second {data['throughput']}",
+        ]
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _write(path: str, text: str):
+        """
+        Write a file atomically so a collector never reads a partial file
+
+        :param path: path to the file
+        :param text: content of the file
+        """
+        fd, tmp_path = tempfile.mkstemp(
+            dir=os.path.dirname(os.path.abspath(path)), suffix=".tmp"
+        )
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(text)
+            os.replace(tmp_path, path)
+        except OSError:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    def write_json(self, path: str):
+        """
+        Export the metrics of the run to a JSON file
+
+        :param path: path to the file
+        """
+        self._write(path, json.dumps(self.to_json(), indent=2))
+
+    def write_prometheus(self, path: str):
+        """
+        Export the aggregated metrics of the run to a Prometheus text file,
+        e.g. for the textfile collector of the node exporter
+
+        :param path: path to the file
+        """
+        self._write(path, self.to_prometheus())
+
+    def summary(self) -> str:
+        """
+        Get the log line summarizing the timings of the run
+        """
+        from humanize import naturalsize
+
+        data = self.aggregates()
+        phases = data["phases"]
+
+        def ms(seconds: float) -> str:
+            return f"{seconds * 1000:.0f} ms"
+
+        line = (
+            f">>> Timing - {data['seconds']:.1f} s, {naturalsize(data['bytes'])} at "
+            f"{naturalsize(data['throughput'])}/s, "
+            f"TTFB p50/p95: {ms(phases['ttfb']['p50'])}/{ms(phases['ttfb']['p95'])}, "
+            f"Read p50/p95: {ms(phases['read']['p50'])}/{ms(phases['read']['p95'])}, "
+            f"Write p50/p95: {ms(phases['write']['p50'])}/{ms(phases['write']['p95'])}"
+        )
+        fetch = data["project_fetch"]
+        if fetch["count"]:
+            line += f", JSON fetch p50/p95: {ms(fetch['p50'])}/{ms(fetch['p95'])}"
+        return line
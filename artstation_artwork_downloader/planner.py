@@ -0,0 +1,271 @@
+# Copyright (C) 2025 Jérémy Rotzetter
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+import requests
+import downloader
+import ratelimit
+import retry
+
+
+def image_size(url: str) -> Optional[str]:
+    """
+    Get the size (one of IMG_SCALE) an image URL requests or None if unknown
+
+    :param url: URL to image
+    """
+    for size in downloader.IMG_SCALE:
+        if f"/{size}/" in url:
+            return size
+    return None
+
+
+def resized_url(url: str, size: str) -> str:
+    """
+    Get the URL of an image in another size
+
+    :param url: URL to image in one of IMG_SCALE
+    :param size: one of IMG_SCALE
+    """
+    current = image_size(url)
+    if current is None:
+        return url
+    return url.replace(f"/{current}/", f"/{size}/", 1)
+
+
+class AssetPlan:
+    """
+    Result of the preflight request of an image
+
+    :param url: URL to image
+    :param filename: name of the file without extension
+    """
+
+    def __init__(self, url: str, filename: str):
+        self.url = url
+        self.filename = filename
+        self.size = 0
+        self.tier = ""
+        self.polished = False
+        self.error = None
+
+
+class Planner:
+    """
+    Preflight stage sending concurrent HEAD requests for the images that are
+    to be downloaded, before any of them is downloaded
+
+    It reports the total number of bytes, the largest size each image is
+    actually available in (ArtStation sends the largest available size if a
+    larger one is requested) and images that Cloudflare still sends polished
+    despite a fresh cache busting token. The original sizes found are used by
+    the downloader to re-request polished images before saving them.
+
+    One planner can be shared by the projects of a batch, the requests of all
+    of them are then sent from the same max_workers threads.
+
+    :param session: session to send the requests with
+    :param max_workers: maximum number of parallel requests of all plans
+    :param detect_tier: find the largest size each image is actually available
+        in, which costs one more request per image and size
+    :param headers: HTTP headers to send with each request
+    :param retry_policy: policy for retrying requests on transient errors
+    :param rate_controller: optional ratelimit.RateController shared with the
+        downloads, every request then waits for it and a 429 backs off and
+        retries like a download does
+    """
+
+    def __init__(
+        self,
+        session: requests.Session,
+        max_workers: int = 4,
+        detect_tier: bool = True,
+        headers: dict[str, str] = downloader.HEADERS,
+        retry_policy: Optional[retry.RetryPolicy] = None,
+        rate_controller: Optional[ratelimit.RateController] = None,
+    ):
+        self.session = session
+        self.max_workers = max_workers
+        self.detect_tier = detect_tier
+        self.headers = headers
+        self.retry_policy = (
+            retry_policy if retry_policy is not None else retry.RetryPolicy()
+        )
+        self.rate_controller = rate_controller
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+    def _head(self, url: str) -> requests.Response:
+        """
+        Send a HEAD request for an image, or a GET for its first byte should
+        the server not allow HEAD
+
+        :param url: URL to image
+        """
+        controller = self.rate_controller
+
+        def head():
+            if controller is not None:
+                controller.acquire()
+            try:
+                return send()
+            finally:
+                if controller is not None:
+                    controller.release()
+
+        def send():
+            resp = self.session.head(
+                downloader.no_cache(url),
+                headers=self.headers,
+                timeout=self.retry_policy.timeout,
+                allow_redirects=True,
+            )
+            if resp.status_code in (405, 501):
+                headers = {**self.headers, "Range": "bytes=0-0"}
+                with self.session.get(
+                    downloader.no_cache(url),
+                    headers=headers,
+                    timeout=self.retry_policy.timeout,
+                    stream=True,
+                ) as resp:
+                    pass
+            resp.raise_for_status()
+            return resp
+
+        attempt = 0
+        while True:
+            try:
+                resp = self.retry_policy.call(head)
+            except requests.HTTPError as e:
+                if (
+                    controller is None
+                    or not e.response.status_code == 429
+                    or attempt >= controller.max_retries
+                ):
+                    raise
+                controller.throttled(ratelimit.retry_after(e.response))
+                attempt += 1
+                continue
+            if controller is not None:
+                controller.succeeded()
+            return resp
+
+    @staticmethod
+    def _size(resp: requests.Response) -> int:
+        """
+        Get the size of an image from a HEAD or 0-byte range response
+
+        :param resp: Server's response to HTTP request for image
+        """
+        content_range = resp.headers.get("Content-Range", "")
+        if "/" in content_range:
+            total = content_range.rsplit("/", 1)[1]
+            if total.isdigit():
+                return int(total)
+        return int(resp.headers.get("Content-Length", 0))
+
+    def _probe(self, url: str) -> tuple[int, bool]:
+        """
+        Get the size of an image and whether it is still polished after
+        trying several fresh cache busting tokens
+
+        :param url: URL to image
+        """
+        for _ in range(downloader.POLISH_RETRIES):
+            resp = self._head(url)
+            original = downloader.polished_size(resp)
+            if original is None:
+                return self._size(resp), False
+        return original or self._size(resp), True
+
+    def plan_asset(self, url: str, filename: str) -> AssetPlan:
+        """
+        Send the preflight requests of a single image
+
+        :param url: URL to image in the requested size
+        :param filename: name of the file without extension
+        """
+        plan = AssetPlan(url, filename)
+        try:
+            plan.size, plan.polished = self._probe(url)
+            plan.tier = requested = image_size(url) or "unknown"
+            if self.detect_tier and requested in downloader.IMG_SCALE:
+                # Step down from the requested size as long as the next smaller
+                # size is the same image
+                index = downloader.IMG_SCALE.index(requested)
+                while index > downloader.IMG_SCALE.index("large"):
+                    smaller = downloader.IMG_SCALE[index - 1]
+                    size, _ = self._probe(resized_url(url, smaller))
+                    if not size == plan.size:
+                        break
+                    plan.tier = smaller
+                    index -= 1
+        except requests.RequestException as e:
+            plan.error = str(e)
+        return plan
+
+    def plan(self, jobs: list[tuple[str, str]]) -> "Plan":
+        """
+        Send the preflight requests of all images concurrently, may be called
+        from several threads at once
+
+        :param jobs: tuples of image URL and filename (without extension)
+        """
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.max_workers)
+        assets = list(self._pool.map(lambda job: self.plan_asset(*job), jobs))
+        return Plan(assets)
+
+    def close(self):
+        """
+        Stop the threads sending the requests
+        """
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
+
+
+class Plan:
+    """
+    Preflight results of all images of a run
+
+    :param assets: result of each image
+    """
+
+    def __init__(self, assets: list[AssetPlan]):
+        self.assets = assets
+
+    def expected_sizes(self) -> dict[str, int]:
+        """
+        Get the size each image is expected to have keyed by its URL
+        """
+        return {asset.url: asset.size for asset in self.assets if asset.size}
+
+    def summary(self) -> str:
+        """
+        Get the log line summarizing the preflight results
+        """
+        from humanize import naturalsize
+
+        total = sum(asset.size for asset in self.assets)
+        tiers = {}
+        for asset in self.assets:
+            if asset.error is None:
+                tiers[asset.tier] = tiers.get(asset.tier, 0) + 1
+        tier_counts = ", ".join(
+            f"{tier}: {count}"
+            for tier, count in sorted(
+                tiers.items(),
+                key=lambda item: (
+                    downloader.IMG_SCALE.index(item[0])
+                    if item[0] in downloader.IMG_SCALE
+                    else -1
+                ),
+            )
+        )
+        polished = sum(asset.polished for asset in self.assets)
+        errors = sum(asset.error is not None for asset in self.assets)
+        return f">>> Plan - {len(self.assets)} Files with {naturalsize(total)}, Available sizes: {tier_counts}, Polished: {polished}, Errors: {errors}"
@@ -0,0 +1,170 @@
+# Copyright (C) 2025 Jérémy Rotzetter
+
+import math
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Iterator, Optional
+from urllib.parse import urlsplit
+import jsonstream
+import retry
+import transport
+
+PORTFOLIO_URL = "https://www.artstation.com/users/{username}/projects.json?page={page}"
+
+
+def parse_username(text: str) -> str:
+    """
+    Get the username of an artist from either the username itself or the URL
+    to the portfolio (artstation.com/username or username.artstation.com)
+
+    :param text: username or URL
+    """
+    text = text.strip()
+    if "artstation.com" not in text:
+        return text.strip("@/")
+    parts = urlsplit(text if "//" in text else f"https://{text}")
+    host = parts.hostname or ""
+    if host.endswith(".artstation.com") and host != "www.artstation.com":
+        return host.split(".", 1)[0]
+    return parts.path.strip("/").split("/", 1)[0]
+
+
+class Portfolio:
+    """
+    Enumerate the projects of an artist by paging through the project listing
+
+    The first page tells the number of projects and thereby of pages, the
+    remaining pages are then fetched concurrently. The hash IDs are yielded as
+    soon as the page they are on has arrived, so they can be fed into
+    batch.BatchDownloader.run() and the downloads begin before all pages are
+    fetched. If the listing does not tell the number of projects, pages are
+    fetched until one comes back short.
+
+    Further pages are only requested while the hash IDs are being taken, so
+    the enumeration does not run far ahead of a consumer that takes them as
+    slots to fetch projects become free.
+
+    :param username: username of the artist
+    :param max_workers: maximum number of pages fetched in parallel
+    :param retry_policy: policy for retrying the requests on transient errors
+    :param url_template: URL of a page of the listing with {username} and {page}
+    """
+
+    def __init__(
+        self,
+        username: str,
+        max_workers: int = 4,
+        retry_policy: Optional[retry.RetryPolicy] = None,
+        url_template: str = PORTFOLIO_URL,
+    ):
+        self.username = username
+        self.max_workers = max_workers
+        self.retry_policy = (
+            retry_policy if retry_policy is not None else retry.RetryPolicy()
+        )
+        self.url_template = url_template
+        self.total_count = None
+        self.PAGES = 0
+        self.PROJECTS = 0
+        # page number and error of the pages that could not be fetched
+        self.failed: dict[int, str] = {}
+        self._lock = threading.Lock()
+
+    def page_url(self, page: int) -> str:
+        """
+        Get the URL of a page of the listing
+
+        :param page: page number, starting at 1
+        """
+        return self.url_template.format(username=self.username, page=page)
+
+    def fetch_page(self, page: int) -> tuple[list[str], Optional[int]]:
+        """
+        Fetch a page of the listing, returns the hash IDs of the projects on
+        it and the total number of projects if the listing tells it
+
+        :param page: page number, starting at 1
+        """
+        scraper = transport.get().scraper()
+
+        def get():
+            response = scraper.get(
+                self.page_url(page), timeout=self.retry_policy.timeout
+            )
+            response.raise_for_status()
+            return response
+
+        response = self.retry_policy.call(get)
+        listing = {}
+        hash_ids = [
+            project["hash_id"]
+            for project in jsonstream.iter_projects(response.content, listing=listing)
+            if "hash_id" in project
+        ]
+        with self._lock:
+            self.PAGES += 1
+            self.PROJECTS += len(hash_ids)
+        return hash_ids, listing.get("total_count")
+
+    def hash_ids(self) -> Iterator[str]:
+        """
+        Fetch the pages of the listing and yield the hash IDs of the projects
+        as they arrive
+
+        Pages that can not be fetched are recorded in failed and skipped, if
+        it is the first one there are no further pages to go by.
+        """
+        try:
+            first, self.total_count = self.fetch_page(1)
+        except Exception as e:
+            self.failed[1] = str(e)
+            return
+        yield from first
+        per_page = len(first)
+        if per_page == 0:
+            return
+        last_page = None
+        if self.total_count is not None:
+            last_page = math.ceil(self.total_count / per_page)
+        next_page = 2
+        exhausted = False
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            running = {}
+            try:
+                while True:
+                    while (
+                        len(running) < self.max_workers
+                        and not exhausted
+                        and (last_page is None or next_page <= last_page)
+                    ):
+                        running[pool.submit(self.fetch_page, next_page)] = next_page
+                        next_page += 1
+                    if not running:
+                        return
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        page = running.pop(future)
+                        try:
+                            hash_ids, _ = future.result()
+                        except Exception as e:
+                            self.failed[page] = str(e)
+                            continue
+                        if len(hash_ids) < per_page:
+                            # the last page, unless the listing changed meanwhile
+                            exhausted = last_page is None
+                        yield from hash_ids
+            finally:
+                for future in running:
+                    future.cancel()
+
+    def summary(self) -> str:
+        """
+        Get the log line summarizing the enumeration of the portfolio
+        """
+        line = f'>>> Portfolio "{self.username}" - {self.PROJECTS} Projects on {self.PAGES} Pages'
+        if self.total_count is not None and not self.total_count == self.PROJECTS:
+            line += f" ({self.total_count} listed)"
+        if self.failed:
+            pages = ", ".join(str(page) for page in sorted(self.failed))
+            line += f", Failed pages: {pages}"
+        return line
@@ -0,0 +1,236 @@
+# Copyright (C) 2025 Jérémy Rotzetter
+
+import importlib
+import io
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Optional
+
+THUMBNAIL_DIR = ".thumbnails"
+THUMBNAIL_SIZE = 256
+
+
+def verify(path: str) -> str:
+    """
+    Decode the whole image, raises an exception if it is truncated or corrupt
+
+    :param path: path to the image file
+    """
+    from PIL import Image
+
+    with Image.open(path) as image:
+        image.load()
+        return f"decodes ({image.format})"
+
+
+def icc(path: str) -> str:
+    """
+    Report the embedded ICC color profile, raises ValueError if it can not be
+    read. Cloudflare's 'Polish' strips the metadata of the images it
+    optimizes, a missing profile hints at a polished image.
+
+    :param path: path to the image file
+    """
+    from PIL import Image, ImageCms
+
+    with Image.open(path) as image:
+        profile = image.info.get("icc_profile")
+    if not profile:
+        return "no ICC profile"
+    try:
+        description = ImageCms.getProfileDescription(
+            ImageCms.ImageCmsProfile(io.BytesIO(profile))
+        )
+    except (OSError, ImageCms.PyCMSError) as e:
+        raise ValueError(f"damaged ICC profile: {e}")
+    return f"ICC profile {description.strip()}"
+
+
+def thumbnail(path: str) -> str:
+    """
+    Save a PNG thumbnail of the image to the THUMBNAIL_DIR subdirectory of the
+    directory the image is in
+
+    :param path: path to the image file
+    """
+    import thumbnails
+
+    with open(path, "rb") as f:
+        data = thumbnails.make_thumbnail(f.read(), THUMBNAIL_SIZE)
+    if data is None:
+        raise ValueError("no thumbnail could be made")
+    directory = os.path.join(os.path.dirname(path), THUMBNAIL_DIR)
+    os.makedirs(directory, exist_ok=True)
+    name = f"{os.path.splitext(os.path.basename(path))[0]}.png"
+    with open(os.path.join(directory, name), "wb") as f:
+        f.write(data)
+    return "thumbnail"
+
+
+# Processors that can be referred to by name, any other function taking the
+# path to the image file can be given as "module:function"
+PROCESSORS: dict[str, Callable[[str], Optional[str]]] = {
+    "verify": verify,
+    "icc": icc,
+    "thumbnail": thumbnail,
+}
+# Optional package each processor needs, by the module it is imported as
+REQUIRED_PACKAGES: dict[str, tuple[str, str]] = {
+    "verify": ("PIL", "Pillow"),
+    "icc": ("PIL", "Pillow"),
+    # without Pillow PNG and GIF images could only be copied at full size
+    "thumbnail": ("PIL", "Pillow"),
+}
+
+
+def resolve(spec: str) -> Callable[[str], Optional[str]]:
+    """
+    Get a processor by its name or by "module:function", raises ValueError if
+    there is no such processor or the optional package it needs is missing
+
+    A processor is called with the path to a saved image in a worker process.
+    It returns a short note for the log line of the image (or None) and
+    raises an exception if the image fails the check.
+
+    :param spec: name of a processor in PROCESSORS or "module:function"
+    """
+    if spec in PROCESSORS:
+        if spec in REQUIRED_PACKAGES:
+            module_name, package = REQUIRED_PACKAGES[spec]
+            try:
+                importlib.import_module(module_name)
+            except ImportError:
+                raise ValueError(
+                    f'Post-processor "{spec}" needs the optional {package} package'
+                )
+        return PROCESSORS[spec]
+    module_name, _, function_name = spec.partition(":")
+    try:
+        processor = getattr(importlib.import_module(module_name), function_name)
+    except (ImportError, AttributeError, ValueError) as e:
+        raise ValueError(f'Unknown post-processor "{spec}": {e}')
+    if not callable(processor):
+        raise ValueError(f'Post-processor "{spec}" is not a function')
+    return processor
+
+
+def _process(path: str, specs: tuple[str, ...]) -> list[tuple[bool, str]]:
+    """
+    Run the processors on an image in a worker process, returns whether each
+    succeeded and its note
+
+    :param path: path to the image file
+    :param specs: processors, see resolve()
+    """
+    results = []
+    for spec in specs:
+        try:
+            note = resolve(spec)(path)
+        except Exception as e:
+            results.append((False, f"{spec} failed: {e}"))
+        else:
+            if note:
+                results.append((True, note))
+    return results
+
+
+class PostProcessor:
+    """
+    Run CPU bound work on the saved images, such as checking that they decode,
+    on a pool of processes while the downloads continue
+
+    At most max_pending images are queued or being processed at a time, a
+    download submitting another one waits until a slot becomes free. So the
+    processing can not fall further behind the downloads than that, and the
+    images are still in the page cache when they are read again.
+
+    The processes are started with "spawn" rather than forked from a process
+    running download threads.
+
+    :param specs: processors to run on each image in that order, see resolve()
+    :param max_workers: number of processes, by default the number of CPUs
+    :param max_pending: maximum number of images queued or being processed,
+        by default twice the number of processes
+    """
+
+    def __init__(
+        self,
+        specs: list[str],
+        max_workers: Optional[int] = None,
+        max_pending: Optional[int] = None,
+    ):
+        for spec in specs:
+            resolve(spec)  # fail before any download starts
+        self.specs = tuple(specs)
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_pending = max_pending or 2 * self.max_workers
+        self.PROCESSED = 0
+        self.FAILED = 0
+        self.WAITS = 0
+        self.WAIT_SECONDS = 0.0
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._lock = threading.Lock()
+        self._pool = ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+
+    def submit(self, path: str, log_line: str) -> Future:
+        """
+        Queue a saved image, returns a future of its log line with the notes
+        of the processors appended, waits while max_pending images are queued
+
+        :param path: path to the image file
+        :param log_line: log line of the download of the image
+        """
+        if not self._slots.acquire(blocking=False):
+            started = time.perf_counter()
+            self._slots.acquire()
+            with self._lock:
+                self.WAITS += 1
+                self.WAIT_SECONDS += time.perf_counter() - started
+        merged = Future()
+        try:
+            processing = self._pool.submit(_process, path, self.specs)
+        except BrokenProcessPool as e:
+            # Reported in the log line like a crash while processing
+            processing = Future()
+            processing.set_exception(e)
+        processing.add_done_callback(
+            lambda processing: self._merge(processing, log_line, merged)
+        )
+        return merged
+
+    def _merge(self, processing: Future, log_line: str, merged: Future):
+        self._slots.release()
+        try:
+            results = processing.result()
+        except Exception as e:
+            # e.g. a worker process crashed
+            results = [(False, f"post-processing failed: {e}")]
+        failed = not all(ok for ok, _ in results)
+        with self._lock:
+            self.PROCESSED += 1
+            self.FAILED += failed
+        if results:
+            log_line += " - " + ", ".join(note for _, note in results)
+        merged.set_result(log_line)
+
+    def close(self):
+        """
+        Wait for the queued images and stop the processes
+        """
+        self._pool.shutdown()
+
+    def summary(self) -> str:
+        """
+        Get the log line summarizing the post-processing
+        """
+        return (
+            f">>> Post-processing ({', '.join(self.specs)}) - {self.PROCESSED} Files, "
+            f"Failed: {self.FAILED}, Downloads waited: {self.WAITS} ({self.WAIT_SECONDS:.1f} s)"
+        )
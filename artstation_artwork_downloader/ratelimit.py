@@ -0,0 +1,161 @@
+# Copyright (C) 2025 Jérémy Rotzetter
+
+import email.utils
+import threading
+import time
+from typing import Optional
+import requests
+
+
+def retry_after(resp: requests.Response) -> Optional[float]:
+    """
+    Get the number of seconds to wait from the Retry-After header of a
+    response, which is either a number of seconds or an HTTP date, or None
+    if there is no valid header
+
+    :param resp: Server's response to HTTP request
+    """
+    value = resp.headers.get("Retry-After")
+    if value is None:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, date.timestamp() - time.time())
+
+
+class RateController:
+    """
+    Rate controller shared by all download workers
+
+    The number of concurrent requests follows an AIMD scheme: it is halved
+    whenever ArtStation answers with a 429 and raised by one again after
+    increase_every successful downloads. After a 429 no request is started
+    until the time from the Retry-After header (or an exponential backoff if
+    there is none) has passed. Optionally the request rate is capped with a
+    token bucket.
+
+    :param max_concurrency: maximum number of concurrent requests
+    :param rate: maximum number of requests per second, unlimited if None
+    :param increase_every: number of successful downloads after which one more
+        concurrent request is allowed
+    :param min_backoff: seconds to wait after a 429 without Retry-After header,
+        doubled for each consecutive 429
+    :param max_backoff: upper limit of the time to wait after a 429
+    :param max_retries: number of times a rate limited download is retried
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int,
+        rate: Optional[float] = None,
+        increase_every: int = 10,
+        min_backoff: float = 5,
+        max_backoff: float = 300,
+        max_retries: int = 5,
+    ):
+        self.max_concurrency = max_concurrency
+        self.limit = max_concurrency
+        self.rate = rate
+        self.increase_every = increase_every
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.max_retries = max_retries
+        self.THROTTLED = 0
+        self.WAITED = 0.0
+        self._active = 0
+        self._successes = 0
+        self._backoff = min_backoff
+        self._pause_until = 0.0
+        self._tokens = float(max_concurrency)
+        self._refilled = time.monotonic()
+        self._cond = threading.Condition()
+
+    def _take_token(self, now: float) -> float:
+        """
+        Take a token from the bucket, returns 0 on success or else the number
+        of seconds until the next token is available
+        """
+        if self.rate is None:
+            return 0
+        self._tokens = min(
+            float(self.max_concurrency),
+            self._tokens + (now - self._refilled) * self.rate,
+        )
+        self._refilled = now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return 0
+        return (1 - self._tokens) / self.rate
+
+    def acquire(self):
+        """
+        Wait until another request may be started
+        """
+        start = time.monotonic()
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                wait = self._pause_until - now
+                if wait <= 0:
+                    if self._active >= self.limit:
+                        wait = None  # until a running request is released
+                    else:
+                        wait = self._take_token(now)
+                        if wait == 0:
+                            break
+                self._cond.wait(wait)
+            self._active += 1
+            self.WAITED += time.monotonic() - start
+
+    def release(self):
+        """
+        Mark a request started with acquire() as finished
+        """
+        with self._cond:
+            self._active -= 1
+            self._cond.notify_all()
+
+    def succeeded(self):
+        """
+        Additive increase of the concurrency after successful downloads
+        """
+        with self._cond:
+            self._backoff = self.min_backoff
+            self._successes += 1
+            if self._successes >= self.increase_every:
+                self._successes = 0
+                if self.limit < self.max_concurrency:
+                    self.limit += 1
+                    self._cond.notify_all()
+
+    def throttled(self, delay: Optional[float] = None):
+        """
+        Multiplicative decrease of the concurrency and pause of all requests
+        after a 429
+
+        :param delay: seconds to wait as sent in the Retry-After header
+        """
+        with self._cond:
+            self.THROTTLED += 1
+            self._successes = 0
+            now = time.monotonic()
+            if now < self._pause_until:
+                # The other requests that were running when the first 429
+                # arrived belong to the same rate limit event
+                return
+            self.limit = max(1, self.limit // 2)
+            if delay is None:
+                delay = self._backoff
+                self._backoff = min(self._backoff * 2, self.max_backoff)
+            self._pause_until = now + min(delay, self.max_backoff)
+
+    def summary(self) -> str:
+        """
+        Get the log line summarizing the rate limiting of a run
+        """
+        return f">>> Rate limit - Throttled: {self.THROTTLED}, Time waited: {self.WAITED:.1f}s, Concurrency: {self.limit}/{self.max_concurrency}"
@@ -0,0 +1,148 @@
+# Copyright (C) 2025 Jérémy Rotzetter
+
+import random
+import threading
+import time
+from typing import Callable, TypeVar
+import requests
+
+T = TypeVar("T")
+
+# Server errors, including the ones Cloudflare sends when ArtStation's
+# servers can not be reached, that usually go away by themselves
+RETRY_STATUSES = (500, 502, 503, 504, 520, 521, 522, 523, 524)
+
+
+class RetryPolicy:
+    """
+    Policy for retrying requests that failed due to a transient error
+
+    Timeouts, connection errors (e.g. resets), bodies broken off mid-transfer
+    and the HTTP status codes in retry_statuses are retried with exponential
+    backoff. The delay before retry n is backoff * 2**n seconds, capped at
+    max_backoff and reduced by a random fraction of up to jitter so workers
+    that failed together do not retry in lockstep.
+
+    :param attempts: maximum number of attempts per request, including the first
+    :param backoff: delay before the first retry in seconds
+    :param max_backoff: upper limit of the delay between two attempts
+    :param jitter: fraction (0 to 1) by which a delay is randomly shortened
+    :param retry_statuses: HTTP status codes that are retried
+    :param connect_timeout: seconds to wait for a connection to be established
+    :param read_timeout: seconds to wait for the server to send data
+    """
+
+    def __init__(
+        self,
+        attempts: int = 3,
+        backoff: float = 1.0,
+        max_backoff: float = 30.0,
+        jitter: float = 0.5,
+        retry_statuses: tuple[int, ...] = RETRY_STATUSES,
+        connect_timeout: float = 5.0,
+        read_timeout: float = 15.0,
+    ):
+        self.attempts = attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.retry_statuses = retry_statuses
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        # number of retries per reason and requests that failed despite retries
+        self.RETRIES: dict[str, int] = {}
+        self.GAVE_UP = 0
+        self._lock = threading.Lock()
+
+    @property
+    def timeout(self) -> tuple[float, float]:
+        """
+        Connect and read timeout to pass to requests
+        """
+        return (self.connect_timeout, self.read_timeout)
+
+    @staticmethod
+    def reason(error: requests.RequestException) -> str:
+        """
+        Get a short description of why a request failed
+
+        :param error: exception raised by the request
+        """
+        if isinstance(error, requests.HTTPError) and error.response is not None:
+            return f"HTTP {error.response.status_code}"
+        return type(error).__name__
+
+    def is_retryable(self, error: requests.RequestException) -> bool:
+        """
+        Whether a request that failed with an exception may succeed if retried
+
+        :param error: exception raised by the request
+        """
+        if isinstance(error, requests.HTTPError):
+            return (
+                error.response is not None
+                and error.response.status_code in self.retry_statuses
+            )
+        return isinstance(
+            error,
+            (
+                requests.Timeout,
+                requests.ConnectionError,
+                requests.exceptions.ChunkedEncodingError,
+            ),
+        )
+
+    def should_retry(self, error: requests.RequestException, attempt: int) -> bool:
+        """
+        Whether a failed request is to be retried, records the retry or the
+        final failure in the statistics
+
+        :param error: exception raised by the request
+        :param attempt: number of retries of the request so far
+        """
+        if not self.is_retryable(error):
+            return False
+        with self._lock:
+            if attempt + 1 >= self.attempts:
+                self.GAVE_UP += 1
+                return False
+            reason = self.reason(error)
+            self.RETRIES[reason] = self.RETRIES.get(reason, 0) + 1
+        return True
+
+    def delay(self, attempt: int) -> float:
+        """
+        Get the number of seconds to wait before the next attempt
+
+        :param attempt: number of retries of the request so far
+        """
+        delay = min(self.max_backoff, self.backoff * 2**attempt)
+        return delay * (1 - self.jitter * random.random())
+
+    def call(self, func: Callable[..., T], *args, **kwargs) -> T:
+        """
+        Call a function sending a request and retry it according to the policy
+
+        :param func: function raising requests.RequestException on failure
+        """
+        attempt = 0
+        while True:
+            try:
+                return func(*args, **kwargs)
+            except requests.RequestException as e:
+                if not self.should_retry(e, attempt):
+                    raise
+            time.sleep(self.delay(attempt))
+            attempt += 1
+
+    def summary(self) -> str:
+        """
+        Get the log line summarizing the retries of a run
+        """
+        total = sum(self.RETRIES.values())
+        reasons = ", ".join(
+            f"{reason}: {count}" for reason, count in sorted(self.RETRIES.items())
+        )
+        if reasons:
+            reasons = f" ({reasons})"
+        return f">>> Retries - Total: {total}{reasons}, Gave up: {self.GAVE_UP}"
@@ -0,0 +1,145 @@
+# Copyright (C) 2025 Jérémy Rotzetter
+
+import collections
+import logging
+import logging.handlers
+import os
+import re
+import threading
+from typing import Iterator, Optional
+import cache
+
+MAX_LINES = 5000
+LOG_FILE_NAME = "downloads.log"
+MAX_FILE_BYTES = 1024 * 1024
+BACKUP_COUNT = 5
+# Each line of the log file starts with the time it was added
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+_TIME_PREFIX = re.compile(r"\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2} ")
+
+
+def default_log_dir() -> str:
+    """
+    Get the directory the log files are stored in
+    """
+    return os.path.join(cache.default_cache_dir(), "logs")
+
+
+class RunLog:
+    """
+    Log of the download results shown in the GUI
+
+    The most recent max_lines lines are kept in memory, older ones are dropped.
+    Every line is also written to a rotating log file, which keeps the full
+    log of past sessions within a bounded size and can be searched.
+
+    Lines may be added from any thread, the GUI takes the lines added since
+    its last update in one batch with drain().
+
+    :param log_dir: directory to store the log files in, None to not write any
+    :param max_lines: number of lines kept in memory
+    :param max_bytes: size at which the log file is rotated
+    :param backup_count: number of rotated log files kept
+    """
+
+    def __init__(
+        self,
+        log_dir: Optional[str] = None,
+        max_lines: int = MAX_LINES,
+        max_bytes: int = MAX_FILE_BYTES,
+        backup_count: int = BACKUP_COUNT,
+    ):
+        self.max_lines = max_lines
+        self.lines = collections.deque(maxlen=max_lines)
+        self._pending = collections.deque(maxlen=max_lines)
+        self._lock = threading.Lock()
+        self.log_path = None
+        self._logger = None
+        if log_dir is not None:
+            os.makedirs(log_dir, exist_ok=True)
+            self.log_path = os.path.join(log_dir, LOG_FILE_NAME)
+            handler = logging.handlers.RotatingFileHandler(
+                self.log_path,
+                maxBytes=max_bytes,
+                backupCount=backup_count,
+                encoding="utf-8",
+            )
+            handler.setFormatter(
+                logging.Formatter("%(asctime)s %(message)s", TIME_FORMAT)
+            )
+            # A logger of its own so the lines do not end up in the root logger
+            self._logger = logging.getLogger(f"{__name__}.{id(self)}")
+            self._logger.setLevel(logging.INFO)
+            self._logger.propagate = False
+            self._logger.addHandler(handler)
+
+    def append(self, line: str):
+        """
+        Add a line to the log
+
+        :param line: log line
+        """
+        with self._lock:
+            self.lines.append(line)
+            self._pending.append(line)
+        if self._logger is not None:
+            self._logger.info(line)
+
+    def drain(self) -> tuple[list[str], bool]:
+        """
+        Get the lines added since the last call and whether lines were dropped
+        in between because more than max_lines were added
+        """
+        with self._lock:
+            overflowed = len(self._pending) == self.max_lines
+            lines = list(self._pending)
+            self._pending.clear()
+        return lines, overflowed
+
+    def search(self, text: str, limit: Optional[int] = None) -> list[str]:
+        """
+        Get the most recent lines of the log file containing a text, ignoring
+        case, or of the lines in memory if there is no log file
+
+        The lines are returned as they were added, without the time the log
+        file prefixes them with, which is not searched either.
+
+        :param text: text to look for
+        :param limit: maximum number of lines returned, defaults to max_lines
+        """
+        text = text.lower()
+        matches = collections.deque(maxlen=limit or self.max_lines)
+        for line in self._file_lines() if self.log_path else list(self.lines):
+            if text in line.lower():
+                matches.append(line)
+        return list(matches)
+
+    def _file_lines(self) -> Iterator[str]:
+        """
+        Iterate over the lines of the rotated log files, oldest first, without
+        the time they were added
+        """
+        handler = self._logger.handlers[0]
+        paths = [
+            f"{self.log_path}.{index}" for index in range(handler.backupCount, 0, -1)
+        ] + [self.log_path]
+        with self._lock:
+            handler.flush()
+        for path in paths:
+            try:
+                with open(path, encoding="utf-8", errors="replace") as f:
+                    for line in f:
+                        line = line.rstrip("\n")
+                        prefix = _TIME_PREFIX.match(line)
+                        yield line[prefix.end() :] if prefix else line
+            except OSError:
+                continue
+
+    def close(self):
+        """
+        Close the log file
+        """
+        if self._logger is not None:
+            for handler in list(self._logger.handlers):
+                self._logger.removeHandler(handler)
+                handler.close()
@@ -0,0 +1,158 @@
+# Copyright (C) 2025 Jérémy Rotzetter
+
+import os
+import threading
+import time
+from typing import BinaryIO, Optional
+import requests
+from urllib3.exceptions import (
+    DecodeError,
+    ProtocolError,
+    ReadTimeoutError,
+    SSLError,
+)
+
+MIN_CHUNK_SIZE = 16 * 1024
+START_CHUNK_SIZE = 64 * 1024
+MAX_CHUNK_SIZE = 1024 * 1024
+# A read finishing faster than this is a sign the chunks can grow, a read
+# taking longer than SLOW_READ that they should shrink again so a slow
+# connection still reports progress regularly
+FAST_READ = 0.01
+SLOW_READ = 0.25
+
+_buffers = threading.local()
+
+
+def _buffer() -> memoryview:
+    """
+    Get the read buffer of the current thread, which is reused for all its
+    downloads instead of allocating a new bytes object for every chunk
+    """
+    view = getattr(_buffers, "view", None)
+    if view is None:
+        view = _buffers.view = memoryview(bytearray(MAX_CHUNK_SIZE))
+    return view
+
+
+def next_chunk_size(chunk_size: int, nbytes: int, seconds: float) -> int:
+    """
+    Adapt the chunk size to the observed throughput
+
+    :param chunk_size: size of the last read
+    :param nbytes: number of bytes actually read
+    :param seconds: time the read took
+    """
+    if nbytes == chunk_size and seconds < FAST_READ:
+        return min(chunk_size * 2, MAX_CHUNK_SIZE)
+    if seconds > SLOW_READ:
+        return max(chunk_size // 2, MIN_CHUNK_SIZE)
+    return chunk_size
+
+
+def preallocate(f: BinaryIO, size: int):
+    """
+    Reserve the disk space of a file before writing to it, which reduces
+    fragmentation and fails early if the disk is full
+
+    :param f: file opened for writing
+    :param size: final size of the file
+    """
+    if size <= 0:
+        return
+    f.flush()
+    preallocate_fd(f.fileno(), size)
+
+
+def preallocate_fd(fd: int, size: int):
+    """
+    Reserve the disk space of a file given by its file descriptor, see
+    preallocate()
+
+    :param fd: file descriptor opened for writing
+    :param size: final size of the file
+    """
+    if size <= 0:
+        return
+    if hasattr(os, "posix_fallocate"):
+        try:
+            os.posix_fallocate(fd, 0, size)
+            return
+        except OSError:
+            pass  # not supported by the file system
+    if os.fstat(fd).st_size < size:
+        os.ftruncate(fd, size)
+
+
+def copy_response(
+    resp: requests.Response,
+    f: BinaryIO,
+    digest=None,
+    expected: Optional[int] = None,
+    probe=None,
+    timing=None,
+) -> int:
+    """
+    Copy the body of a streamed response into a file, returns the number of
+    bytes written
+
+    The body is read directly into a reusable buffer and written from a
+    memoryview of it. If the expected size is known the file is preallocated
+    and truncated to the bytes actually written should the transfer break off.
+
+    :param resp: streamed response
+    :param f: file opened for writing at the position to write the body to
+    :param digest: optional hashlib object updated with the body
+    :param expected: size the file will have once the body is written
+    :param probe: optional imageinfo.HeaderProbe fed with the first chunks
+    :param timing: optional metrics.AssetTiming the time spent reading from the
+        connection and writing to the file is added to
+    """
+    raw = resp.raw
+    # Decode the body like iter_content would should the server compress it
+    raw.decode_content = True
+    view = _buffer()
+    chunk_size = START_CHUNK_SIZE
+    start = f.tell()
+    written = 0
+    read_seconds = write_seconds = 0.0
+    if expected is not None:
+        preallocate(f, expected)
+        f.seek(start)
+    try:
+        while True:
+            started = time.perf_counter()
+            try:
+                nbytes = raw.readinto(view[:chunk_size])
+            except ProtocolError as e:
+                raise requests.exceptions.ChunkedEncodingError(e)
+            except DecodeError as e:
+                raise requests.exceptions.ContentDecodingError(e)
+            except ReadTimeoutError as e:
+                raise requests.ConnectionError(e)
+            except SSLError as e:
+                raise requests.exceptions.SSLError(e)
+            if not nbytes:
+                break
+            chunk = view[:nbytes]
+            read_done = time.perf_counter()
+            f.write(chunk)
+            write_seconds += time.perf_counter() - read_done
+            read_seconds += read_done - started
+            if digest is not None:
+                digest.update(chunk)
+            if probe is not None and not probe.done:
+                probe.feed(chunk)
+            written += nbytes
+            chunk_size = next_chunk_size(
+                chunk_size, nbytes, time.perf_counter() - started
+            )
+    finally:
+        if timing is not None:
+            timing.read += read_seconds
+            timing.write += write_seconds
+        if expected is not None and not start + written == expected:
+            # Drop the preallocated space that was not written to, so the size
+            # of the file tells where to resume the download
+            f.truncate(start + written)
+    return written
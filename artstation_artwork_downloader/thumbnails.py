@@ -0,0 +1,287 @@
+# Copyright (C) 2025 Jérémy Rotzetter
+
+import collections
+import functools
+import hashlib
+import io
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+import requests
+import cache
+import downloader
+import transport
+
+THUMBNAIL_SIZE = 40
+THUMBNAIL_TIMEOUT = (5.0, 15.0)
+
+
+def default_thumbnail_dir() -> str:
+    """
+    Get the directory the thumbnails are cached in
+    """
+    return os.path.join(cache.default_cache_dir(), "thumbnails")
+
+
+@functools.lru_cache(maxsize=None)
+def has_pillow() -> bool:
+    """
+    Whether Pillow is installed, which is needed for JPEG and WebP thumbnails
+    """
+    try:
+        import PIL  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def can_show(url: str) -> bool:
+    """
+    Whether a thumbnail can be made of an image, judging by its URL
+
+    :param url: URL to image
+    """
+    if has_pillow():
+        return True
+    extn = os.path.splitext(url.split("?", 1)[0])[1].lower()
+    return extn in (".png", ".gif")
+
+
+def make_thumbnail(data: bytes, size: int = THUMBNAIL_SIZE) -> Optional[bytes]:
+    """
+    Scale an image down to a PNG thumbnail Tk can show, returns None if the
+    image can not be shown
+
+    Pillow is optional. Without it PNG and GIF images are returned as they are
+    (Tk can read them and scales them down when showing them), other formats
+    such as JPEG get no thumbnail.
+
+    :param data: content of the image file
+    :param size: maximum width and height of the thumbnail
+    """
+    if not has_pillow():
+        if data.startswith((b"\x89PNG\r\n\x1a\n", b"GIF87a", b"GIF89a")):
+            return data
+        return None
+    from PIL import Image
+
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            # draft() lets the JPEG decoder skip most of the pixels
+            image.draft("RGB", (size, size))
+            image.thumbnail((size, size))
+            out = io.BytesIO()
+            image.convert("RGBA").save(out, "PNG")
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return None
+    return out.getvalue()
+
+
+class ThumbnailCache:
+    """
+    Cache of thumbnails bounded in memory and on disk and shared by all projects
+
+    The max_items most recently used thumbnails are kept in memory, all of
+    them on disk until the files exceed max_bytes, then the least recently
+    used ones are evicted.
+
+    :param cache_dir: directory to store the thumbnails in, None to only keep
+        them in memory
+    :param max_items: number of thumbnails kept in memory
+    :param max_bytes: maximum total size of the thumbnails on disk
+    """
+
+    def __init__(
+        self,
+        cache_dir: Optional[str] = None,
+        max_items: int = 256,
+        max_bytes: int = 16 * 1024 * 1024,
+    ):
+        self.cache_dir = cache_dir
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self._memory: collections.OrderedDict[str, bytes] = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_bytes = None
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, url: str) -> str:
+        name = hashlib.sha1(url.encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, f"{name}.thumb")
+
+    def get(self, url: str) -> Optional[bytes]:
+        """
+        Get the thumbnail of an image or None if it is not cached
+
+        :param url: URL to image
+        """
+        with self._lock:
+            data = self._memory.get(url)
+            if data is not None:
+                self._memory.move_to_end(url)
+                return data
+        if self.cache_dir is None:
+            return None
+        path = self._path(url)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            # The modification time tracks the last use for the LRU eviction
+            os.utime(path)
+        except OSError:
+            return None
+        self._remember(url, data)
+        return data
+
+    def _remember(self, url: str, data: bytes):
+        with self._lock:
+            self._memory[url] = data
+            self._memory.move_to_end(url)
+            while len(self._memory) > self.max_items:
+                self._memory.popitem(last=False)
+
+    def put(self, url: str, data: bytes):
+        """
+        Store the thumbnail of an image
+
+        :param url: URL to image
+        :param data: thumbnail as returned by make_thumbnail()
+        """
+        self._remember(url, data)
+        if self.cache_dir is None:
+            return
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, self._path(url))
+        except OSError:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return
+        with self._lock:
+            if self._disk_bytes is not None:
+                self._disk_bytes += len(data)
+        self._evict()
+
+    def _evict(self):
+        """
+        Remove the least recently used thumbnails until the files fit into
+        max_bytes, the directory is only scanned once it might be too large
+        """
+        with self._lock:
+            if self._disk_bytes is not None and self._disk_bytes <= self.max_bytes:
+                return
+            entries = []
+            total = 0
+            with os.scandir(self.cache_dir) as it:
+                for dir_entry in it:
+                    if not dir_entry.name.endswith(".thumb"):
+                        continue
+                    try:
+                        stat = dir_entry.stat()
+                    except OSError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, dir_entry.path))
+                    total += stat.st_size
+            entries.sort()
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= size
+            self._disk_bytes = total
+
+
+class ThumbnailLoader:
+    """
+    Fetch the thumbnails of images concurrently off the GUI thread
+
+    The image, preferably in its 'small' size, is downloaded and scaled down.
+    Requests for a thumbnail that is already being fetched are merged,
+    failures are remembered so they are not retried for every scroll.
+
+    :param thumbnail_cache: cache to look up and store the thumbnails in
+    :param max_workers: maximum number of parallel requests
+    :param headers: HTTP headers to send with each request
+    """
+
+    def __init__(
+        self,
+        thumbnail_cache: ThumbnailCache,
+        max_workers: int = 4,
+        headers: dict[str, str] = downloader.HEADERS,
+    ):
+        self.cache = thumbnail_cache
+        self.headers = headers
+        self._pool = ThreadPoolExecutor(max_workers=max_workers)
+        self._lock = threading.Lock()
+        self._pending: dict[str, list[Callable[[str, Optional[bytes]], None]]] = {}
+        self._failed: set[str] = set()
+
+    def request(self, url: str, callback: Callable[[str, Optional[bytes]], None]):
+        """
+        Get the thumbnail of an image, the callback is called with the URL and
+        the thumbnail (None if there is none) from a worker thread
+
+        :param url: URL to the image in the size the thumbnail is made of,
+            preferably 'small'
+        :param callback: called once the thumbnail is available
+        """
+        if not can_show(url):
+            return
+        with self._lock:
+            if url in self._failed:
+                return
+            if url in self._pending:
+                self._pending[url].append(callback)
+                return
+            self._pending[url] = [callback]
+        self._pool.submit(self._load, url)
+
+    def _load(self, url: str):
+        data = self.cache.get(url)
+        if data is None:
+            try:
+                resp = (
+                    transport.get()
+                    .session()
+                    .get(
+                        url,
+                        headers=self.headers,
+                        timeout=THUMBNAIL_TIMEOUT,
+                    )
+                )
+                resp.raise_for_status()
+                data = make_thumbnail(resp.content)
+            except requests.RequestException:
+                data = None
+            if data is not None:
+                self.cache.put(url, data)
+        with self._lock:
+            callbacks = self._pending.pop(url, [])
+            if data is None:
+                self._failed.add(url)
+        for callback in callbacks:
+            callback(url, data)
+
+    def busy(self) -> bool:
+        """
+        Whether thumbnails are still being fetched
+        """
+        with self._lock:
+            return bool(self._pending)
+
+    def close(self):
+        """
+        Stop the workers, thumbnails not fetched yet are dropped
+        """
+        self._pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,147 @@
+# Copyright (C) 2025 Jérémy Rotzetter
+
+import threading
+from typing import Optional
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3 import HTTPConnectionPool, HTTPSConnectionPool
+import clearance
+
+
+class Transport:
+    """
+    Long-lived HTTP sessions shared by all requests of the process
+
+    Project JSON data is fetched with a cloudscraper session and images with a
+    plain requests session. Both are created once and kept alive, so their
+    TCP/TLS connections are reused across downloads, projects and runs. The
+    connection pool of the image session is sized to the number of download
+    workers.
+
+    The number of connections opened and requests served is counted to tell
+    how well connections are reused.
+
+    The Cloudflare clearance of the scraper is kept in clearance_store and
+    restored on the next run, replace it before the scraper is first used to
+    store it elsewhere.
+
+    :param pool_size: number of connections kept alive per host
+    """
+
+    def __init__(self, pool_size: int = 10):
+        self.pool_size = pool_size
+        self.clearance_store = clearance.ClearanceStore(
+            clearance.default_clearance_path()
+        )
+        self.CONNECTIONS = 0
+        self.REQUESTS = 0
+        self._lock = threading.Lock()
+        self._session = None
+        self._scraper = None
+
+    def count(self, counter: str):
+        """
+        Increment the CONNECTIONS or REQUESTS counter
+
+        :param counter: name of the counter attribute
+        """
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def _counting_pool(self, pool_class: type) -> type:
+        transport = self
+
+        class CountingPool(pool_class):
+            def _new_conn(self):
+                transport.count("CONNECTIONS")
+                return super()._new_conn()
+
+        return CountingPool
+
+    def _instrument(self, session: requests.Session):
+        """
+        Count the connections opened by the adapters of a session
+
+        :param session: session to instrument
+        """
+        for adapter in set(session.adapters.values()):
+            adapter.poolmanager.pool_classes_by_scheme = {
+                "http": self._counting_pool(HTTPConnectionPool),
+                "https": self._counting_pool(HTTPSConnectionPool),
+            }
+
+    def _count_requests(self, session: requests.Session):
+        """
+        Count the requests sent by a session
+
+        :param session: session to instrument
+        """
+        session.hooks["response"].append(
+            lambda resp, *args, **kwargs: self.count("REQUESTS")
+        )
+
+    def _mount(self, session: requests.Session):
+        """
+        Mount an adapter with a connection pool of pool_size on a session
+
+        An adapter mounted before is not closed, downloads of another run may
+        still be sending requests through it. Its connections are closed once
+        it is no longer used and garbage collected.
+
+        :param session: session to mount the adapter on
+        """
+        adapter = HTTPAdapter(pool_connections=10, pool_maxsize=self.pool_size)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        self._instrument(session)
+
+    def session(self, max_workers: Optional[int] = None) -> requests.Session:
+        """
+        Get the session to download images with
+
+        :param max_workers: number of download workers, the connection pool is
+            enlarged if it is too small to keep a connection alive for each
+        """
+        with self._lock:
+            if self._session is None:
+                self.pool_size = max(self.pool_size, max_workers or 0)
+                self._session = requests.Session()
+                self._mount(self._session)
+                self._count_requests(self._session)
+            elif max_workers is not None and max_workers > self.pool_size:
+                self.pool_size = max_workers
+                self._mount(self._session)
+            return self._session
+
+    def scraper(self) -> requests.Session:
+        """
+        Get the cloudscraper session to fetch project JSON data with
+        """
+        with self._lock:
+            if self._scraper is None:
+                # cloudscraper is slow to import and only needed when actually fetching
+                import cloudscraper
+
+                self._scraper = cloudscraper.create_scraper()
+                self.clearance_store.restore(self._scraper)
+                self.clearance_store.track(self._scraper)
+                self._instrument(self._scraper)
+                self._count_requests(self._scraper)
+            return self._scraper
+
+    def summary(self) -> str:
+        """
+        Get the log line summarizing the reuse of connections
+        """
+        per_connection = self.REQUESTS / self.CONNECTIONS if self.CONNECTIONS else 0
+        return f">>> Connections - Opened: {self.CONNECTIONS}, Requests: {self.REQUESTS} ({per_connection:.1f} per connection)"
+
+
+_transport = Transport()
+
+
+def get() -> Transport:
+    """
+    Get the transport shared by the whole process
+    """
+    return _transport
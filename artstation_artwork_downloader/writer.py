@@ -0,0 +1,400 @@
+# Copyright (C) 2025 Jérémy Rotzetter
+
+import itertools
+import mmap
+import os
+import queue
+import threading
+import time
+from typing import Optional
+import streaming
+
+MAX_BUFFER = 64 * 1024 * 1024
+# Size of the writes issued to the file system, the chunks read from the
+# connection are collected per file up to this size
+WRITE_SIZE = 1024 * 1024
+# Block size writes with direct I/O have to be aligned to
+ALIGNMENT = 4096
+
+_CLOSE = object()
+
+
+class QueuedFile:
+    """
+    File a download is written to by the writer threads of a DiskWriter,
+    has the methods of a file object copy_response() uses
+
+    Writing only queues a copy of the chunk. A failed write is raised by the
+    next call to write() and by close(), which returns once all chunks are on
+    disk.
+
+    :param writer: writer the file belongs to
+    :param lane: queue of the writer thread the file is written by
+    :param fd: file descriptor opened for writing at the position to start at
+    :param position: byte position to start writing at
+    :param expected: size the file will have once complete, if known
+    :param direct: whether the file descriptor was opened with O_DIRECT
+    """
+
+    def __init__(
+        self,
+        writer: "DiskWriter",
+        lane: queue.SimpleQueue,
+        fd: int,
+        position: int,
+        expected: Optional[int],
+        direct: bool,
+    ):
+        self.position = position
+        self.expected = expected
+        self.direct = direct
+        self.error: Optional[OSError] = None
+        self._writer = writer
+        self._lane = lane
+        self._fd = fd
+        self._closed = False
+        self._done = threading.Event()
+        # Chunks collected for the next write and the number of them still
+        # counted against the memory ceiling, only used by the writer thread
+        self._staged = mmap.mmap(-1, WRITE_SIZE) if direct else bytearray()
+        self._staged_size = 0
+        self._counted = 0
+
+    def tell(self) -> int:
+        return self.position
+
+    def write(self, chunk) -> int:
+        if self.error is not None:
+            raise self.error
+        data = bytes(chunk)
+        self._writer._put(self._lane, self, data)
+        self.position += len(data)
+        return len(data)
+
+    def close(self):
+        """
+        Wait until all chunks are written (and synced), raises OSError if a
+        write failed
+        """
+        if not self._closed:
+            self._closed = True
+            self._lane.put((self, _CLOSE))
+            self._done.wait()
+        if self.error is not None:
+            raise self.error
+
+    def __enter__(self) -> "QueuedFile":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            self.close()
+        except OSError:
+            if exc_type is None:
+                raise
+
+
+class DiskWriter:
+    """
+    Write the images to disk on dedicated threads, so a slow disk does not
+    hold up the connections and a slow connection does not leave the disk
+    idle
+
+    The downloads queue the chunks they read and continue reading while the
+    writer threads write them. All queued chunks together are kept below
+    max_buffer bytes however many downloads are in flight, a download that
+    would exceed it waits for the writers to catch up. Each file is written by
+    one writer thread in writes of up to WRITE_SIZE bytes.
+
+    With direct I/O (Linux only) the files are opened with O_DIRECT and
+    written in blocks aligned to ALIGNMENT bytes from a page aligned buffer,
+    bypassing the page cache; the unaligned end of each file is written
+    without it. Files that are resumed at an unaligned position or are on a
+    file system that does not support it are written through the page cache.
+    Up to ALIGNMENT bytes per open file may be held on top of max_buffer until
+    the next block or the end of the file arrives.
+
+    With fsync_batch set, finished files are synced to disk before close()
+    returns. A writer thread syncs the files finished since the last batch
+    once fsync_batch of them are waiting or its queue runs empty, instead of
+    stopping to sync after every file.
+
+    :param max_buffer: maximum number of bytes queued for all files together
+    :param threads: number of writer threads
+    :param direct: write the files with direct I/O where possible
+    :param fsync_batch: number of finished files synced together, 0 to not
+        sync them
+    """
+
+    def __init__(
+        self,
+        max_buffer: int = MAX_BUFFER,
+        threads: int = 1,
+        direct: bool = False,
+        fsync_batch: int = 0,
+    ):
+        self.max_buffer = max_buffer
+        self.direct = direct and hasattr(os, "O_DIRECT")
+        self.fsync_batch = fsync_batch
+        self.FILES = 0
+        self.BYTES = 0
+        self.WRITE_SECONDS = 0.0
+        self.SYNC_SECONDS = 0.0
+        self.STALLS = 0
+        self.STALL_SECONDS = 0.0
+        self.PEAK_BUFFERED = 0
+        self._buffered = 0
+        self._space = threading.Condition()
+        self._lanes = [queue.SimpleQueue() for _ in range(max(threads, 1))]
+        self._next_lane = itertools.cycle(self._lanes)
+        self._threads = [
+            threading.Thread(target=self._work, args=(lane,), daemon=True)
+            for lane in self._lanes
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def open(
+        self, path: str, offset: int = 0, expected: Optional[int] = None
+    ) -> QueuedFile:
+        """
+        Open a file to write a download to, raises OSError if it can not be
+        opened
+
+        :param path: path to the file
+        :param offset: byte position to start writing at, the file is
+            truncated if it is 0
+        :param expected: size the file will have once complete, the disk
+            space is then reserved and the rest truncated should fewer bytes
+            be written
+        """
+        flags = os.O_WRONLY | os.O_CREAT | getattr(os, "O_BINARY", 0)
+        if offset == 0:
+            flags |= os.O_TRUNC
+        fd = None
+        direct = self.direct and offset % ALIGNMENT == 0
+        if direct:
+            try:
+                fd = os.open(path, flags | os.O_DIRECT, 0o666)
+            except OSError:
+                direct = False  # not supported by the file system
+        if fd is None:
+            fd = os.open(path, flags, 0o666)
+        try:
+            if expected is not None:
+                streaming.preallocate_fd(fd, expected)
+            os.lseek(fd, offset, os.SEEK_SET)
+        except OSError:
+            os.close(fd)
+            raise
+        lane = next(self._next_lane)
+        return QueuedFile(self, lane, fd, offset, expected, direct)
+
+    def _put(self, lane: queue.SimpleQueue, file: QueuedFile, data: bytes):
+        """
+        Queue a chunk, waits while the buffer is full
+        """
+        with self._space:
+            # A chunk larger than the whole buffer is let through on its own
+            if self._buffered and self._buffered + len(data) > self.max_buffer:
+                self.STALLS += 1
+                started = time.perf_counter()
+                while self._buffered and self._buffered + len(data) > self.max_buffer:
+                    self._space.wait()
+                self.STALL_SECONDS += time.perf_counter() - started
+            self._buffered += len(data)
+            self.PEAK_BUFFERED = max(self.PEAK_BUFFERED, self._buffered)
+        lane.put((file, data))
+
+    def _release(self, nbytes: int):
+        """
+        Free space in the buffer
+
+        :param nbytes: number of bytes written or dropped
+        """
+        if nbytes:
+            with self._space:
+                self._buffered -= nbytes
+                self._space.notify_all()
+
+    def _work(self, lane: queue.SimpleQueue):
+        # Files with chunks collected but not written yet and finished files
+        # waiting to be synced
+        staged: set[QueuedFile] = set()
+        unsynced: list[QueuedFile] = []
+        while True:
+            if lane.empty():
+                # Nothing else to do, write what was collected so no download
+                # waits for space held by a partly filled write
+                for file in staged:
+                    self._flush(file, final=False)
+                staged.clear()
+                self._sync(unsynced)
+            item = lane.get()
+            if item is None:
+                self._sync(unsynced)
+                return
+            file, data = item
+            if data is _CLOSE:
+                staged.discard(file)
+                self._finish(file, unsynced)
+                if len(unsynced) >= self.fsync_batch:
+                    self._sync(unsynced)
+                continue
+            if file.error is not None:
+                self._release(len(data))  # the download is failing already
+                continue
+            self._stage(file, data)
+            if file._staged_size:
+                staged.add(file)
+            else:
+                staged.discard(file)
+
+    def _stage(self, file: QueuedFile, data: bytes):
+        """
+        Collect a chunk, writing whenever a full write was collected
+        """
+        file._counted += len(data)
+        view = memoryview(data)
+        while view:
+            take = min(len(view), WRITE_SIZE - file._staged_size)
+            if file.direct:
+                file._staged[file._staged_size : file._staged_size + take] = view[:take]
+            else:
+                file._staged += view[:take]
+            file._staged_size += take
+            view = view[take:]
+            if file._staged_size == WRITE_SIZE:
+                self._flush(file, final=False)
+                if file.error is not None:
+                    file._counted -= len(view)
+                    self._release(len(view))
+                    return
+
+    def _flush(self, file: QueuedFile, final: bool):
+        """
+        Write the collected chunks of a file, with direct I/O only the aligned
+        part unless it is the end of the file
+
+        :param file: file to write
+        :param final: whether no more chunks follow
+        """
+        size = file._staged_size
+        if file.direct and not final:
+            size -= size % ALIGNMENT
+        started = time.perf_counter()
+        try:
+            if file.direct and final and size % ALIGNMENT:
+                # The unaligned end is written through the page cache
+                aligned = size - size % ALIGNMENT
+                self._write(file, aligned)
+                self._disable_direct(file)
+                self._write(file, size - aligned, aligned)
+            else:
+                self._write(file, size)
+        except OSError as e:
+            file.error = e
+            size = file._staged_size
+        with self._space:
+            self.WRITE_SECONDS += time.perf_counter() - started
+        rest = file._staged_size - size
+        if file.direct:
+            if rest:
+                file._staged[:rest] = file._staged[size : file._staged_size]
+        else:
+            del file._staged[:size]
+        file._staged_size = rest
+        # The unaligned rest of a direct write is no longer counted, so the
+        # writes of other files are not held up by it
+        released = file._counted if not final and file.direct else size
+        released = min(released, file._counted)
+        file._counted -= released
+        self._release(released)
+
+    def _write(self, file: QueuedFile, size: int, start: int = 0):
+        view = memoryview(file._staged)[start : start + size]
+        try:
+            while view:
+                written = os.write(file._fd, view)
+                view = view[written:]
+                with self._space:
+                    self.BYTES += written
+        finally:
+            view.release()
+
+    def _disable_direct(self, file: QueuedFile):
+        import fcntl
+
+        flags = fcntl.fcntl(file._fd, fcntl.F_GETFL)
+        fcntl.fcntl(file._fd, fcntl.F_SETFL, flags & ~os.O_DIRECT)
+
+    def _finish(self, file: QueuedFile, unsynced: list[QueuedFile]):
+        """
+        Write the rest of a file and close it, or leave it to be synced
+        """
+        if file.error is None and file._staged_size:
+            self._flush(file, final=True)
+        self._release(file._counted)
+        file._counted = 0
+        if file.error is None and file.expected is not None:
+            if not file.position == file.expected:
+                try:
+                    os.ftruncate(file._fd, file.position)
+                except OSError as e:
+                    file.error = e
+        with self._space:
+            self.FILES += 1
+        if self.fsync_batch and file.error is None:
+            unsynced.append(file)
+        else:
+            self._close(file)
+
+    def _sync(self, unsynced: list[QueuedFile]):
+        started = time.perf_counter()
+        for file in unsynced:
+            try:
+                os.fsync(file._fd)
+            except OSError as e:
+                file.error = e
+            self._close(file)
+        if unsynced:
+            with self._space:
+                self.SYNC_SECONDS += time.perf_counter() - started
+        unsynced.clear()
+
+    def _close(self, file: QueuedFile):
+        try:
+            os.close(file._fd)
+        except OSError as e:
+            if file.error is None:
+                file.error = e
+        if file.direct:
+            file._staged.close()
+        file._done.set()
+
+    def close(self):
+        """
+        Stop the writer threads once the files queued so far are written
+        """
+        for lane in self._lanes:
+            lane.put(None)
+        for thread in self._threads:
+            thread.join()
+
+    def summary(self) -> str:
+        """
+        Get the log line summarizing the writes
+        """
+        from humanize import naturalsize
+
+        line = (
+            f">>> Writer - {self.FILES} Files, {naturalsize(self.BYTES)} written "
+            f"in {self.WRITE_SECONDS:.1f} s"
+        )
+        if self.fsync_batch:
+            line += f" (synced in {self.SYNC_SECONDS:.1f} s)"
+        line += (
+            f", Peak buffer: {naturalsize(self.PEAK_BUFFERED)} of {naturalsize(self.max_buffer)}, "
+            f"Waits for the disk: {self.STALLS} ({self.STALL_SECONDS:.1f} s)"
+        )
+        return line
@@ -0,0 +1,44 @@
+# Copyright (C) 2025 Jérémy Rotzetter
+
+import os
+import sys
+import threading
+import pytest
+from standin import StandIn
+
+# The modules of the downloader import each other as top level modules
+sys.path.insert(
+    0,
+    os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        "artstation_artwork_downloader",
+    ),
+)
+
+
+@pytest.fixture(autouse=True)
+def isolated_transport(monkeypatch, tmp_path_factory):
+    """
+    Give each test fresh HTTP sessions and keep the cached data it stores out
+    of the cache directory of the user
+    """
+    import clearance
+    import transport
+
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path_factory.mktemp("cache")))
+    fresh = transport.Transport()
+    fresh.clearance_store = clearance.ClearanceStore(None)
+    monkeypatch.setattr(transport, "_transport", fresh)
+
+
+@pytest.fixture
+def server():
+    """
+    Local stand-in server, shut down after the test
+    """
+    stand_in = StandIn()
+    thread = threading.Thread(target=stand_in.serve_forever, daemon=True)
+    thread.start()
+    yield stand_in
+    stand_in.shutdown()
+    stand_in.server_close()
@@ -0,0 +1,112 @@
+# Copyright (C) 2025 Jérémy Rotzetter
+
+import http.server
+import struct
+import sys
+import threading
+import zlib
+from typing import Callable, Optional
+
+
+class StandIn(http.server.ThreadingHTTPServer):
+    """
+    Local stand-in for the ArtStation servers, the tests add a route for each
+    path they serve
+
+    A route is called with the request handler and replies with
+    handler.reply(). The query string is not part of the path a route is
+    looked up by, the requests received are kept in requests.
+    """
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), StandInHandler)
+        self.routes: dict[str, Callable[["StandInHandler"], None]] = {}
+        self.requests: list[tuple[str, str, dict[str, str]]] = []
+        self.lock = threading.Lock()
+
+    def url(self, path: str) -> str:
+        return f"http://127.0.0.1:{self.server_port}{path}"
+
+    def route(self, path: str, route: Callable[["StandInHandler"], None]):
+        self.routes[path] = route
+
+    def requests_to(self, path: str) -> list[tuple[str, str, dict[str, str]]]:
+        """
+        Get the requests received for a path
+
+        :param path: path without query string
+        """
+        with self.lock:
+            return [r for r in self.requests if r[1].split("?", 1)[0] == path]
+
+    def handle_error(self, request, client_address):
+        """
+        Ignore connections closed by the client, e.g. a download that timed
+        out or was cancelled, instead of printing their traceback
+        """
+        if isinstance(sys.exc_info()[1], (ConnectionResetError, BrokenPipeError)):
+            return
+        super().handle_error(request, client_address)
+
+
+class StandInHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _handle(self):
+        path = self.path.split("?", 1)[0]
+        with self.server.lock:
+            self.server.requests.append((self.command, self.path, dict(self.headers)))
+        route = self.server.routes.get(path)
+        if route is None:
+            self.reply(404)
+        else:
+            route(self)
+
+    do_GET = _handle
+    do_HEAD = _handle
+
+    def reply(
+        self,
+        status: int = 200,
+        body: bytes = b"",
+        headers: Optional[dict[str, str]] = None,
+    ):
+        """
+        Send a complete response
+
+        :param status: HTTP status code
+        :param body: body of the response, not sent for HEAD requests
+        :param headers: headers to send besides Content-Length
+        """
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if not self.command == "HEAD":
+            self.wfile.write(body)
+
+
+def png(width: int = 4, height: int = 3, body: bytes = b"") -> bytes:
+    """
+    Get a PNG signature and header chunk, which is all imageinfo reads,
+    followed by a body telling the images of a test apart
+
+    :param width: width in pixels
+    :param height: height in pixels
+    :param body: bytes appended to the header
+    """
+    ihdr = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    chunk = b"IHDR" + ihdr
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + struct.pack(">I", len(ihdr))
+        + chunk
+        + struct.pack(">I", zlib.crc32(chunk))
+        + body
+    )
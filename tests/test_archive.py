@@ -0,0 +1,220 @@
+# Copyright (C) 2025 Jérémy Rotzetter
+
+import hashlib
+import json
+import tarfile
+import threading
+import warnings
+import zipfile
+import pytest
+import archive
+import downloader
+from standin import png
+
+URL = "https://cdna.artstation.com/p/assets/images/images/000/000/001/large/a.png?1"
+
+
+def members(path: str) -> dict[str, bytes]:
+    """
+    Read the members of an archive, the last one of each name
+    """
+    if path.endswith(".zip"):
+        with zipfile.ZipFile(path) as zf:
+            return {name: zf.read(name) for name in zf.namelist()}
+    with tarfile.open(path) as tf:
+        return {info.name: tf.extractfile(info).read() for info in tf if info.isfile()}
+
+
+def add(project_archive: archive.ProjectArchive, name: str, data: bytes):
+    with project_archive.open_member(name) as member:
+        member.write(data)
+        member.commit(URL, hashlib.sha256(data).hexdigest())
+
+
+def read_index(path: str) -> dict:
+    with open(f"{path}{archive.INDEX_SUFFIX}", encoding="utf-8") as f:
+        return json.load(f)
+
+
+@pytest.mark.parametrize("archive_format", archive.ARCHIVE_FORMATS)
+def test_downloads_are_streamed_into_the_archive(server, tmp_path, archive_format):
+    images = {f"image{n}": png(body=bytes([n]) * 300_000) for n in range(5)}
+    for name, data in images.items():
+        server.route(
+            f"/images/{name}/large/{name}.png",
+            lambda handler, data=data: handler.reply(
+                200, data, {"Content-Type": "image/png"}
+            ),
+        )
+    path = archive.archive_path(str(tmp_path), "hash", archive_format)
+    project_archive = archive.ProjectArchive(path)
+    image_downloader = downloader.Downloader(
+        str(tmp_path), max_workers=3, project_archive=project_archive
+    )
+    jobs = [(server.url(f"/images/{name}/large/{name}.png?1"), name) for name in images]
+
+    list(image_downloader.run(jobs))
+
+    assert image_downloader.SAVED == 5
+    assert members(path) == {f"{name}.png": data for name, data in images.items()}
+    # the offsets in the index point at the data of each member
+    with open(path, "rb") as f:
+        content = f.read()
+    for entry in read_index(path)["members"]:
+        data = content[entry["offset"] : entry["offset"] + entry["size"]]
+        assert hashlib.sha256(data).hexdigest() == entry["sha256"]
+    assert sorted(tmp_path.iterdir()) == sorted(
+        [
+            tmp_path / f"hash.{archive_format}",
+            tmp_path / f"hash.{archive_format}.index.json",
+        ]
+    )
+
+
+@pytest.mark.parametrize("archive_format", archive.ARCHIVE_FORMATS)
+def test_members_written_concurrently_are_held_in_memory(tmp_path, archive_format):
+    path = str(tmp_path / f"a.{archive_format}")
+    project_archive = archive.ProjectArchive(path)
+
+    with project_archive.open_member("first.png") as first:
+        first.write(b"first-")
+        # the archive is held by the first member
+        with project_archive.open_member("second.png") as second:
+            second.write(b"second")
+            first.commit(URL, "1")
+            second.commit(URL, "2")
+    project_archive.close()
+
+    assert members(path) == {"first.png": b"first-", "second.png": b"second"}
+    assert sorted(p.name for p in tmp_path.iterdir()) == [
+        f"a.{archive_format}",
+        f"a.{archive_format}.index.json",
+    ]
+
+
+@pytest.mark.parametrize("archive_format", archive.ARCHIVE_FORMATS)
+def test_large_member_waits_for_the_archive_and_streams(
+    monkeypatch, tmp_path, archive_format
+):
+    monkeypatch.setattr(archive, "SPOOL_SIZE", 10)
+    path = str(tmp_path / f"a.{archive_format}")
+    project_archive = archive.ProjectArchive(path)
+    first = project_archive.open_member("first.png")
+    first.write(b"first")
+    second_written = threading.Event()
+
+    def write_second():
+        with project_archive.open_member("second.png") as second:
+            for _ in range(4):
+                second.write(b"0123456789")
+            second_written.set()
+            second.commit(URL, "2")
+
+    thread = threading.Thread(target=write_second)
+    thread.start()
+    # the second member went beyond SPOOL_SIZE and waits for the first
+    assert not second_written.wait(0.3)
+    first.commit(URL, "1")
+    thread.join(10)
+    project_archive.close()
+
+    assert second_written.is_set()
+    assert members(path) == {"first.png": b"first", "second.png": b"0123456789" * 4}
+
+
+@pytest.mark.parametrize("archive_format", archive.ARCHIVE_FORMATS)
+def test_failed_member_is_dropped(tmp_path, archive_format):
+    path = str(tmp_path / f"a.{archive_format}")
+    project_archive = archive.ProjectArchive(path)
+    add(project_archive, "kept.png", b"kept")
+
+    with pytest.raises(ConnectionError):
+        with project_archive.open_member("broken.png") as member:
+            member.write(b"part")
+            raise ConnectionError("transfer broke off")
+    add(project_archive, "after.png", b"after")
+    project_archive.close()
+
+    assert members(path) == {"kept.png": b"kept", "after.png": b"after"}
+    assert [entry["name"] for entry in read_index(path)["members"]] == [
+        "kept.png",
+        "after.png",
+    ]
+
+
+def test_tar_member_of_any_size_gets_its_size_in_the_header(tmp_path):
+    path = str(tmp_path / "a.tar")
+    project_archive = archive.ProjectArchive(path)
+    sizes = [0, 1, tarfile.BLOCKSIZE, 3 * tarfile.BLOCKSIZE + 7]
+    for size in sizes:
+        add(project_archive, f"{size}.png", b"x" * size)
+    project_archive.close()
+
+    assert members(path) == {f"{size}.png": b"x" * size for size in sizes}
+
+
+def test_replaced_zip_member_leaves_no_duplicate_entry(tmp_path):
+    path = str(tmp_path / "a.zip")
+    project_archive = archive.ProjectArchive(path)
+    add(project_archive, "a.png", b"old")
+    add(project_archive, "b.png", b"b")
+    project_archive.close()
+
+    # appended to in a later run
+    project_archive = archive.ProjectArchive(path)
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        add(project_archive, "a.png", b"newer")
+    project_archive.close()
+
+    with zipfile.ZipFile(path) as zf:
+        assert sorted(zf.namelist()) == ["a.png", "b.png"]
+        assert zf.read("a.png") == b"newer"
+    with open(path, "rb") as f:
+        content = f.read()
+    for entry in read_index(path)["members"]:
+        name_data = members(path)[entry["name"]]
+        assert content[entry["offset"] : entry["offset"] + entry["size"]] == name_data
+    assert len(archive.ProjectArchive(path)) == 2
+
+
+def download_version(server, tmp_path, version: int, data: bytes):
+    path = "/images/000/000/001/large/image.png"
+    server.route(
+        path, lambda handler: handler.reply(200, data, {"Content-Type": "image/png"})
+    )
+    project_archive = archive.ProjectArchive(str(tmp_path / "hash.zip"))
+    image_downloader = downloader.Downloader(
+        str(tmp_path), project_archive=project_archive
+    )
+    lines = list(image_downloader.run([(server.url(f"{path}?{version}"), "image")]))
+    image_downloader.close()
+    return image_downloader, lines
+
+
+def test_changed_image_replaces_its_member(server, tmp_path):
+    old, new = png(body=b"old" * 100), png(body=b"new" * 200)
+    download_version(server, tmp_path, 1, old)
+
+    image_downloader, lines = download_version(server, tmp_path, 2, new)
+
+    assert image_downloader.SAVED == 1, lines
+    with zipfile.ZipFile(tmp_path / "hash.zip") as zf:
+        assert zf.namelist() == ["image.png"]
+        assert zf.read("image.png") == new
+
+    # unchanged since, skipped without a request
+    image_downloader, lines = download_version(server, tmp_path, 2, new)
+    assert image_downloader.UNCHANGED == 1
+
+
+def test_member_of_another_image_is_not_replaced(server, tmp_path):
+    project_archive = archive.ProjectArchive(str(tmp_path / "hash.zip"))
+    add(project_archive, "image.png", b"other")
+    project_archive.close()
+
+    image_downloader, lines = download_version(server, tmp_path, 1, png())
+
+    assert image_downloader.SKIPS == 1
+    with zipfile.ZipFile(tmp_path / "hash.zip") as zf:
+        assert zf.read("image.png") == b"other"
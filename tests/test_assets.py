@@ -0,0 +1,68 @@
+# Copyright (C) 2025 Jérémy Rotzetter
+
+import assets
+import downloader
+
+URL = "https://cdna.artstation.com/p/assets/images/images/012/345/678/large/artist-title.jpg?1580000000"
+PROJECT = {
+    "hash_id": "abc123",
+    "assets": [
+        {"id": 1, "position": 0, "asset_type": "cover", "image_url": URL},
+        {
+            "id": 2,
+            "position": 1,
+            "asset_type": "image",
+            "width": 3840,
+            "height": 2160,
+            "image_url": URL,
+        },
+        {"id": 3, "position": 2, "asset_type": "video", "image_url": URL},
+        {
+            "id": 4,
+            "asset_type": "image",
+            "image_url": URL.replace("artist-title", "second"),
+        },
+    ],
+}
+
+
+def test_only_image_assets_are_kept():
+    image_assets = assets.image_assets(PROJECT)
+
+    assert [asset.asset_id for asset in image_assets] == [2, 4]
+    assert (image_assets[0].width, image_assets[0].height) == (3840, 2160)
+    # The index in the project is used if there is no position
+    assert image_assets[1].position == 3
+
+
+def test_url_of_each_size_replaces_the_size_segment():
+    asset = assets.image_assets(PROJECT)[0]
+
+    assert asset.image_url == URL
+    for size in downloader.IMG_SCALE:
+        assert asset.url(size) == URL.replace("/large/", f"/{size}/")
+
+
+def test_url_without_size_segment_is_the_same_for_every_size():
+    asset = assets.Asset(1, 0, "image", None, None, "https://example.com/image.jpg")
+
+    assert asset.url("4k") == asset.image_url == "https://example.com/image.jpg"
+
+
+def test_assets_have_no_instance_dict():
+    asset = assets.image_assets(PROJECT)[0]
+
+    assert not hasattr(asset, "__dict__")
+
+
+def test_jobs_are_built_from_assets():
+    image_assets = assets.image_assets(PROJECT)
+
+    assert downloader.build_jobs(image_assets, "4k") == [
+        (URL.replace("/large/", "/4k/"), "artist-title"),
+        (URL.replace("/large/", "/4k/").replace("artist-title", "second"), "second"),
+    ]
+    assert [name for _, name in downloader.build_jobs(image_assets, "4k", "art")] == [
+        "art1",
+        "art2",
+    ]
@@ -0,0 +1,157 @@
+# Copyright (C) 2025 Jérémy Rotzetter
+
+import itertools
+import json
+import time
+import cloudscraper
+import pytest
+import clearance
+import transport
+
+PATH = "/projects/hash.json"
+
+
+class Challenged:
+    """
+    Route serving the JSON data of a project only to requests carrying a
+    valid clearance cookie, other requests are challenged. Solving the
+    challenge on SOLVE_PATH hands out a new cookie.
+    """
+
+    SOLVE_PATH = "/solve"
+
+    def __init__(self):
+        self.valid: set[str] = set()
+        self._tokens = itertools.count(1)
+
+    def __call__(self, handler):
+        cookies = dict(
+            cookie.strip().split("=", 1)
+            for cookie in handler.headers.get("Cookie", "").split(";")
+            if "=" in cookie
+        )
+        if cookies.get("cf_clearance") in self.valid:
+            return handler.reply(
+                200, b'{"hash_id": "hash"}', {"Content-Type": "application/json"}
+            )
+        handler.reply(503, b"challenge", {"X-Challenge": "1"})
+
+    def solve(self, handler):
+        token = f"token{next(self._tokens)}"
+        self.valid.add(token)
+        expires = time.strftime(
+            "%a, %d %b %Y %H:%M:%S GMT", time.gmtime(time.time() + 3600)
+        )
+        handler.reply(
+            200,
+            headers={"Set-Cookie": f"cf_clearance={token}; Expires={expires}; Path=/"},
+        )
+
+
+@pytest.fixture
+def challenged(server, monkeypatch):
+    """
+    Stand-in Cloudflare challenge, solved by a request to its SOLVE_PATH
+    """
+    route = Challenged()
+    server.route(PATH, route)
+    server.route(Challenged.SOLVE_PATH, route.solve)
+
+    def is_challenge(cloudflare, response):
+        return response.headers.get("X-Challenge") == "1"
+
+    def solve(cloudflare, response, **kwargs):
+        scraper = cloudflare.cloudscraper
+        scraper.get(server.url(Challenged.SOLVE_PATH))
+        return scraper.request(response.request.method, response.url)
+
+    monkeypatch.setattr(cloudscraper.Cloudflare, "is_Challenge_Request", is_challenge)
+    monkeypatch.setattr(cloudscraper.Cloudflare, "Challenge_Response", solve)
+    return route
+
+
+def new_run(path) -> transport.Transport:
+    """
+    Get the transport of a new run storing the session at path
+    """
+    run = transport.Transport()
+    run.clearance_store = clearance.ClearanceStore(str(path))
+    return run
+
+
+def fetch(run: transport.Transport, server) -> int:
+    return run.scraper().get(server.url(PATH)).status_code
+
+
+def test_solved_session_is_reused_by_the_next_run(server, challenged, tmp_path):
+    path = tmp_path / clearance.FILE_NAME
+    first = new_run(path)
+    assert fetch(first, server) == 200
+    assert first.clearance_store.CHALLENGES == 1
+    user_agent = first.scraper().headers["User-Agent"]
+
+    second = new_run(path)
+    assert fetch(second, server) == 200
+
+    assert second.clearance_store.RESTORED == 1
+    assert second.clearance_store.CHALLENGES == 0
+    # the clearance is only valid together with the user agent that solved it
+    assert second.scraper().headers["User-Agent"] == user_agent
+    assert len(server.requests_to(Challenged.SOLVE_PATH)) == 1
+
+
+def test_session_is_reused_until_it_is_challenged(server, challenged, tmp_path):
+    path = tmp_path / clearance.FILE_NAME
+    fetch(new_run(path), server)
+    # the clearance is revoked, the restored session is challenged again
+    challenged.valid.clear()
+
+    second = new_run(path)
+    assert fetch(second, server) == 200
+    assert second.clearance_store.RESTORED == 1
+    assert second.clearance_store.CHALLENGES == 1
+
+    # the session stored is replaced by the one solved last
+    with open(path, encoding="utf-8") as f:
+        cookies = json.load(f)["cookies"]
+    assert [(c["name"], c["value"]) for c in cookies] == [("cf_clearance", "token2")]
+    third = new_run(path)
+    assert fetch(third, server) == 200
+    assert third.clearance_store.CHALLENGES == 0
+    assert len(server.requests_to(Challenged.SOLVE_PATH)) == 2
+
+
+def test_expired_session_is_not_restored(server, challenged, tmp_path):
+    path = tmp_path / clearance.FILE_NAME
+    fetch(new_run(path), server)
+    with open(path, encoding="utf-8") as f:
+        session = json.load(f)
+    for cookie in session["cookies"]:
+        cookie["expires"] = int(time.time()) - 1
+    session["headers"]["User-Agent"] = "expired"
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(session, f)
+
+    second = new_run(path)
+    assert fetch(second, server) == 200
+
+    assert second.clearance_store.RESTORED == 0
+    assert second.clearance_store.CHALLENGES == 1
+    # the user agent of the expired session is not sent either
+    assert not second.scraper().headers["User-Agent"] == "expired"
+
+
+def test_session_cookies_without_expiry_are_not_stored(tmp_path):
+    path = tmp_path / clearance.FILE_NAME
+    scraper = cloudscraper.create_scraper()
+    scraper.cookies.set("session", "1", domain="127.0.0.1", path="/")
+    scraper.cookies.set(
+        "cf_clearance", "2", domain="127.0.0.1", path="/", expires=time.time() + 60
+    )
+
+    clearance.ClearanceStore(str(path)).save(scraper)
+
+    with open(path, encoding="utf-8") as f:
+        cookies = json.load(f)["cookies"]
+    assert [c["name"] for c in cookies] == ["cf_clearance"]
+    assert [p.name for p in tmp_path.iterdir()] == [clearance.FILE_NAME]
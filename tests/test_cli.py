@@ -0,0 +1,39 @@
+# Copyright (C) 2025 Jérémy Rotzetter
+
+import pytest
+import cli
+
+COUNT_OPTIONS = [
+    "--jobs",
+    "--project-jobs",
+    "--writer-threads",
+    "--retries",
+    "--post-workers",
+    "--post-queue",
+]
+
+
+@pytest.mark.parametrize("option", COUNT_OPTIONS)
+@pytest.mark.parametrize("value", ["0", "-1", "two"])
+def test_count_below_one_is_a_usage_error(capsys, option, value):
+    with pytest.raises(SystemExit) as exit_info:
+        cli.parse_args([option, value, "hashid"])
+
+    assert exit_info.value.code == 2
+    assert f"{option}: " in capsys.readouterr().err
+
+
+@pytest.mark.parametrize("option", COUNT_OPTIONS)
+def test_count_is_parsed(option):
+    args = cli.parse_args([option, "3", "hashid"])
+
+    assert getattr(args, option[2:].replace("-", "_")) == 3
+
+
+def test_counts_have_positive_defaults():
+    args = cli.parse_args(["hashid"])
+
+    assert args.jobs == 4
+    assert args.project_jobs == 4
+    assert args.writer_threads == 1
+    assert args.retries == 3
@@ -0,0 +1,88 @@
+# Copyright (C) 2025 Jérémy Rotzetter
+
+import os
+import time
+import downloader
+from standin import png
+
+LATENCY = 0.2
+
+
+def image_route(data: bytes, delay: float = 0.0):
+    def route(handler):
+        time.sleep(delay)
+        handler.reply(200, data, {"Content-Type": "image/png"})
+
+    return route
+
+
+def run(image_downloader: downloader.Downloader, jobs: list[tuple[str, str]]):
+    return list(image_downloader.run(jobs))
+
+
+def test_parallel_downloads_are_faster_than_serial(server, tmp_path):
+    images = {
+        f"/images/{n}/large/image{n}.png": png(body=bytes([n]) * 1000) for n in range(8)
+    }
+    for path, data in images.items():
+        server.route(path, image_route(data, LATENCY))
+    jobs = [(server.url(f"{path}?1"), f"image{n}") for n, path in enumerate(images)]
+
+    timings = {}
+    for workers in (1, 4):
+        store_path = tmp_path / str(workers)
+        store_path.mkdir()
+        image_downloader = downloader.Downloader(str(store_path), max_workers=workers)
+        started = time.perf_counter()
+        lines = run(image_downloader, jobs)
+        timings[workers] = time.perf_counter() - started
+
+        assert len(lines) == len(jobs)
+        assert image_downloader.SAVED == len(jobs)
+        assert image_downloader.ERRORS == image_downloader.SKIPS == 0
+        for n, data in enumerate(images.values()):
+            assert (store_path / f"image{n}.png").read_bytes() == data
+
+    assert timings[1] >= len(jobs) * LATENCY
+    assert timings[4] < timings[1] / 2
+
+
+def same_name_jobs(server) -> tuple[list[tuple[str, str]], set[bytes]]:
+    # Two different images whose URLs end in the same file name, both are in
+    # flight at the same time
+    bodies = set()
+    jobs = []
+    for project in ("a", "b"):
+        data = png(body=project.encode() * 256 * 1024)
+        bodies.add(data)
+        path = f"/images/{project}/large/image.png"
+        server.route(path, image_route(data, LATENCY))
+        jobs.append((server.url(f"{path}?1"), "image"))
+    return jobs, bodies
+
+
+def test_same_name_is_saved_once_per_image_with_keep_both(server, tmp_path):
+    jobs, bodies = same_name_jobs(server)
+    image_downloader = downloader.Downloader(
+        str(tmp_path), max_workers=2, collision_policy="keep-both"
+    )
+    run(image_downloader, jobs)
+
+    assert image_downloader.SAVED == 2
+    assert sorted(os.listdir(tmp_path)) == ["image (1).png", "image.png"]
+    saved = {(tmp_path / name).read_bytes() for name in os.listdir(tmp_path)}
+    assert saved == bodies
+
+
+def test_same_name_is_not_written_twice_with_skip(server, tmp_path):
+    jobs, bodies = same_name_jobs(server)
+    image_downloader = downloader.Downloader(
+        str(tmp_path), max_workers=2, collision_policy="skip"
+    )
+    lines = run(image_downloader, jobs)
+
+    assert image_downloader.SAVED == 1
+    assert image_downloader.SKIPS == 1
+    assert any("already exists" in line for line in lines)
+    assert os.listdir(tmp_path) == ["image.png"]
+    assert (tmp_path / "image.png").read_bytes() in bodies
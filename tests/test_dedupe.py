@@ -0,0 +1,111 @@
+# Copyright (C) 2025 Jérémy Rotzetter
+
+import os
+import batch
+import dedupe
+from standin import png
+
+SHARED = png(body=b"shared" * 1000)
+
+
+def project(server, hash_id: str, images: dict[str, bytes]) -> dict:
+    """
+    JSON data of a project whose images are served by the stand-in server
+    """
+    for name, data in images.items():
+        server.route(
+            f"/{hash_id}/8k/{name}.png",
+            lambda handler, data=data: handler.reply(
+                200, data, {"Content-Type": "image/png"}
+            ),
+        )
+    return {
+        "hash_id": hash_id,
+        "assets": [
+            {
+                "id": n,
+                "position": n,
+                "asset_type": "image",
+                "image_url": server.url(f"/{hash_id}/large/{name}.png?1"),
+            }
+            for n, name in enumerate(images)
+        ],
+    }
+
+
+def run(server, tmp_path, dedupe_mode: str) -> batch.BatchDownloader:
+    projects = {
+        "p1": project(server, "p1", {"a": SHARED, "b": png(body=b"b" * 1000)}),
+        "p2": project(server, "p2", {"c": SHARED}),
+    }
+    batch_downloader = batch.BatchDownloader(
+        str(tmp_path),
+        max_workers=1,
+        project_workers=1,
+        fetch_project=projects.__getitem__,
+        dedupe_mode=dedupe_mode,
+    )
+    list(batch_downloader.run(projects))
+    return batch_downloader
+
+
+def counted(batch_downloader: batch.BatchDownloader, counter: str) -> int:
+    return sum(
+        getattr(project_downloader, counter)
+        for project_downloader, _ in batch_downloader.projects.values()
+    )
+
+
+def test_link_replaces_duplicate_across_projects_with_hard_link(server, tmp_path):
+    batch_downloader = run(server, tmp_path, "link")
+
+    first, second = tmp_path / "p1" / "a.png", tmp_path / "p2" / "c.png"
+    assert first.read_bytes() == second.read_bytes() == SHARED
+    assert os.path.samefile(first, second)
+    assert first.stat().st_nlink == 2
+    assert (tmp_path / "p1" / "b.png").stat().st_nlink == 1
+    assert counted(batch_downloader, "SAVED") == 3
+    assert counted(batch_downloader, "DUPLICATES") == 1
+    assert counted(batch_downloader, "DEDUPED_BYTES") == len(SHARED)
+
+
+def test_skip_does_not_keep_duplicate_across_projects(server, tmp_path):
+    batch_downloader = run(server, tmp_path, "skip")
+
+    saved = sorted(os.path.relpath(path, tmp_path) for path in tmp_path.rglob("*.png"))
+    # whichever copy was saved first is kept
+    assert saved in (
+        [os.path.join("p1", "a.png"), os.path.join("p1", "b.png")],
+        [os.path.join("p1", "b.png"), os.path.join("p2", "c.png")],
+    )
+    assert counted(batch_downloader, "SAVED") == 2
+    assert counted(batch_downloader, "SKIPS") == 1
+    assert counted(batch_downloader, "DUPLICATES") == 1
+
+
+def test_off_keeps_each_copy(server, tmp_path):
+    batch_downloader = run(server, tmp_path, "off")
+
+    first, second = tmp_path / "p1" / "a.png", tmp_path / "p2" / "c.png"
+    assert not os.path.samefile(first, second)
+    assert counted(batch_downloader, "DUPLICATES") == 0
+    assert not (tmp_path / dedupe.HASH_INDEX_NAME).exists()
+
+
+def test_claim_ignores_indexed_file_that_was_removed(tmp_path):
+    hash_index = dedupe.HashIndex(str(tmp_path))
+    (tmp_path / "a.png").write_bytes(SHARED)
+    (tmp_path / "b.png").write_bytes(SHARED)
+
+    assert hash_index.claim("hash", len(SHARED), str(tmp_path / "a.png")) is None
+    assert hash_index.claim("hash", len(SHARED), str(tmp_path / "b.png")) == str(
+        tmp_path / "a.png"
+    )
+    (tmp_path / "a.png").unlink()
+    assert hash_index.claim("hash", len(SHARED), str(tmp_path / "b.png")) is None
+    (tmp_path / "c.png").write_bytes(SHARED)
+    # the file claimed last has taken the place of the removed one
+    assert hash_index.claim("hash", len(SHARED), str(tmp_path / "c.png")) == str(
+        tmp_path / "b.png"
+    )
+    hash_index.close()
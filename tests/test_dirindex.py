@@ -0,0 +1,137 @@
+# Copyright (C) 2025 Jérémy Rotzetter
+
+import os
+import pytest
+import dirindex
+import downloader
+from standin import png
+
+IMAGE = png(body=b"new" * 1000)
+
+
+def test_index_reads_the_names_and_looks_sizes_up_when_needed(tmp_path):
+    (tmp_path / "a.png").write_bytes(b"12345")
+    (tmp_path / "sub").mkdir()
+    index = dirindex.DirectoryIndex(str(tmp_path))
+
+    assert len(index) == 2
+    assert index.exists("a.png") and index.exists("sub")
+    assert not index.exists("b.png")
+    assert index.size("a.png") == 5
+    assert index.size("sub") is None  # not a regular file
+    assert index.size("b.png") is None
+
+
+def test_index_of_a_missing_directory_is_empty(tmp_path):
+    index = dirindex.DirectoryIndex(str(tmp_path / "missing"))
+
+    assert len(index) == 0
+    assert not index.exists("a.png")
+
+
+def test_added_and_removed_files_are_recorded(tmp_path):
+    index = dirindex.DirectoryIndex(str(tmp_path))
+    index.add("a.png", 10)
+
+    assert index.exists("a.png")
+    assert index.size("a.png") == 10
+    index.remove("a.png")
+    assert not index.exists("a.png")
+
+
+def test_a_name_is_reserved_by_one_download_at_a_time(tmp_path):
+    (tmp_path / "taken.png").write_bytes(b"x")
+    index = dirindex.DirectoryIndex(str(tmp_path))
+
+    assert index.reserve("a.png")
+    assert index.exists("a.png")
+    assert not index.reserve("a.png")
+    assert not index.reserve("a.png", replace=True)
+    index.release("a.png")
+    assert not index.exists("a.png")
+    assert index.reserve("a.png")
+
+    assert not index.reserve("taken.png")
+    assert index.reserve("taken.png", replace=True)
+    assert not index.reserve("taken.png", replace=True)
+
+
+def test_free_names_are_reserved_and_skip_taken_suffixes(tmp_path):
+    (tmp_path / "a.png").write_bytes(b"x")
+    (tmp_path / "a (1).png").write_bytes(b"x")
+    index = dirindex.DirectoryIndex(str(tmp_path))
+
+    first = index.free_name("a", ".png")
+    second = index.free_name("a", ".png")
+
+    assert (first, second) == ("a (2).png", "a (3).png")
+    assert index.exists(first)
+    index.release(first)
+    assert not index.exists(first)
+
+
+def test_names_are_compared_like_the_file_system_does(tmp_path):
+    (tmp_path / "Image.png").write_bytes(b"x")
+    index = dirindex.DirectoryIndex(str(tmp_path))
+
+    assert index.exists("Image.png")
+    assert index.exists("image.png") == (os.path.normcase("A") == "a")
+
+
+def download_over_existing(
+    server, tmp_path, existing: bytes, **options
+) -> tuple[downloader.Downloader, list[str]]:
+    """
+    Download IMAGE as "image.png" to a directory already holding a file of
+    that name, returns the downloader and the names in the directory
+    """
+    server.route(
+        "/images/large/image.png",
+        lambda handler: handler.reply(200, IMAGE, {"Content-Type": "image/png"}),
+    )
+    (tmp_path / "image.png").write_bytes(existing)
+    image_downloader = downloader.Downloader(str(tmp_path), **options)
+    list(image_downloader.run([(server.url("/images/large/image.png?1"), "image")]))
+    return image_downloader, sorted(os.listdir(tmp_path))
+
+
+@pytest.mark.parametrize(
+    "policy, existing, saved, names",
+    [
+        ("skip", b"old", 0, ["image.png"]),
+        ("overwrite-if-size-differs", b"old", 1, ["image.png"]),
+        ("overwrite-if-size-differs", IMAGE[::-1], 0, ["image.png"]),
+        ("auto-suffix", b"old", 1, ["image (1).png", "image.png"]),
+        ("auto-suffix", IMAGE[::-1], 0, ["image.png"]),
+        ("keep-both", IMAGE, 1, ["image (1).png", "image.png"]),
+    ],
+)
+def test_collision_policies(server, tmp_path, policy, existing, saved, names):
+    image_downloader, listed = download_over_existing(
+        server, tmp_path, existing, collision_policy=policy
+    )
+
+    assert image_downloader.SAVED == saved
+    assert image_downloader.SKIPS == 1 - saved
+    assert listed == names
+    replaced = policy == "overwrite-if-size-differs" and saved
+    assert ((tmp_path / "image.png").read_bytes() == IMAGE) == bool(
+        replaced or existing == IMAGE
+    )
+
+
+def test_ask_policy_saves_under_the_name_given_by_the_callback(server, tmp_path):
+    asked = []
+
+    def ask_rename(filename, ext, store_path):
+        asked.append(f"{filename}{ext}")
+        return "renamed.png"
+
+    image_downloader, listed = download_over_existing(
+        server, tmp_path, b"old", skip_existing=False, ask_rename=ask_rename
+    )
+
+    assert asked == ["image.png"]
+    assert image_downloader.SAVED == 1
+    assert listed == ["image.png", "renamed.png"]
+    assert (tmp_path / "renamed.png").read_bytes() == IMAGE
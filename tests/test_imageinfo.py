@@ -0,0 +1,166 @@
+# Copyright (C) 2025 Jérémy Rotzetter
+
+import struct
+import zlib
+import pytest
+import imageinfo
+
+
+def png_chunk(chunk_type: bytes, data: bytes) -> bytes:
+    return (
+        struct.pack(">I", len(data))
+        + chunk_type
+        + data
+        + struct.pack(">I", zlib.crc32(chunk_type + data))
+    )
+
+
+def png(width: int, height: int, icc_profile: bool = False) -> bytes:
+    data = b"\x89PNG\r\n\x1a\n" + png_chunk(
+        b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    )
+    data += png_chunk(b"gAMA", struct.pack(">I", 45455))
+    if icc_profile:
+        data += png_chunk(b"iCCP", b"sRGB\x00\x00" + b"\x78\x9c" * 20)
+    return data + png_chunk(b"IDAT", b"\x00" * 64) + png_chunk(b"IEND", b"")
+
+
+def jpeg_segment(marker: int, data: bytes) -> bytes:
+    return bytes([0xFF, marker]) + struct.pack(">H", len(data) + 2) + data
+
+
+def jpeg(width: int, height: int, icc_profile: bool = False, exif: int = 0) -> bytes:
+    data = b"\xff\xd8" + jpeg_segment(
+        0xE0, b"JFIF\x00\x01\x01\x00\x00\x01\x00\x01\x00\x00"
+    )
+    if exif:
+        data += jpeg_segment(0xE1, b"Exif\x00\x00" + bytes(exif))
+    if icc_profile:
+        data += jpeg_segment(0xE2, b"ICC_PROFILE\x00\x01\x01" + bytes(128))
+    data += jpeg_segment(0xDB, bytes(65))
+    data += jpeg_segment(0xC2, struct.pack(">BHHB", 8, height, width, 3) + bytes(9))
+    return data + jpeg_segment(0xDA, bytes(10)) + bytes(100) + b"\xff\xd9"
+
+
+def webp(chunk_type: bytes, payload: bytes) -> bytes:
+    chunk = chunk_type + struct.pack("<I", len(payload)) + payload
+    return b"RIFF" + struct.pack("<I", 4 + len(chunk)) + b"WEBP" + chunk
+
+
+def box(box_type: bytes, data: bytes) -> bytes:
+    return struct.pack(">I", 8 + len(data)) + box_type + data
+
+
+def avif(sizes: list[tuple[int, int]], icc_profile: bool = False) -> bytes:
+    properties = b"".join(
+        box(b"ispe", b"\x00" * 4 + struct.pack(">II", width, height))
+        for width, height in sizes
+    )
+    if icc_profile:
+        properties += box(b"colr", b"prof" + bytes(32))
+    else:
+        properties += box(b"colr", b"nclx" + bytes(7))
+    meta = box(
+        b"meta",
+        b"\x00" * 4 + box(b"hdlr", bytes(25)) + box(b"iprp", box(b"ipco", properties)),
+    )
+    return box(b"ftyp", b"avif\x00\x00\x00\x00mif1") + meta + box(b"mdat", bytes(100))
+
+
+@pytest.mark.parametrize(
+    "data, expected",
+    [
+        (png(640, 480), ("PNG", 640, 480, False)),
+        (png(7680, 4320, icc_profile=True), ("PNG", 7680, 4320, True)),
+        (jpeg(3840, 2160), ("JPEG", 3840, 2160, False)),
+        (jpeg(1920, 1080, icc_profile=True), ("JPEG", 1920, 1080, True)),
+        (
+            b"GIF89a" + struct.pack("<HH", 320, 200) + bytes(20),
+            ("GIF", 320, 200, False),
+        ),
+        (
+            webp(
+                b"VP8X",
+                bytes([0x20, 0, 0, 0])
+                + (1999).to_bytes(3, "little")
+                + (999).to_bytes(3, "little"),
+            ),
+            ("WebP", 2000, 1000, True),
+        ),
+        (
+            webp(
+                b"VP8 ",
+                bytes(3) + b"\x9d\x01\x2a" + struct.pack("<HH", 800, 600) + bytes(10),
+            ),
+            ("WebP", 800, 600, False),
+        ),
+        (
+            webp(
+                b"VP8L",
+                b"\x2f" + ((1023) | (767 << 14)).to_bytes(4, "little") + bytes(10),
+            ),
+            ("WebP", 1024, 768, False),
+        ),
+        (avif([(512, 512), (2048, 1024)]), ("AVIF", 2048, 1024, False)),
+        (avif([(100, 50)], icc_profile=True), ("AVIF", 100, 50, True)),
+    ],
+)
+def test_header_is_parsed(data, expected):
+    info = imageinfo.parser_for(data[:12])(data)
+    assert (info.image_format, info.width, info.height, info.icc_profile) == expected
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 100, 4096])
+def test_probe_finds_the_dimensions_in_any_chunking(chunk_size):
+    data = jpeg(4000, 3000, icc_profile=True, exif=20000)
+    probe = imageinfo.HeaderProbe()
+    for start in range(0, len(data), chunk_size):
+        if probe.feed(data[start : start + chunk_size]):
+            break
+
+    assert probe.done
+    assert str(probe.info) == "4000x3000 with ICC profile"
+
+
+def test_probe_gives_up_on_unknown_formats():
+    probe = imageinfo.HeaderProbe()
+    assert probe.feed(b"<html><body>Not an image</body></html>")
+    assert probe.info is None
+
+
+def test_probe_gives_up_on_a_header_beyond_the_limit():
+    # EXIF/XMP segments filling more than MAX_HEADER_BYTES before the frame
+    segments = imageinfo.MAX_HEADER_BYTES // 65535 + 2
+    data = b"\xff\xd8" + jpeg_segment(0xE1, bytes(65533)) * segments
+    data += jpeg(10, 10)[2:]
+    probe = imageinfo.HeaderProbe()
+    fed = 0
+    while not probe.feed(data[fed : fed + 65536]):
+        fed += 65536
+
+    assert fed < len(data) - 65536
+    assert probe.info is None
+
+
+def test_broken_header_is_not_reported():
+    data = b"\xff\xd8\x00\x00" + bytes(100)
+    probe = imageinfo.HeaderProbe()
+    assert probe.feed(data)
+    assert probe.info is None
+
+
+def test_dimensions_are_logged_while_streaming(server, tmp_path):
+    import downloader
+
+    data = png(7680, 4320, icc_profile=True)
+    server.route(
+        "/images/1/large/image.png",
+        lambda handler: handler.reply(200, data, {"Content-Type": "image/png"}),
+    )
+    image_downloader = downloader.Downloader(str(tmp_path))
+
+    (line,) = image_downloader.run(
+        [(server.url("/images/1/large/image.png?1"), "image")]
+    )
+
+    assert "(7680x4320 with ICC profile)" in line
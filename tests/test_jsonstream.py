@@ -0,0 +1,129 @@
+# Copyright (C) 2025 Jérémy Rotzetter
+
+import io
+import json
+import pytest
+import jsonstream
+
+
+def project(n: int) -> dict:
+    return {
+        "id": n,
+        "hash_id": f"h{n}",
+        "title": 'A "quoted" title\\with éscapes \U0001f600 and \\u0041',
+        "description": "x" * 500,
+        "assets": [
+            {
+                "id": n * 10 + a,
+                "position": a,
+                "asset_type": "image",
+                "image_url": f"https://cdn/images/{n}/{a}/large/i.jpg?1",
+                "width": 800,
+                "height": 600,
+                "title": "dropped",
+            }
+            for a in range(2)
+        ],
+    }
+
+
+def slim(n: int) -> dict:
+    return {
+        "hash_id": f"h{n}",
+        "assets": [
+            {
+                "id": n * 10 + a,
+                "position": a,
+                "asset_type": "image",
+                "width": 800,
+                "height": 600,
+                "image_url": f"https://cdn/images/{n}/{a}/large/i.jpg?1",
+            }
+            for a in range(2)
+        ],
+    }
+
+
+def chunks(text: str, size: int, encode: bool = True) -> list:
+    data = text.encode("utf-8") if encode else text
+    return [data[i : i + size] for i in range(0, len(data), size)]
+
+
+LISTING = json.dumps(
+    {"data": [project(n) for n in range(5)], "total_count": 12345},
+    ensure_ascii=False,
+)
+ARRAY = json.dumps([project(n) for n in range(5)], ensure_ascii=False)
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 64, 100_000])
+@pytest.mark.parametrize("document", [LISTING, ARRAY], ids=["data", "array"])
+def test_projects_split_across_chunks(document, size):
+    listing = {}
+
+    projects = list(jsonstream.iter_projects(chunks(document, size), listing=listing))
+
+    assert projects == [slim(n) for n in range(5)]
+    if document is LISTING:
+        # a number split across chunks is not cut short
+        assert listing == {"total_count": 12345}
+
+
+@pytest.mark.parametrize("size", [1, 5])
+def test_text_chunks_and_files(size):
+    assert list(jsonstream.iter_projects(chunks(ARRAY, size, encode=False))) == [
+        slim(n) for n in range(5)
+    ]
+    with io.BytesIO(LISTING.encode("utf-8")) as f:
+        assert len(list(jsonstream.iter_projects(f))) == 5
+
+
+def test_single_project_keeps_only_the_used_fields():
+    text = json.dumps(project(1))
+
+    assert jsonstream.load_project(chunks(text, 3)) == slim(1)
+
+
+def test_escaped_strings_are_decoded():
+    text = json.dumps({"hash_id": 'a"b\\cé\U0001f600/'})
+
+    assert jsonstream.load_project(chunks(text, 1)) == {"hash_id": 'a"b\\cé\U0001f600/'}
+
+
+@pytest.mark.parametrize("document", [LISTING, ARRAY], ids=["data", "array"])
+@pytest.mark.parametrize("cut", [1, 50, 1000, -2, -1])
+def test_truncated_documents_are_invalid(document, cut):
+    with pytest.raises(json.JSONDecodeError):
+        list(jsonstream.iter_projects(chunks(document[:cut], 16)))
+
+
+@pytest.mark.parametrize("text", ["", "hello", '{"hash_id": "a"} x', '{"a" 1}'])
+def test_invalid_documents(text):
+    with pytest.raises(json.JSONDecodeError):
+        jsonstream.load_project(text)
+
+
+@pytest.mark.parametrize("text", ["{}", "[]", '{"a": 1}', "[1, 2]"])
+def test_valid_documents_without_a_project(text):
+    assert jsonstream.load_project(text) == {}
+
+
+def test_entries_that_are_not_objects_are_skipped():
+    text = json.dumps(
+        {
+            "data": [1, {"hash_id": "a", "assets": [2, None, {"id": 3}]}, "x"],
+        }
+    )
+
+    assert list(jsonstream.iter_projects(text)) == [
+        {"hash_id": "a", "assets": [{"id": 3}]}
+    ]
+    single = json.dumps({"hash_id": "b", "assets": [[], {"id": 4}]})
+    assert jsonstream.load_project(chunks(single, 2)) == {
+        "hash_id": "b",
+        "assets": [{"id": 4}],
+    }
+    assert jsonstream.slim_project({"hash_id": "c", "assets": [7]}) == {
+        "hash_id": "c",
+        "assets": [],
+    }
@@ -0,0 +1,95 @@
+# Copyright (C) 2025 Jérémy Rotzetter
+
+import downloader
+import manifest
+from standin import png
+
+PATH = "/images/000/000/001/large/image.png"
+FIRST = png(body=b"first" * 1000)
+SECOND = png(body=b"second" * 1000)
+
+
+class Image:
+    """
+    Route serving the current content of an image
+    """
+
+    def __init__(self, data: bytes):
+        self.data = data
+
+    def __call__(self, handler):
+        handler.reply(200, self.data, {"Content-Type": "image/png"})
+
+
+def download(tmp_path, url: str) -> downloader.Downloader:
+    image_downloader = downloader.Downloader(
+        str(tmp_path), max_workers=1, use_manifest=True
+    )
+    list(image_downloader.run([(url, "image")]))
+    return image_downloader
+
+
+def test_asset_keys_are_taken_from_the_url():
+    url = "https://cdna.artstation.com/p/assets/images/images/012/345/678/large/a.jpg?1700000000"
+    assert manifest.asset_id(url) == "012345678"
+    assert manifest.asset_size(url) == "large"
+    assert manifest.asset_version(url) == "1700000000"
+
+
+def test_unchanged_image_is_skipped_without_a_request(server, tmp_path):
+    server.route(PATH, Image(FIRST))
+    url = server.url(f"{PATH}?1")
+
+    assert download(tmp_path, url).SAVED == 1
+    image_downloader = download(tmp_path, url)
+
+    assert len(server.requests_to(PATH)) == 1
+    assert image_downloader.SAVED == 0
+    assert image_downloader.UNCHANGED == 1
+    assert (tmp_path / "image.png").read_bytes() == FIRST
+
+
+def test_new_version_of_an_image_is_downloaded_again(server, tmp_path):
+    route = Image(FIRST)
+    server.route(PATH, route)
+    download(tmp_path, server.url(f"{PATH}?1"))
+
+    route.data = SECOND
+    image_downloader = download(tmp_path, server.url(f"{PATH}?2"))
+
+    assert len(server.requests_to(PATH)) == 2
+    assert image_downloader.SAVED == 1
+    assert image_downloader.UNCHANGED == 0
+    # the file of the earlier version is replaced instead of kept aside
+    assert (tmp_path / "image.png").read_bytes() == SECOND
+    assert sorted(p.name for p in tmp_path.glob("*.png")) == ["image.png"]
+    image_manifest = manifest.Manifest(str(tmp_path))
+    entry = image_manifest.get(server.url(f"{PATH}?2"))
+    image_manifest.close()
+    assert entry[:3] == ("image.png", "2", len(SECOND))
+
+
+def test_file_changed_on_disk_is_downloaded_again(server, tmp_path):
+    server.route(PATH, Image(FIRST))
+    url = server.url(f"{PATH}?1")
+    download(tmp_path, url)
+
+    (tmp_path / "image.png").write_bytes(b"truncated")
+    image_downloader = download(tmp_path, url)
+
+    assert len(server.requests_to(PATH)) == 2
+    assert image_downloader.SAVED == 1
+    assert (tmp_path / "image.png").read_bytes() == FIRST
+
+
+def test_removed_file_is_downloaded_again(server, tmp_path):
+    server.route(PATH, Image(FIRST))
+    url = server.url(f"{PATH}?1")
+    download(tmp_path, url)
+
+    (tmp_path / "image.png").unlink()
+    image_downloader = download(tmp_path, url)
+
+    assert len(server.requests_to(PATH)) == 2
+    assert image_downloader.SAVED == 1
+    assert (tmp_path / "image.png").read_bytes() == FIRST
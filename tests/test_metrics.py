@@ -0,0 +1,128 @@
+# Copyright (C) 2025 Jérémy Rotzetter
+
+import json
+import re
+import metrics
+
+
+def timing(url: str, result: str, nbytes: int, seconds: float) -> metrics.AssetTiming:
+    asset_timing = metrics.AssetTiming(url)
+    asset_timing.result = result
+    asset_timing.bytes = nbytes
+    asset_timing.ttfb = seconds / 4
+    asset_timing.read = seconds / 2
+    asset_timing.write = seconds / 4
+    asset_timing.total = seconds
+    return asset_timing
+
+
+def run_metrics() -> metrics.RunMetrics:
+    """
+    Metrics of a run with two fetches, two saved and one skipped image
+    """
+    recorded = metrics.RunMetrics()
+    recorded.record_fetch("p1", 0.2, 1000, "miss")
+    recorded.record_fetch("p2", 0.1, 500, "hit")
+    recorded.record_asset(timing("https://a/1.png", "saved", 4000, 2.0))
+    recorded.record_asset(timing("https://a/2.png", "saved", 2000, 1.0))
+    recorded.record_asset(timing("https://a/3.png", "skipped", 0, 0.5))
+    recorded.finish()
+    recorded.seconds = 4.0
+    return recorded
+
+
+def test_describe_uses_nearest_rank_quantiles():
+    stats = metrics.describe([4.0, 1.0, 3.0, 2.0])
+    assert stats == {
+        "count": 4,
+        "sum": 10.0,
+        "mean": 2.5,
+        "p50": 3.0,
+        "p95": 4.0,
+        "max": 4.0,
+    }
+    assert metrics.describe([]) == {
+        "count": 0,
+        "sum": 0,
+        "mean": 0.0,
+        "p50": 0.0,
+        "p95": 0.0,
+        "max": 0.0,
+    }
+
+
+def test_json_export(tmp_path):
+    path = tmp_path / "metrics.json"
+
+    run_metrics().write_json(str(path))
+
+    data = json.loads(path.read_text(encoding="utf-8"))
+    assert data["seconds"] == 4.0
+    assert data["results"] == {"error": 0, "saved": 2, "skipped": 1}
+    assert data["bytes"] == 6000
+    assert data["throughput"] == 1500.0
+    # the skipped image transferred no body and is left out of the timings
+    assert data["phases"]["total"]["count"] == 2
+    assert data["phases"]["total"]["sum"] == 3.0
+    assert data["phases"]["read"]["max"] == 1.0
+    assert data["asset_throughput"]["p50"] == 4000.0
+    assert data["project_fetch"]["count"] == 2
+    assert data["project_fetch"]["bytes"] == 1500
+    assert data["project_fetch"]["sources"] == {"miss": 1, "hit": 1}
+    assert data["assets"][0] == {
+        "url": "https://a/1.png",
+        "result": "saved",
+        "bytes": 4000,
+        "ttfb": 0.5,
+        "read": 1.0,
+        "write": 0.5,
+        "total": 2.0,
+        "throughput": 4000.0,
+    }
+    assert [fetch["hash_id"] for fetch in data["fetches"]] == ["p1", "p2"]
+    assert data["fetches"][1] == {
+        "hash_id": "p2",
+        "seconds": 0.1,
+        "bytes": 500,
+        "source": "hit",
+    }
+    assert [p.name for p in tmp_path.iterdir()] == ["metrics.json"]
+
+
+def test_prometheus_export(tmp_path):
+    path = tmp_path / "metrics.prom"
+
+    run_metrics().write_prometheus(str(path))
+
+    text = path.read_text(encoding="utf-8")
+    assert text.endswith("\n")
+    samples = {}
+    for line in text.splitlines():
+        if line.startswith("#"):
+            assert re.fullmatch(
+                r"# (HELP \w+ .+|TYPE \w+ (summary|counter|gauge))", line
+            )
+            continue
+        name, value = line.rsplit(" ", 1)
+        assert re.fullmatch(r'\w+(\{\w+="[^"]*"(,\w+="[^"]*")*\})?', name)
+        assert name not in samples
+        samples[name] = float(value)
+    assert (
+        samples['artstation_download_phase_seconds{phase="total",quantile="0.5"}']
+        == 2.0
+    )
+    assert samples['artstation_download_phase_seconds_sum{phase="total"}'] == 3.0
+    assert samples['artstation_download_phase_seconds_count{phase="ttfb"}'] == 2
+    assert samples['artstation_project_fetch_seconds{quantile="0.95"}'] == 0.2
+    assert samples["artstation_project_fetch_seconds_count"] == 2
+    assert samples['artstation_project_fetches_total{source="hit"}'] == 1
+    assert samples['artstation_downloads_total{result="saved"}'] == 2
+    assert samples['artstation_downloads_total{result="error"}'] == 0
+    assert samples["artstation_downloaded_bytes_total"] == 6000
+    assert samples["artstation_run_seconds"] == 4.0
+    assert samples["artstation_run_throughput_bytes_per_second"] == 1500.0
+
+
+def test_summary_reports_fetches_only_if_there_were_any():
+    assert "JSON fetch p50/p95: 200 ms/200 ms" in run_metrics().summary()
+    assert "JSON fetch" not in metrics.RunMetrics().summary()
@@ -0,0 +1,98 @@
+# Copyright (C) 2025 Jérémy Rotzetter
+
+import threading
+import time
+import batch
+import planner
+import ratelimit
+import transport
+from standin import png
+
+IMAGE = png(body=b"image" * 100)
+
+
+class CountingImage:
+    """
+    Route serving an image that keeps track of the number of HEAD requests
+    in flight at the same time
+    """
+
+    def __init__(self, delay: float = 0.05):
+        self.delay = delay
+        self.active = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, handler):
+        if handler.command == "HEAD":
+            with self.lock:
+                self.active += 1
+                self.peak = max(self.peak, self.active)
+            time.sleep(self.delay)
+            with self.lock:
+                self.active -= 1
+        handler.reply(200, IMAGE, {"Content-Type": "image/png"})
+
+
+def project(server, hash_id: str, images: int) -> dict:
+    return {
+        "hash_id": hash_id,
+        "assets": [
+            {
+                "id": n,
+                "position": n,
+                "asset_type": "image",
+                "image_url": server.url(f"/{hash_id}/large/{n}.png?1"),
+            }
+            for n in range(images)
+        ],
+    }
+
+
+def test_preflight_of_all_projects_shares_one_pool(server, tmp_path):
+    route = CountingImage()
+    projects = {}
+    for hash_id in ("p1", "p2", "p3", "p4"):
+        projects[hash_id] = project(server, hash_id, 4)
+        for n in range(4):
+            server.route(f"/{hash_id}/8k/{n}.png", route)
+    batch_downloader = batch.BatchDownloader(
+        str(tmp_path),
+        max_workers=2,
+        project_workers=4,
+        fetch_project=projects.__getitem__,
+        preflight=True,
+    )
+
+    results = list(batch_downloader.run(projects))
+
+    assert sum("Plan" in line for _, line in results) == 4
+    assert route.peak <= 2
+    assert all(
+        downloader.SAVED == 4 for downloader, _ in batch_downloader.projects.values()
+    )
+
+
+def test_rate_limited_preflight_request_backs_off_and_is_retried(server):
+    sent = []
+
+    def route(handler):
+        sent.append(handler.command)
+        if len(sent) == 1:
+            return handler.reply(429, headers={"Retry-After": "0"})
+        handler.reply(200, IMAGE, {"Content-Type": "image/png"})
+
+    server.route("/p1/large/0.png", route)
+    controller = ratelimit.RateController(2)
+    project_planner = planner.Planner(
+        transport.get().session(), max_workers=2, rate_controller=controller
+    )
+
+    plan = project_planner.plan([(server.url("/p1/large/0.png?1"), "0")])
+    project_planner.close()
+
+    (asset,) = plan.assets
+    assert asset.error is None
+    assert asset.size == len(IMAGE)
+    assert controller.THROTTLED == 1
+    assert sent == ["HEAD", "HEAD"]
@@ -0,0 +1,173 @@
+# Copyright (C) 2025 Jérémy Rotzetter
+
+import json
+import threading
+import time
+import batch
+import portfolio
+from standin import png
+
+IMAGE = png(body=b"image" * 100)
+
+
+class Listing:
+    """
+    Route serving the pages of a portfolio listing, the last page is short
+
+    :param pages: number of pages
+    :param per_page: number of projects on a full page
+    :param latency: seconds each page takes
+    :param total: whether the listing tells the number of projects
+    """
+
+    def __init__(
+        self, pages: int, per_page: int, latency: float = 0.0, total: bool = True
+    ):
+        self.per_page = per_page
+        self.latency = latency
+        self.total = total
+        self.count = pages * per_page - per_page // 2
+
+    def hash_ids(self) -> list[str]:
+        return [f"p{n:03d}" for n in range(self.count)]
+
+    def __call__(self, handler):
+        page = int(handler.path.split("page=", 1)[1])
+        time.sleep(self.latency)
+        start = (page - 1) * self.per_page
+        listing = {
+            "data": [
+                {"id": n, "hash_id": f"p{n:03d}", "title": "x" * 100}
+                for n in range(start, min(start + self.per_page, self.count))
+            ]
+        }
+        if self.total:
+            listing["total_count"] = self.count
+        handler.reply(
+            200, json.dumps(listing).encode(), {"Content-Type": "application/json"}
+        )
+
+
+def listing_portfolio(server, route: Listing, max_workers: int = 4):
+    server.route("/users/artist/projects.json", route)
+    return portfolio.Portfolio(
+        "artist",
+        max_workers=max_workers,
+        url_template=server.url("/users/{username}/projects.json?page={page}"),
+    )
+
+
+def pages_requested(server) -> list[int]:
+    return sorted(
+        int(path.split("page=", 1)[1])
+        for _, path in (
+            r[:2] for r in server.requests_to("/users/artist/projects.json")
+        )
+    )
+
+
+def test_pages_told_by_the_total_count_are_fetched_once(server):
+    route = Listing(pages=7, per_page=5, latency=0.02)
+    artist_portfolio = listing_portfolio(server, route)
+
+    hash_ids = list(artist_portfolio.hash_ids())
+
+    assert sorted(hash_ids) == route.hash_ids()
+    assert pages_requested(server) == list(range(1, 8))
+    assert artist_portfolio.PAGES == 7
+    assert artist_portfolio.failed == {}
+    assert "33 Projects on 7 Pages" in artist_portfolio.summary()
+
+
+def test_pages_are_fetched_until_a_short_one_without_total_count(server):
+    route = Listing(pages=6, per_page=4, total=False)
+    artist_portfolio = listing_portfolio(server, route, max_workers=3)
+
+    hash_ids = list(artist_portfolio.hash_ids())
+
+    assert sorted(hash_ids) == route.hash_ids()
+    # Pages already running when the short page arrived may be past the end
+    requested = pages_requested(server)
+    assert requested[:6] == list(range(1, 7))
+    assert len(requested) < 6 + 3
+
+
+def test_pages_are_only_fetched_while_hash_ids_are_taken(server):
+    route = Listing(pages=30, per_page=5, latency=0.01)
+    artist_portfolio = listing_portfolio(server, route, max_workers=2)
+
+    hash_ids = artist_portfolio.hash_ids()
+    taken = [next(hash_ids) for _ in range(6)]
+    hash_ids.close()
+
+    assert len(set(taken)) == 6
+    assert len(pages_requested(server)) <= 1 + 2
+
+
+def project(server, hash_id: str, images: int) -> dict:
+    return {
+        "hash_id": hash_id,
+        "assets": [
+            {
+                "id": n,
+                "position": n,
+                "asset_type": "image",
+                "image_url": server.url(f"/{hash_id}/large/{n}.png?1"),
+            }
+            for n in range(images)
+        ],
+    }
+
+
+def test_results_are_yielded_while_the_next_hash_id_is_awaited(server, tmp_path):
+    projects = {}
+    for hash_id in ("p1", "p2"):
+        projects[hash_id] = project(server, hash_id, 2)
+        for n in range(2):
+            server.route(
+                f"/{hash_id}/8k/{n}.png",
+                lambda handler: handler.reply(
+                    200, IMAGE, {"Content-Type": "image/png"}
+                ),
+            )
+    first_result = threading.Event()
+    waited_for = []
+
+    def slow_listing():
+        yield "p1"
+        # e.g. the next page of a portfolio, which takes long to arrive
+        waited_for.append(first_result.wait(10))
+        yield "p2"
+
+    batch_downloader = batch.BatchDownloader(
+        str(tmp_path), max_workers=2, fetch_project=projects.__getitem__
+    )
+    results = []
+    for result in batch_downloader.run(slow_listing()):
+        results.append(result)
+        first_result.set()
+
+    assert waited_for == [True]
+    assert len(results) == 4
+    assert batch_downloader.IMAGES == 4
+
+
+def test_only_results_of_images_are_counted(server, tmp_path):
+    projects = {"p1": project(server, "p1", 3)}
+    for n in range(3):
+        server.route(
+            f"/p1/8k/{n}.png",
+            lambda handler: handler.reply(200, IMAGE, {"Content-Type": "image/png"}),
+        )
+    batch_downloader = batch.BatchDownloader(
+        str(tmp_path),
+        max_workers=2,
+        fetch_project=projects.__getitem__,
+        preflight=True,
+    )
+
+    results = list(batch_downloader.run(["p1", "missing"]))
+
+    # the plan of p1 and the failed JSON of "missing" are not images
+    assert len(results) == 5
+    assert batch_downloader.IMAGES == 3
@@ -0,0 +1,87 @@
+# Copyright (C) 2025 Jérémy Rotzetter
+
+import os
+import sys
+import pytest
+import cli
+import postprocess
+
+
+@pytest.mark.parametrize("spec", ["verify", "icc", "thumbnail"])
+def test_missing_pillow_is_a_usage_error(monkeypatch, capsys, spec):
+    # an entry of None makes the import fail as if Pillow was not installed
+    monkeypatch.setitem(sys.modules, "PIL", None)
+
+    with pytest.raises(ValueError, match="Pillow"):
+        postprocess.resolve(spec)
+    with pytest.raises(ValueError, match="Pillow"):
+        postprocess.PostProcessor([spec], max_workers=1)
+    with pytest.raises(SystemExit) as exit_info:
+        cli.parse_args(["--post-process", spec, "hashid"])
+    assert exit_info.value.code == 2
+    assert "needs the optional Pillow package" in capsys.readouterr().err
+
+
+def test_functions_given_by_module_resolve_without_pillow(monkeypatch):
+    monkeypatch.setitem(sys.modules, "PIL", None)
+
+    assert postprocess.resolve("os.path:basename") is os.path.basename
+    with pytest.raises(ValueError, match="Unknown post-processor"):
+        postprocess.resolve("os.path:no_such_function")
+
+
+def image_file(tmp_path, name: str) -> str:
+    path = tmp_path / name
+    path.write_bytes(b"image")
+    return str(path)
+
+
+def test_notes_of_the_processors_are_added_to_the_log_line(tmp_path):
+    # readlink() fails on a regular file
+    post_processor = postprocess.PostProcessor(
+        ["os.path:basename", "os:readlink"], max_workers=1
+    )
+    try:
+        line = post_processor.submit(
+            image_file(tmp_path, "a.png"), '+ Saved: "a.png"'
+        ).result(timeout=60)
+    finally:
+        post_processor.close()
+
+    assert line.startswith('+ Saved: "a.png" - a.png, os:readlink failed: ')
+    assert post_processor.PROCESSED == 1
+    assert post_processor.FAILED == 1
+    assert "1 Files, Failed: 1" in post_processor.summary()
+
+
+def test_processors_returning_no_note_leave_the_log_line(tmp_path):
+    post_processor = postprocess.PostProcessor(["os.path:dirname"], max_workers=1)
+    try:
+        # dirname of a bare name is empty, so there is no note
+        line = post_processor.submit("a.png", '+ Saved: "a.png"').result(timeout=60)
+    finally:
+        post_processor.close()
+
+    assert line == '+ Saved: "a.png"'
+    assert post_processor.FAILED == 0
+
+
+def test_downloads_wait_while_max_pending_images_are_queued(tmp_path):
+    post_processor = postprocess.PostProcessor(
+        ["os.path:basename"], max_workers=1, max_pending=1
+    )
+    try:
+        # the first image is still waiting for the process to start when the
+        # others are submitted, each of them waits for the one before
+        futures = [
+            post_processor.submit(image_file(tmp_path, f"{n}.png"), f"{n}")
+            for n in range(3)
+        ]
+        lines = [future.result(timeout=60) for future in futures]
+    finally:
+        post_processor.close()
+
+    assert lines == [f"{n} - {n}.png" for n in range(3)]
+    assert post_processor.WAITS == 2
+    assert post_processor.WAIT_SECONDS > 0
+    assert "Downloads waited: 2" in post_processor.summary()
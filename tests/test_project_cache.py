@@ -0,0 +1,143 @@
+# Copyright (C) 2025 Jérémy Rotzetter
+
+import json
+import os
+import cache
+import downloader
+
+HASH_ID = "abc123"
+PROJECT = {
+    "hash_id": HASH_ID,
+    "title": "dropped by the parser",
+    "assets": [
+        {
+            "id": 1,
+            "position": 0,
+            "asset_type": "image",
+            "image_url": "https://cdna.artstation.com/p/assets/images/images/000/000/001/large/one.jpg?1",
+        }
+    ],
+}
+
+
+def project_route(server, etag="v1", last_modified=None, body=PROJECT):
+    """
+    Serve the project with its validators and answer matching conditional
+    requests with 304
+    """
+    data = json.dumps(body).encode()
+
+    def route(handler):
+        headers = {"Content-Type": "application/json"}
+        if etag is not None:
+            headers["ETag"] = etag
+        if last_modified is not None:
+            headers["Last-Modified"] = last_modified
+        if etag is not None and handler.headers.get("If-None-Match") == etag:
+            handler.reply(304, headers={"ETag": etag})
+        elif last_modified is not None and (
+            handler.headers.get("If-Modified-Since") == last_modified
+        ):
+            handler.reply(304)
+        else:
+            handler.reply(200, data, headers)
+
+    server.route(f"/projects/{HASH_ID}.json", route)
+
+
+def fetch(project_cache):
+    return downloader.fetch_project(HASH_ID, cache=project_cache)
+
+
+def use_server(monkeypatch, server):
+    monkeypatch.setattr(
+        downloader, "PROJECT_URL", server.url("/projects/{hash_id}.json")
+    )
+
+
+def test_fresh_entry_is_used_without_a_request(server, monkeypatch, tmp_path):
+    use_server(monkeypatch, server)
+    project_route(server)
+    project_cache = cache.ProjectCache(str(tmp_path), ttl=3600)
+
+    first = fetch(project_cache)
+    second = fetch(project_cache)
+
+    assert first == second
+    assert "title" not in first
+    assert first["assets"][0]["id"] == 1
+    assert len(server.requests) == 1
+    assert (project_cache.MISSES, project_cache.HITS) == (1, 1)
+
+
+def test_stale_entry_is_revalidated_with_its_etag(server, monkeypatch, tmp_path):
+    use_server(monkeypatch, server)
+    project_route(server)
+    project_cache = cache.ProjectCache(str(tmp_path), ttl=0)
+
+    first = fetch(project_cache)
+    second = fetch(project_cache)
+
+    assert first == second
+    _, _, headers = server.requests[1]
+    assert headers["If-None-Match"] == "v1"
+    assert (project_cache.MISSES, project_cache.REVALIDATED) == (1, 1)
+
+
+def test_stale_entry_is_revalidated_with_last_modified(server, monkeypatch, tmp_path):
+    use_server(monkeypatch, server)
+    last_modified = "Wed, 01 Jan 2025 00:00:00 GMT"
+    project_route(server, etag=None, last_modified=last_modified)
+    project_cache = cache.ProjectCache(str(tmp_path), ttl=0)
+
+    fetch(project_cache)
+    fetch(project_cache)
+
+    _, _, headers = server.requests[1]
+    assert headers["If-Modified-Since"] == last_modified
+    assert "If-None-Match" not in headers
+    assert project_cache.REVALIDATED == 1
+
+
+def test_changed_project_replaces_the_entry(server, monkeypatch, tmp_path):
+    use_server(monkeypatch, server)
+    project_route(server)
+    project_cache = cache.ProjectCache(str(tmp_path), ttl=0)
+    fetch(project_cache)
+
+    changed = {**PROJECT, "assets": PROJECT["assets"] * 2}
+    project_route(server, etag="v2", body=changed)
+    data = fetch(project_cache)
+
+    assert len(data["assets"]) == 2
+    assert project_cache.MISSES == 2
+    assert project_cache.get(HASH_ID)["etag"] == "v2"
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    project_cache = cache.ProjectCache(str(tmp_path))
+    for hash_id in ("old", "used"):
+        project_cache.put(hash_id, PROJECT, "v1")
+    os.utime(tmp_path / "old.json", (2, 2))
+    os.utime(tmp_path / "used.json", (1, 1))
+    project_cache.get("used")  # marks it as recently used
+    # Room for two entries, their sizes vary by a few bytes
+    project_cache.max_bytes = 2 * os.path.getsize(tmp_path / "used.json") + 16
+
+    project_cache.put("new", PROJECT, "v1")
+
+    assert sorted(os.listdir(tmp_path)) == ["new.json", "used.json"]
+
+
+def test_invalid_hash_id_is_not_cached(tmp_path):
+    cache_dir = tmp_path / "projects"
+    project_cache = cache.ProjectCache(str(cache_dir))
+    (tmp_path / "outside.json").write_text('{"data": {}}', encoding="utf-8")
+
+    for hash_id in ("../outside", "a/b", "..", ""):
+        project_cache.put(hash_id, PROJECT, "v1")
+        assert project_cache.get(hash_id) is None
+
+    assert os.listdir(cache_dir) == []
+    assert sorted(os.listdir(tmp_path)) == ["outside.json", "projects"]
+    assert (tmp_path / "outside.json").read_text(encoding="utf-8") == '{"data": {}}'
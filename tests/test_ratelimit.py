@@ -0,0 +1,178 @@
+# Copyright (C) 2025 Jérémy Rotzetter
+
+import email.utils
+import json
+import threading
+import time
+import requests
+import cli
+import downloader
+import ratelimit
+from standin import png
+
+IMAGE = png(body=b"image" * 100)
+
+
+def response(retry_after=None) -> requests.Response:
+    resp = requests.Response()
+    resp.status_code = 429
+    if retry_after is not None:
+        resp.headers["Retry-After"] = retry_after
+    return resp
+
+
+def test_retry_after_in_seconds_and_as_http_date():
+    in_30_seconds = email.utils.formatdate(time.time() + 30, usegmt=True)
+    an_hour_ago = email.utils.formatdate(time.time() - 3600, usegmt=True)
+
+    assert ratelimit.retry_after(response("7")) == 7.0
+    assert ratelimit.retry_after(response(" 12 ")) == 12.0
+    assert 28 <= ratelimit.retry_after(response(in_30_seconds)) <= 30
+    assert ratelimit.retry_after(response(an_hour_ago)) == 0.0
+    assert ratelimit.retry_after(response("soon")) is None
+    assert ratelimit.retry_after(response()) is None
+
+
+def test_concurrency_is_halved_on_429_and_raised_after_successes():
+    controller = ratelimit.RateController(8, increase_every=2, min_backoff=0.01)
+
+    controller.throttled(0)
+    assert controller.limit == 4
+    controller.throttled(0)
+    assert controller.limit == 2
+    controller.throttled(0)
+    controller.throttled(0)
+    assert controller.limit == 1  # never below one request
+
+    for _ in range(20):
+        controller.succeeded()
+    assert controller.limit == 8  # one more every two successes, up to the maximum
+    assert controller.THROTTLED == 4
+
+
+def test_429s_of_the_same_event_halve_the_concurrency_once():
+    controller = ratelimit.RateController(8)
+
+    controller.throttled(0.5)
+    # the other requests in flight get their 429 during the pause
+    controller.throttled(0.5)
+    controller.throttled(None)
+
+    assert controller.limit == 4
+    assert controller.THROTTLED == 3
+
+
+def test_requests_wait_for_the_pause_and_the_limit():
+    controller = ratelimit.RateController(2)
+    controller.throttled(0.3)  # limit 1 from now on
+    started = time.monotonic()
+    controller.acquire()
+    assert time.monotonic() - started >= 0.25
+
+    second = threading.Event()
+
+    def acquire_second():
+        controller.acquire()
+        second.set()
+
+    thread = threading.Thread(target=acquire_second)
+    thread.start()
+    assert not second.wait(0.2)
+    controller.release()
+    assert second.wait(5)
+    controller.release()
+    thread.join()
+
+
+def test_pause_without_retry_after_doubles_up_to_the_maximum():
+    controller = ratelimit.RateController(4, min_backoff=0.1, max_backoff=0.25)
+    pauses = []
+    for _ in range(3):
+        controller.throttled(None)
+        started = time.monotonic()
+        controller.acquire()
+        controller.release()
+        pauses.append(time.monotonic() - started)
+
+    assert 0.08 <= pauses[0] < 0.2
+    assert 0.18 <= pauses[1] < 0.25
+    assert 0.23 <= pauses[2] < 0.35
+    controller.succeeded()
+    controller.throttled(None)
+    # a success resets the backoff
+    started = time.monotonic()
+    controller.acquire()
+    assert time.monotonic() - started < 0.2
+
+
+class RateLimited:
+    """
+    Route answering the first requests for images with 429 and a
+    Retry-After header
+    """
+
+    def __init__(self, limited: int, retry_after: str = "1"):
+        self.limited = limited
+        self.retry_after = retry_after
+        self.lock = threading.Lock()
+
+    def __call__(self, handler):
+        with self.lock:
+            limited = self.limited > 0
+            self.limited -= 1
+        if limited:
+            handler.reply(429, headers={"Retry-After": self.retry_after})
+        else:
+            handler.reply(200, IMAGE, {"Content-Type": "image/png"})
+
+
+def serve_project(monkeypatch, server, route, images: int = 4):
+    monkeypatch.setattr(
+        downloader, "PROJECT_URL", server.url("/projects/{hash_id}.json")
+    )
+    assets = [
+        {
+            "id": n,
+            "position": n,
+            "asset_type": "image",
+            "image_url": server.url(f"/p/large/{n}.png?1"),
+        }
+        for n in range(images)
+    ]
+    data = json.dumps({"hash_id": "p", "assets": assets}).encode()
+    server.route(
+        "/projects/p.json",
+        lambda handler: handler.reply(200, data, {"Content-Type": "application/json"}),
+    )
+    for n in range(images):
+        server.route(f"/p/8k/{n}.png", route)
+
+
+def test_run_backs_off_on_429_and_finishes(monkeypatch, capsys, server, tmp_path):
+    serve_project(monkeypatch, server, RateLimited(2))
+
+    exit_code = cli.main(["p", "-o", str(tmp_path), "--no-cache", "-j", "2"])
+
+    output = capsys.readouterr().out
+    assert exit_code == 0, output
+    for n in range(4):
+        assert (tmp_path / "p" / f"{n}.png").read_bytes() == IMAGE
+    assert "Saved: 4" in output
+    assert "Throttled: 2" in output
+
+
+def test_abort_on_429_cancels_the_remaining_downloads(
+    monkeypatch, capsys, server, tmp_path
+):
+    serve_project(monkeypatch, server, RateLimited(100))
+
+    exit_code = cli.main(
+        ["p", "-o", str(tmp_path), "--no-cache", "-j", "1", "--abort-on-429"]
+    )
+
+    output = capsys.readouterr().out
+    assert exit_code == 1
+    assert "Rate limit exceeded, cancelled download of remaining files" in output
+    requested = sum(len(server.requests_to(f"/p/8k/{n}.png")) for n in range(4))
+    assert requested == 1
+    assert not list((tmp_path / "p").glob("*.png"))
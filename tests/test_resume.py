@@ -0,0 +1,160 @@
+# Copyright (C) 2025 Jérémy Rotzetter
+
+import os
+import re
+import socket
+import downloader
+import retry
+from standin import png
+
+PATH = "/images/1/large/image.png"
+IMAGE = png(body=bytes(range(256)) * 1024)
+CUT = 100 * 1024
+
+
+class RangeImage:
+    """
+    Route serving an image with an ETag that breaks off the first response
+    after CUT bytes, the way the server answers Range requests is set by mode:
+
+    range - 206 with the requested bytes unless If-Range does not match
+    ignore-range - 200 with the whole image
+    unsatisfiable - 416
+    ignore-if-range - 206 with the requested bytes whatever If-Range is
+    """
+
+    def __init__(self, data: bytes, etag: str = '"v1"', mode: str = "range"):
+        self.data = data
+        self.etag = etag
+        self.mode = mode
+        self.cut = True
+
+    def __call__(self, handler):
+        headers = {"Content-Type": "image/png", "ETag": self.etag}
+        match = re.match(r"bytes=(\d+)-$", handler.headers.get("Range", ""))
+        if_range = handler.headers.get("If-Range")
+        if match and self.mode == "unsatisfiable":
+            return handler.reply(416)
+        if match and (
+            self.mode == "ignore-if-range"
+            or (self.mode == "range" and if_range in (None, self.etag))
+        ):
+            start = int(match.group(1))
+            headers["Content-Range"] = (
+                f"bytes {start}-{len(self.data) - 1}/{len(self.data)}"
+            )
+            return handler.reply(206, self.data[start:], headers)
+        if self.cut:
+            self.cut = False
+            return self.break_off(handler, headers)
+        handler.reply(200, self.data, headers)
+
+    def break_off(self, handler, headers: dict[str, str]):
+        handler.send_response(200)
+        for name, value in headers.items():
+            handler.send_header(name, value)
+        handler.send_header("Content-Length", str(len(self.data)))
+        handler.end_headers()
+        handler.wfile.write(self.data[:CUT])
+        handler.wfile.flush()
+        handler.connection.shutdown(socket.SHUT_RDWR)
+        handler.close_connection = True
+
+
+def download(server, store_path) -> tuple[downloader.Downloader, list[str]]:
+    image_downloader = downloader.Downloader(
+        str(store_path), max_workers=1, retry_policy=retry.RetryPolicy(attempts=1)
+    )
+    lines = list(image_downloader.run([(server.url(f"{PATH}?1"), "image")]))
+    return image_downloader, lines
+
+
+def interrupted(server, tmp_path, route: RangeImage) -> list[str]:
+    """
+    Download the image once with the transfer breaking off, returns the
+    names of the files left behind
+    """
+    server.route(PATH, route)
+    image_downloader, _ = download(server, tmp_path)
+    assert image_downloader.ERRORS == 1
+    return sorted(os.listdir(tmp_path))
+
+
+def range_requests(server) -> list[dict[str, str]]:
+    return [headers for _, _, headers in server.requests_to(PATH) if "Range" in headers]
+
+
+def test_interrupted_download_is_resumed_with_a_range_request(server, tmp_path):
+    route = RangeImage(IMAGE)
+    left = interrupted(server, tmp_path, route)
+    part = next(name for name in left if name.endswith(".part"))
+    # The bytes of a read broken off are not written
+    offset = os.path.getsize(tmp_path / part)
+    assert 0 < offset <= CUT
+    assert f"{part}{downloader.VALIDATOR_SUFFIX}" in left
+
+    image_downloader, lines = download(server, tmp_path)
+
+    assert image_downloader.SAVED == 1
+    assert "resumed at" in lines[0]
+    assert (tmp_path / "image.png").read_bytes() == IMAGE
+    assert os.listdir(tmp_path) == ["image.png"]
+    (headers,) = range_requests(server)
+    assert headers["Range"] == f"bytes={offset}-"
+    assert headers["If-Range"] == '"v1"'
+
+
+def test_full_response_to_a_range_request_restarts_from_zero(server, tmp_path):
+    route = RangeImage(IMAGE)
+    interrupted(server, tmp_path, route)
+    route.mode = "ignore-range"
+
+    image_downloader, lines = download(server, tmp_path)
+
+    assert image_downloader.SAVED == 1
+    assert image_downloader.WARNINGS == 0
+    assert "resumed at" not in lines[0]
+    assert (tmp_path / "image.png").read_bytes() == IMAGE
+    assert os.listdir(tmp_path) == ["image.png"]
+
+
+def test_unsatisfiable_range_discards_the_partial_file(server, tmp_path):
+    route = RangeImage(IMAGE)
+    interrupted(server, tmp_path, route)
+    route.mode = "unsatisfiable"
+
+    image_downloader, lines = download(server, tmp_path)
+
+    assert image_downloader.SAVED == 1
+    assert (tmp_path / "image.png").read_bytes() == IMAGE
+    assert os.listdir(tmp_path) == ["image.png"]
+    assert len(range_requests(server)) == 1
+
+
+def test_changed_image_is_sent_whole_for_a_mismatching_if_range(server, tmp_path):
+    route = RangeImage(IMAGE)
+    interrupted(server, tmp_path, route)
+    changed = png(body=b"changed" * 30000)
+    route.data, route.etag = changed, '"v2"'
+
+    image_downloader, lines = download(server, tmp_path)
+
+    assert image_downloader.SAVED == 1
+    assert (tmp_path / "image.png").read_bytes() == changed
+    assert range_requests(server)[0]["If-Range"] == '"v1"'
+
+
+def test_partial_response_with_another_validator_discards_the_partial_file(
+    server, tmp_path
+):
+    route = RangeImage(IMAGE)
+    interrupted(server, tmp_path, route)
+    changed = png(body=b"changed" * 30000)
+    route.data, route.etag, route.mode = changed, '"v2"', "ignore-if-range"
+
+    image_downloader, lines = download(server, tmp_path)
+
+    assert image_downloader.SAVED == 1
+    assert "resumed at" not in lines[0]
+    assert (tmp_path / "image.png").read_bytes() == changed
+    assert os.listdir(tmp_path) == ["image.png"]
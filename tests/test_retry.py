@@ -0,0 +1,150 @@
+# Copyright (C) 2025 Jérémy Rotzetter
+
+import socket
+import struct
+import time
+import pytest
+import requests
+import downloader
+import ratelimit
+import retry
+from standin import png
+
+IMAGE = png(body=b"image" * 100)
+PATH = "/images/large/image.png"
+
+
+class Sequence:
+    """
+    Route replying to each request with the next of a sequence of replies,
+    the image once the sequence is used up
+
+    A reply is an HTTP status code, "reset" to close the connection without
+    a response or "slow" to send the image after the read timeout.
+    """
+
+    def __init__(self, *replies, retry_after: str = "0"):
+        self.replies = list(replies)
+        self.retry_after = retry_after
+
+    def __call__(self, handler):
+        reply = self.replies.pop(0) if self.replies else 200
+        if reply == "reset":
+            handler.connection.setsockopt(
+                socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0)
+            )
+            handler.close_connection = True
+        elif reply == "slow":
+            time.sleep(0.5)
+            handler.close_connection = True
+        elif reply == 429:
+            handler.reply(429, headers={"Retry-After": self.retry_after})
+        elif reply == 200:
+            handler.reply(200, IMAGE, {"Content-Type": "image/png"})
+        else:
+            handler.reply(reply)
+
+
+def policy(**options) -> retry.RetryPolicy:
+    options = {"backoff": 0.01, "read_timeout": 0.2, **options}
+    return retry.RetryPolicy(**options)
+
+
+def download(server, tmp_path, route: Sequence, **options):
+    server.route(PATH, route)
+    image_downloader = downloader.Downloader(str(tmp_path), **options)
+    lines = list(image_downloader.run([(server.url(f"{PATH}?1"), "image")]))
+    return image_downloader, lines, len(server.requests_to(PATH))
+
+
+@pytest.mark.parametrize(
+    "failure, reason",
+    [
+        (503, "HTTP 503"),
+        (522, "HTTP 522"),
+        ("slow", "ReadTimeout"),
+        ("reset", "ConnectionError"),
+    ],
+)
+def test_transient_failures_are_retried(server, tmp_path, failure, reason):
+    retry_policy = policy()
+    image_downloader, lines, requests_sent = download(
+        server, tmp_path, Sequence(failure, failure), retry_policy=retry_policy
+    )
+
+    assert image_downloader.SAVED == 1
+    assert image_downloader.RETRIES == 2
+    assert requests_sent == 3
+    assert retry_policy.RETRIES == {reason: 2}
+    assert (tmp_path / "image.png").read_bytes() == IMAGE
+
+
+@pytest.mark.parametrize("status", [400, 403, 404, 410])
+def test_client_errors_are_not_retried(server, tmp_path, status):
+    retry_policy = policy()
+    image_downloader, lines, requests_sent = download(
+        server, tmp_path, Sequence(status), retry_policy=retry_policy
+    )
+
+    assert requests_sent == 1
+    assert image_downloader.ERRORS == 1
+    assert image_downloader.RETRIES == 0
+    assert retry_policy.RETRIES == {}
+    assert lines[0].startswith("! HTTP error")
+
+
+def test_retries_stop_after_the_last_attempt(server, tmp_path):
+    retry_policy = policy(attempts=3)
+    image_downloader, lines, requests_sent = download(
+        server, tmp_path, Sequence(*[503] * 5), retry_policy=retry_policy
+    )
+
+    assert requests_sent == 3
+    assert image_downloader.ERRORS == 1
+    assert retry_policy.GAVE_UP == 1
+    assert "Gave up: 1" in retry_policy.summary()
+
+
+def test_backing_off_from_429_leaves_the_retries_of_the_policy(server, tmp_path):
+    retry_policy = policy(attempts=2)
+    controller = ratelimit.RateController(2, max_retries=3)
+    image_downloader, lines, requests_sent = download(
+        server,
+        tmp_path,
+        Sequence(429, 429, 429, 503),
+        retry_policy=retry_policy,
+        rate_controller=controller,
+    )
+
+    assert image_downloader.SAVED == 1
+    assert requests_sent == 5
+    assert controller.THROTTLED == 3
+    assert retry_policy.RETRIES == {"HTTP 503": 1}
+
+
+@pytest.mark.parametrize("attempt", range(8))
+def test_delay_stays_within_its_bounds(attempt):
+    retry_policy = retry.RetryPolicy(backoff=0.5, max_backoff=10.0, jitter=0.25)
+    full = min(10.0, 0.5 * 2**attempt)
+
+    for _ in range(200):
+        assert 0.75 * full <= retry_policy.delay(attempt) <= full
+
+
+def test_delay_doubles_up_to_the_cap_without_jitter():
+    retry_policy = retry.RetryPolicy(backoff=1.0, max_backoff=5.0, jitter=0.0)
+
+    assert [retry_policy.delay(n) for n in range(5)] == [1.0, 2.0, 4.0, 5.0, 5.0]
+
+
+def test_call_retries_a_function_and_raises_the_last_error():
+    retry_policy = policy(attempts=3)
+    calls = []
+
+    def fails():
+        calls.append(1)
+        raise requests.ConnectionError("reset")
+
+    with pytest.raises(requests.ConnectionError):
+        retry_policy.call(fails)
+    assert len(calls) == 3
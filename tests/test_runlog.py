@@ -0,0 +1,85 @@
+# Copyright (C) 2025 Jérémy Rotzetter
+
+import pytest
+import runlog
+
+
+@pytest.fixture(params=["memory", "file"])
+def run_log(request, tmp_path):
+    log_dir = str(tmp_path / "logs") if request.param == "file" else None
+    log = runlog.RunLog(log_dir, max_lines=5, max_bytes=300, backup_count=3)
+    yield log
+    log.close()
+
+
+def test_only_the_most_recent_lines_are_kept_in_memory(run_log):
+    for n in range(8):
+        run_log.append(f"line {n}")
+
+    assert list(run_log.lines) == [f"line {n}" for n in range(3, 8)]
+
+
+def test_lines_are_drained_in_batches(run_log):
+    run_log.append("a")
+    run_log.append("b")
+
+    assert run_log.drain() == (["a", "b"], False)
+    assert run_log.drain() == ([], False)
+    for n in range(7):
+        run_log.append(f"line {n}")
+    # lines were dropped between two updates of the GUI
+    assert run_log.drain() == ([f"line {n}" for n in range(2, 7)], True)
+
+
+def test_search_returns_the_lines_as_they_were_added(run_log):
+    run_log.append('+ Saved: "Dragon.png" with 1.2 MB')
+    run_log.append('^ Skipped "castle.jpg" as it already exists')
+    run_log.append('+ Saved: "dragon (1).png" with 2.0 MB')
+
+    assert run_log.search("DRAGON") == [
+        '+ Saved: "Dragon.png" with 1.2 MB',
+        '+ Saved: "dragon (1).png" with 2.0 MB',
+    ]
+    assert run_log.search("dragon", limit=1) == [
+        '+ Saved: "dragon (1).png" with 2.0 MB'
+    ]
+    # the time the log file prefixes the lines with is not searched
+    assert run_log.search(":") == [
+        '+ Saved: "Dragon.png" with 1.2 MB',
+        '+ Saved: "dragon (1).png" with 2.0 MB',
+    ]
+    assert run_log.search("20") == []
+
+
+def test_search_covers_the_rotated_log_files(tmp_path):
+    log = runlog.RunLog(str(tmp_path), max_lines=5, max_bytes=300, backup_count=3)
+    try:
+        for n in range(30):
+            log.append(f"result {n:02d} of the run")
+        found = log.search("result")
+    finally:
+        log.close()
+
+    assert (tmp_path / f"{runlog.LOG_FILE_NAME}.1").exists()
+    # more than the lines kept in memory, oldest first, up to max_lines
+    assert found == [f"result {n:02d} of the run" for n in range(25, 30)]
+    log = runlog.RunLog(str(tmp_path), max_lines=50, max_bytes=300, backup_count=3)
+    try:
+        found = log.search("result")
+    finally:
+        log.close()
+    assert len(found) > 5
+    assert found[-1] == "result 29 of the run"
+    assert found == sorted(found)
+
+
+def test_lines_of_the_log_file_start_with_their_time(tmp_path):
+    log = runlog.RunLog(str(tmp_path))
+    try:
+        log.append("hello")
+    finally:
+        log.close()
+
+    line = (tmp_path / runlog.LOG_FILE_NAME).read_text(encoding="utf-8")
+    assert line.endswith(" hello\n")
+    assert runlog._TIME_PREFIX.match(line)
@@ -0,0 +1,93 @@
+# Copyright (C) 2025 Jérémy Rotzetter
+
+import hashlib
+import socket
+import pytest
+import requests
+import streaming
+
+BODY = bytes(range(256)) * 4096  # 1 MiB
+
+
+def serve_body(server, body: bytes = BODY, cut: int = 0):
+    def route(handler):
+        if not cut:
+            return handler.reply(200, body, {"Content-Type": "image/png"})
+        handler.send_response(200)
+        handler.send_header("Content-Length", str(len(body)))
+        handler.end_headers()
+        handler.wfile.write(body[:cut])
+        handler.wfile.flush()
+        handler.connection.shutdown(socket.SHUT_RDWR)
+        handler.close_connection = True
+
+    server.route("/image.png", route)
+    return requests.get(server.url("/image.png"), stream=True, timeout=5)
+
+
+def test_chunk_size_grows_on_fast_full_reads_and_shrinks_on_slow_ones():
+    size = streaming.START_CHUNK_SIZE
+    assert streaming.next_chunk_size(size, size, 0.001) == 2 * size
+    assert streaming.next_chunk_size(size, size // 2, 0.001) == size
+    assert streaming.next_chunk_size(size, size, 1.0) == size // 2
+    assert (
+        streaming.next_chunk_size(streaming.MAX_CHUNK_SIZE, streaming.MAX_CHUNK_SIZE, 0)
+        == streaming.MAX_CHUNK_SIZE
+    )
+    assert (
+        streaming.next_chunk_size(streaming.MIN_CHUNK_SIZE, 1, 1.0)
+        == streaming.MIN_CHUNK_SIZE
+    )
+
+
+def test_body_is_copied_and_hashed(server, tmp_path):
+    resp = serve_body(server)
+    digest = hashlib.sha256()
+    with resp, open(tmp_path / "image", "wb") as f:
+        written = streaming.copy_response(resp, f, digest, len(BODY))
+
+    assert written == len(BODY)
+    assert (tmp_path / "image").read_bytes() == BODY
+    assert digest.hexdigest() == hashlib.sha256(BODY).hexdigest()
+
+
+def test_body_is_appended_at_the_position_of_the_file(server, tmp_path):
+    resp = serve_body(server)
+    with open(tmp_path / "image", "wb") as f:
+        f.write(b"head")
+        with resp:
+            written = streaming.copy_response(resp, f, expected=4 + len(BODY))
+
+    assert written == len(BODY)
+    assert (tmp_path / "image").read_bytes() == b"head" + BODY
+
+
+def test_broken_off_body_leaves_only_the_bytes_written(server, tmp_path):
+    resp = serve_body(server, cut=300 * 1024)
+    with open(tmp_path / "image", "wb") as f:
+        with pytest.raises(requests.RequestException):
+            with resp:
+                streaming.copy_response(resp, f, expected=len(BODY))
+
+    # The preallocated space is truncated so the size tells where to resume
+    data = (tmp_path / "image").read_bytes()
+    assert 0 < len(data) <= 300 * 1024
+    assert data == BODY[: len(data)]
+
+
+def test_preallocate_reserves_the_final_size(tmp_path):
+    with open(tmp_path / "image", "wb") as f:
+        streaming.preallocate(f, 12345)
+    assert (tmp_path / "image").stat().st_size == 12345
+
+
+def test_read_buffer_is_reused_per_thread():
+    import threading
+
+    buffers = []
+    thread = threading.Thread(target=lambda: buffers.append(streaming._buffer()))
+    thread.start()
+    thread.join()
+
+    assert streaming._buffer() is streaming._buffer()
+    assert buffers[0] is not streaming._buffer()
@@ -0,0 +1,43 @@
+# Copyright (C) 2025 Jérémy Rotzetter
+
+import requests
+import transport
+
+
+def test_connections_are_reused(server):
+    server.route("/image", lambda handler: handler.reply(200, b"image"))
+    shared = transport.Transport()
+    session = shared.session(4)
+
+    for _ in range(3):
+        assert session.get(server.url("/image")).content == b"image"
+
+    assert shared.CONNECTIONS == 1
+    assert shared.REQUESTS == 3
+
+
+def test_pool_is_enlarged_for_more_workers(server):
+    shared = transport.Transport(pool_size=2)
+
+    session = shared.session(1)
+    assert shared.session(8) is session
+
+    assert shared.pool_size == 8
+    assert session.get_adapter(server.url("/"))._pool_maxsize == 8
+
+
+def test_request_sent_through_pool_mounted_before_still_succeeds(server):
+    server.route("/image", lambda handler: handler.reply(200, b"image"))
+    shared = transport.Transport(pool_size=1)
+    session = shared.session(1)
+    # a worker of a running download has taken the connection pool of the
+    # session when the pool is enlarged for the workers of another run
+    request = requests.Request("GET", server.url("/image")).prepare()
+    adapter = session.get_adapter(request.url)
+    pool = adapter.get_connection_with_tls_context(request, verify=True)
+    shared.session(4)
+
+    # the adapter is left as it is, not closed
+    assert len(adapter.poolmanager.pools) == 1
+    assert pool.urlopen("GET", "/image").data == b"image"
+    assert session.get(server.url("/image")).content == b"image"
@@ -0,0 +1,169 @@
+# Copyright (C) 2025 Jérémy Rotzetter
+
+import os
+import threading
+import pytest
+import downloader
+import writer
+from standin import png
+
+SIZES = [0, 1, 4095, 4096, 4097, writer.WRITE_SIZE + 123, 3 * writer.WRITE_SIZE]
+
+
+def content(size: int, seed: int = 0) -> bytes:
+    return bytes((n * 31 + seed) % 251 for n in range(size))
+
+
+def write_in_chunks(f, data: bytes, chunk_size: int = 10007):
+    for i in range(0, len(data), chunk_size):
+        f.write(data[i : i + chunk_size])
+
+
+@pytest.mark.parametrize("direct", [False, True])
+def test_files_are_written_byte_exact(tmp_path, direct):
+    disk_writer = writer.DiskWriter(max_buffer=256 * 1024, threads=2, direct=direct)
+    files = {}
+    try:
+        for n, size in enumerate(SIZES):
+            path = tmp_path / f"{n}.bin"
+            files[path] = content(size, n)
+            # the disk space of half of them is reserved up front
+            f = disk_writer.open(str(path), expected=size if n % 2 else None)
+            assert f.direct == disk_writer.direct
+            with f:
+                write_in_chunks(f, files[path])
+    finally:
+        disk_writer.close()
+
+    for path, data in files.items():
+        assert path.read_bytes() == data
+    assert disk_writer.FILES == len(SIZES)
+    assert disk_writer.BYTES == sum(SIZES)
+
+
+@pytest.mark.parametrize("direct", [False, True])
+def test_resumed_and_short_files(tmp_path, direct):
+    disk_writer = writer.DiskWriter(direct=direct)
+    resumed = tmp_path / "resumed.bin"
+    head, tail = content(5000), content(70000, 1)
+    resumed.write_bytes(head)
+    short = tmp_path / "short.bin"
+    try:
+        # an unaligned offset is written through the page cache
+        with disk_writer.open(str(resumed), offset=len(head)) as f:
+            assert not f.direct
+            write_in_chunks(f, tail)
+        # fewer bytes than expected, the reserved rest is truncated
+        with disk_writer.open(str(short), expected=100_000) as f:
+            write_in_chunks(f, content(40000))
+    finally:
+        disk_writer.close()
+
+    assert resumed.read_bytes() == head + tail
+    assert short.read_bytes() == content(40000)
+
+
+def test_files_fall_back_without_direct_io_support(monkeypatch, tmp_path):
+    real_open = os.open
+
+    def no_direct(path, flags, *args):
+        if flags & getattr(os, "O_DIRECT", 0):
+            raise OSError(22, "Invalid argument")
+        return real_open(path, flags, *args)
+
+    disk_writer = writer.DiskWriter(direct=True)
+    monkeypatch.setattr(os, "open", no_direct)
+    data = content(writer.WRITE_SIZE + 5)
+    try:
+        with disk_writer.open(str(tmp_path / "a.bin")) as f:
+            assert not f.direct
+            write_in_chunks(f, data)
+    finally:
+        disk_writer.close()
+
+    assert (tmp_path / "a.bin").read_bytes() == data
+
+
+def test_writes_wait_while_the_buffer_is_full(monkeypatch, tmp_path):
+    disk_ready = threading.Event()
+    real_write = writer.DiskWriter._write
+
+    def slow_write(self, *args):
+        disk_ready.wait(10)
+        return real_write(self, *args)
+
+    monkeypatch.setattr(writer.DiskWriter, "_write", slow_write)
+    disk_writer = writer.DiskWriter(max_buffer=100_000)
+    data = content(400_000)
+    done = threading.Event()
+
+    def produce():
+        with disk_writer.open(str(tmp_path / "a.bin")) as f:
+            write_in_chunks(f, data, 30_000)
+        done.set()
+
+    thread = threading.Thread(target=produce)
+    thread.start()
+    try:
+        # the producer is stuck as soon as the buffer is full
+        assert not done.wait(0.3)
+        assert disk_writer.STALLS >= 1
+        disk_ready.set()
+        thread.join(10)
+    finally:
+        disk_ready.set()
+        disk_writer.close()
+
+    assert done.is_set()
+    assert (tmp_path / "a.bin").read_bytes() == data
+    assert disk_writer.PEAK_BUFFERED <= 100_000
+
+
+def test_files_are_renamed_only_after_they_are_synced(monkeypatch, server, tmp_path):
+    events = []
+    lock = threading.Lock()
+    real_fsync, real_replace = os.fsync, os.replace
+
+    def fsync(fd):
+        with lock:
+            events.append(("fsync", os.readlink(f"/proc/self/fd/{fd}")))
+        real_fsync(fd)
+
+    def replace(src, dst):
+        with lock:
+            events.append(("replace", os.path.abspath(src)))
+        real_replace(src, dst)
+
+    images = {n: png(body=bytes([n]) * 200_000) for n in range(4)}
+    for n, data in images.items():
+        server.route(
+            f"/images/{n}/large/image{n}.png",
+            lambda handler, data=data: handler.reply(
+                200, data, {"Content-Type": "image/png"}
+            ),
+        )
+    jobs = [
+        (server.url(f"/images/{n}/large/image{n}.png?1"), f"image{n}") for n in images
+    ]
+    disk_writer = writer.DiskWriter(fsync_batch=3)
+    image_downloader = downloader.Downloader(
+        str(tmp_path), max_workers=4, disk_writer=disk_writer
+    )
+    monkeypatch.setattr(os, "fsync", fsync)
+    monkeypatch.setattr(os, "replace", replace)
+    try:
+        list(image_downloader.run(jobs))
+    finally:
+        disk_writer.close()
+    monkeypatch.undo()
+
+    assert image_downloader.SAVED == 4
+    synced = [path for event, path in events if event == "fsync"]
+    replaced = [path for event, path in events if event == "replace"]
+    assert len(replaced) == 4
+    for path in replaced:
+        assert path in synced
+        assert events.index(("fsync", path)) < events.index(("replace", path))
+    for n, data in images.items():
+        assert (tmp_path / f"image{n}.png").read_bytes() == data
+    assert "synced in" in disk_writer.summary()